@@ -20,7 +20,11 @@
 # where:
 # q                         is the length of q-grams to use
 # hash_type                 is either DH (double-hashing) or RH
-#                           (random hashing)
+#                           (random hashing), EDH (enhanced double-hashing),
+#                           TH (triple-hashing) or CRH (counter-based random
+#                           hashing), or SDH, SEDH or STH for double, enhanced
+#                           double or triple-hashing using a single (keyed)
+#                           digest per q-gram
 # num_hash_funct            is a positive number or 'opt' (to fill BF 50%)
 # bf_len                    is the length of Bloom filters
 # bf_harden                 is either None, 'balance' or 'fold' for different
@@ -97,13 +101,110 @@
 
 MAX_MEMORY_USE = 70000  # In Megabytes
 
+MEMORY_CHECK_INTERVAL = 10.0  # Number of seconds between memory use checks
+MEMORY_SPILL_DIR =      None  # Directory where large data structures are
+                              # spilled to when memory use is too large and
+                              # checkpoints saved before aborting (None to
+                              # only evict caches before aborting)
+MEMORY_MAX_NUM_OVER =   2     # Number of consecutive checks with a too large
+                              # memory use after releasing memory before
+                              # aborting
+
+LOAD_BATCH_SIZE = None  # Number of records to load per batch, if set to None
+                        # all records of a data set are kept in memory
+
+PROJECT_COLUMNS = True  # Only keep the record identifier and the attributes
+                        # used (plus the salt attribute) when loading records
+
+SALT_COL = 5  # Column number of the attribute used for salting
+
+LOAD_NUM_PROC =   1        # Number of processes used to parse data set files,
+                           # if larger than 1 a further process is used to
+                           # read (decompress) the files
+LOAD_CHUNK_SIZE = 4194304  # Number of bytes per chunk of lines send to a
+                           # parsing process
+
+DATA_SET_CACHE_DIR = None  # Directory where loaded data sets are cached as
+                           # binary NumPy files (None for no caching)
+
+COMPACT_VAL_STORE = False  # Keep record values, identifier sets and value
+                           # frequencies in a dictionary-encoded value store
+                           # instead of dictionaries (to reduce memory use)
+
+Q_GRAM_CACHE_SIZE = 100000  # Maximum number of values whose q-grams are kept
+                            # in the shared q-gram cache (0 for no caching)
+
+Q_GRAM_POS_CACHE_SIZE = 100000  # Maximum number of q-grams whose bit positions
+                                # are kept by double, enhanced double,
+                                # triple and counter-based random hashing (0
+                                # for no caching)
+
+SALT_PREFIX_CACHE_SIZE = 0  # Maximum number of q-grams whose hash objects
+                            # are kept to hash them with different salts when
+                            # salting is used (0 for not keeping hash
+                            # objects). Only faster if q-grams are longer
+                            # than the block size of the hash functions,
+                            # for short q-grams copying hash objects is
+                            # slower than hashing the salted q-grams again
+
+RANDOM_HASHING_POS_CACHE_SIZE = 0  # Maximum number of q-grams whose bit
+                                   # positions are kept by random hashing (0
+                                   # for no caching). If positive the global
+                                   # random number generator is no longer
+                                   # seeded for each q-gram, which changes
+                                   # the random permutations of balancing
+                                   # hardening
+
+ABF_CACHE_SIZE = 0  # Maximum number of attribute values whose Bloom filters
+                    # are kept by CLK and CLK-RBF encoding, so values that
+                    # occur in many records are only hashed once (0 for no
+                    # caching). Not used for Markov chain hardening
+
+VOCAB_POS_TABLE = False  # Precompute the bit positions of all q-grams of the
+                         # build data set in a table, and encode records by
+                         # looking positions up in it (not used for random
+                         # hashing and salting)
+
+BATCH_ENCODE_SIZE = 10000  # Number of records encoded together into a matrix
+                           # of Bloom filters (0 to encode records one by
+                           # one). Not used for balancing and Markov chain
+                           # hardening, as they depend on the order in which
+                           # random numbers are drawn while encoding
+
+ENCODE_NUM_PROC = 1  # Number of processes used to generate Bloom filters, if
+                     # larger than 1 batches of BATCH_ENCODE_SIZE records (or
+                     # 10000 if it is 0) are encoded in parallel, with the same
+                     # Bloom filters as when encoding them sequentially (not
+                     # used for Markov chain hardening)
+
+DEDUP_ENCODE = False  # Encode each distinct tuple of the values of the encoded
+                      # attributes only once, and use its Bloom filter for
+                      # all records with these values (not used for salting
+                      # and Markov chain hardening, which encode records with
+                      # the same values differently)
+
+LOAD_SAMPLE_RATIO =  None  # Fraction of records to keep in a sample of each
+                           # data set for fast exploratory runs (None to use
+                           # all records)
+SAMPLE_NUM_TOP_VAL = None  # Number of most frequent record values of which
+                           # all records are kept in a sample (None to use
+                           # the largest number of frequent values analysed)
+
+HEAVY_HITTER_CAPACITY = None  # If set, only the Bloom filters that are
+                              # candidates for being among this number of
+                              # most frequent ones are counted (in two passes,
+                              # using bounded memory), None to count all
+
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
 # Standard library imports
 #
+import collections
+import cStringIO
 import csv
 import gzip
 import hashlib
+import multiprocessing
 import os.path
 import sys
 import time
@@ -112,6 +213,12 @@ import numpy
 import random
 
 from libs import auxiliary
+from libs import datacache
+from libs import valstore
+from libs import qgrams
+from libs import memgov
+from libs import heavyhitters
+from libs import datastats
 from libs import eval_attack_res
 
 # PPRL module imports
@@ -126,6 +233,12 @@ BF_HASH_FUNCT1 = hashlib.sha1
 BF_HASH_FUNCT2 = hashlib.md5
 BF_HASH_FUNCT3 = hashlib.sha224
 
+# Single-digest hashing types ('sdh', 'sedh' and 'sth') split one digest per
+# q-gram into the integers needed, optionally keyed (HMAC) with a secret key
+#
+SINGLE_DIGEST_FUNCT = hashlib.sha512
+SINGLE_DIGEST_KEY =   None
+
 today_str = time.strftime("%Y%m%d", time.localtime())
 
 # Input variable definitions
@@ -137,21 +250,207 @@ static =  'static'
 
 # -----------------------------------------------------------------------------
 
-def load_data_set_extract_attr_val(file_name, rec_id_col, use_attr_list,
-                                   col_sep_char, header_line):
-  """Load the given file, extract all attributes and get them into a single 
-     list. 
+def read_file_chunks(file_name, chunk_size, chunk_queue):
+  """Read the given file in chunks of about 'chunk_size' bytes, where each
+     chunk is extended to end with a complete line, and put the chunks into
+     the given queue. Once the file has been read None is put into the queue.
+     If reading the file fails then the exception is put into the queue
+     instead, so it can be raised again by the process reading the queue.
 
-     Returns:
-     1) a list of total record values.
-     2) a dictionary of record values where keys are record ids and values
-        are all the attribute values of that record.
-     3) a dictionary of record value frequencies where keys are record
-        values and values are frequencies.
-     4) and a list of the attribute names used.
+     This function is run in its own process so (gzip) decompression is done
+     in parallel to parsing the lines.
   """
 
-  start_time = time.time()
+  try:
+    if (file_name.endswith('gz')):
+      f = gzip.open(file_name)
+    else:
+      f = open(file_name)
+
+    while True:
+      chunk = f.read(chunk_size)
+      if (chunk == ''):
+        break
+
+      chunk += f.readline()  # Complete the last line of the chunk
+
+      chunk_queue.put(chunk)
+
+    f.close()
+
+  except Exception, exc:
+    chunk_queue.put(exc)
+    return
+
+  chunk_queue.put(None)
+
+# -----------------------------------------------------------------------------
+
+def parse_csv_chunk(chunk_tuple):
+  """Parse the lines in the given chunk (a tuple of the chunk string, the
+     column separator and the projection column list, see
+     'load_data_set_batches') into normalised records.
+
+     Returns a list of records and the numbers of records skipped because
+     they contain the value 'removed' or 'confidential'.
+  """
+
+  chunk, col_sep_char, proj_col_list = chunk_tuple
+
+  csv_reader = csv.reader(cStringIO.StringIO(chunk), delimiter=col_sep_char)
+
+  rec_batch = []
+
+  num_rec_with_removed = 0
+  num_rec_with_conf = 0
+
+  for rec_list in csv_reader:
+
+    if('removed' in rec_list):
+      num_rec_with_removed += 1
+      continue
+
+    if('confidential' in rec_list):
+      num_rec_with_conf += 1
+      continue
+
+    if (proj_col_list == None):
+      rec_batch.append([attr_val.strip().lower() for attr_val in rec_list])
+    else:
+      rec_batch.append([rec_list[col].strip().lower() for col in
+                        proj_col_list])
+
+  return rec_batch, num_rec_with_removed, num_rec_with_conf
+
+# -----------------------------------------------------------------------------
+
+def load_data_set_batches_parallel(file_name, col_sep_char, header_line,
+                                   batch_size, load_info_dict, proj_col_list,
+                                   num_proc):
+  """Generator with the same output as 'load_data_set_batches', but the file
+     is read in a separate process and split into chunks of lines that are
+     parsed by a pool of 'num_proc' processes. The parsed chunks are merged
+     in the order they occur in the file, so the generated batches are the
+     same as when the file is parsed sequentially.
+
+     Note that records (quoted values) must not span several lines.
+  """
+
+  chunk_queue = multiprocessing.Queue(2*num_proc)
+
+  read_proc = multiprocessing.Process(target=read_file_chunks,
+                                      args=(file_name, LOAD_CHUNK_SIZE,
+                                            chunk_queue))
+  read_proc.start()
+
+  pool = multiprocessing.Pool(num_proc)
+
+  if (load_info_dict != None):
+    load_info_dict['header_list'] = None  # Set once the header is read
+
+  try:
+    header_list = None
+
+    num_rec_with_removed = 0
+    num_rec_with_conf = 0
+
+    rec_batch = []
+
+    # Chunks which are being parsed, in the order they occur in the file
+    #
+    parse_res_queue = collections.deque()
+
+    while True:
+      chunk = chunk_queue.get()
+
+      if (isinstance(chunk, Exception)):  # Reading the file failed
+        raise chunk
+
+      if (chunk != None):
+
+        if ((header_line == True) and (header_list == None)):
+          header_end = chunk.find('\n') + 1
+          if (header_end == 0):
+            header_end = len(chunk)
+
+          header_list = csv.reader([chunk[:header_end]],
+                                   delimiter=col_sep_char).next()
+          chunk = chunk[header_end:]
+
+          if (load_info_dict != None):
+            load_info_dict['header_list'] = header_list
+
+        parse_res_queue.append(pool.apply_async(parse_csv_chunk,
+                                          [(chunk, col_sep_char, proj_col_list)]))
+
+      # Merge the oldest parsed chunk if enough chunks are being parsed, or if
+      # all chunks have been read
+      #
+      while ((len(parse_res_queue) >= 2*num_proc) or \
+             ((chunk == None) and (len(parse_res_queue) > 0))):
+        chunk_rec_list, chunk_num_removed, chunk_num_conf = \
+                                                parse_res_queue.popleft().get()
+        num_rec_with_removed += chunk_num_removed
+        num_rec_with_conf +=    chunk_num_conf
+
+        if (batch_size == None):
+          rec_batch += chunk_rec_list
+
+        else:
+          for rec_val_list in chunk_rec_list:
+            rec_batch.append(rec_val_list)
+
+            if (len(rec_batch) == batch_size):
+              yield rec_batch
+              rec_batch = []
+
+      if (chunk == None):
+        break
+
+    if (load_info_dict != None):
+      load_info_dict['num_rec_with_removed'] = num_rec_with_removed
+      load_info_dict['num_rec_with_conf'] =    num_rec_with_conf
+
+    if (len(rec_batch) > 0):
+      yield rec_batch
+
+    pool.close()
+
+  finally:
+    pool.terminate()
+    pool.join()
+    read_proc.terminate()
+    read_proc.join()
+
+# -----------------------------------------------------------------------------
+
+def load_data_set_batches(file_name, col_sep_char, header_line, batch_size,
+                          load_info_dict=None, proj_col_list=None, num_proc=1):
+  """Generator which reads the given file and yields lists (batches) of at
+     most 'batch_size' records, where each record is a list of its stripped
+     and lower-cased attribute values. If 'batch_size' is None all records
+     are yielded in a single batch.
+
+     If a 'proj_col_list' (a sorted list of column numbers) is given then
+     only the values in these columns are normalised and kept for each
+     record, so the value of column 'proj_col_list[i]' will be at position
+     'i' in a record.
+
+     Records that contain the value 'removed' or 'confidential' are skipped.
+     If a 'load_info_dict' is given then the header line (or None) and the
+     numbers of skipped records are stored in it.
+
+     If 'num_proc' is larger than 1 then the file is parsed in parallel
+     (see 'load_data_set_batches_parallel').
+  """
+
+  if (num_proc > 1):
+    for rec_batch in load_data_set_batches_parallel(file_name, col_sep_char,
+                                                    header_line, batch_size,
+                                                    load_info_dict,
+                                                    proj_col_list, num_proc):
+      yield rec_batch
+    return
 
   if (file_name.endswith('gz')):
     f = gzip.open(file_name)
@@ -160,15 +459,161 @@ def load_data_set_extract_attr_val(file_name, rec_id_col, use_attr_list,
 
   csv_reader = csv.reader(f, delimiter=col_sep_char)
 
-  print 'Load data set from file:', file_name
-  print '  Attribute separator: %c' % (col_sep_char)
   if (header_line == True):
     header_list = csv_reader.next()
-    print '  Header line:', header_list
+  else:
+    header_list = None
+
+  if (load_info_dict != None):
+    load_info_dict['header_list'] = header_list
+
+  # Removed and confidential records. These records do not have any
+  # attribute values
+  num_rec_with_removed = 0
+  num_rec_with_conf = 0
+
+  rec_batch = []
+
+  for rec_list in csv_reader:
+
+    if('removed' in rec_list):
+      num_rec_with_removed += 1
+      continue
+
+    if('confidential' in rec_list):
+      num_rec_with_conf += 1
+      continue
+
+    if (proj_col_list == None):
+      rec_batch.append([attr_val.strip().lower() for attr_val in rec_list])
+    else:
+      rec_batch.append([rec_list[col].strip().lower() for col in
+                        proj_col_list])
+
+    if (len(rec_batch) == batch_size):
+      yield rec_batch
+      rec_batch = []
+
+  f.close()
+
+  if (load_info_dict != None):
+    load_info_dict['num_rec_with_removed'] = num_rec_with_removed
+    load_info_dict['num_rec_with_conf'] =    num_rec_with_conf
+
+  if (len(rec_batch) > 0):
+    yield rec_batch
+
+# -----------------------------------------------------------------------------
+
+def iter_rec_val_list(rec_val_list):
+  """Iterate over the records in the given record value list, which is either
+     a list of records, or a function that returns a generator of record
+     batches (as returned by 'load_data_set_extract_attr_val' if records are
+     loaded in batches).
+  """
+
+  if (callable(rec_val_list)):
+    for rec_batch in rec_val_list():
+      for attr_val_list in rec_batch:
+        yield attr_val_list
+
+  else:
+    for attr_val_list in rec_val_list:
+      yield attr_val_list
+
+# -----------------------------------------------------------------------------
+
+def get_bf_rec_id(attr_val_list, rec_id_col):
+  """Return the identifier of the given record as used in the dictionary of
+     Bloom filters (in lower case, and only the part after a '-' if it
+     contains one).
+  """
+
+  rec_id = attr_val_list[rec_id_col].strip().lower() # Get record ID number
+  if '-' in rec_id:
+    rec_id = rec_id.split('-')[1].strip()
+
+  return rec_id
+
+# -----------------------------------------------------------------------------
+
+def iter_rec_batches(rec_val_list, batch_size):
+  """Iterate over the records in the given record value list (see
+     'iter_rec_val_list') in lists of at most 'batch_size' records.
+  """
+
+  if (callable(rec_val_list)):
+    for rec_batch in rec_val_list():
+      for i in xrange(0, len(rec_batch), batch_size):
+        yield rec_batch[i:i+batch_size]
+
+  else:
+    for i in xrange(0, len(rec_val_list), batch_size):
+      yield rec_val_list[i:i+batch_size]
+
+# -----------------------------------------------------------------------------
+
+def dedup_rec_batches(rec_batch_iter, use_attr_list, rec_id_col,
+                      pend_rec_queue, uniq_val_queue):
+  """Generator which for each batch of records given by the iterator
+     'rec_batch_iter' yields the list of those records whose tuple of values
+     in the attributes 'use_attr_list' has not occurred in an earlier record
+     (the list can be empty).
+
+     For each record its identifier (see 'get_bf_rec_id') and its value tuple
+     are appended to the queue 'pend_rec_queue', and the value tuples of the
+     yielded records to the queue 'uniq_val_queue', so the Bloom filters of
+     the yielded records can later be assigned to all records with the same
+     values.
+  """
+
+  seen_val_set = set()  # Value tuples of all records yielded so far
+
+  for rec_batch in rec_batch_iter:
+    uniq_rec_batch = []
+
+    for attr_val_list in rec_batch:
+      val_tuple = tuple([attr_val_list[attr_num] for attr_num in
+                         use_attr_list])
+
+      pend_rec_queue.append((get_bf_rec_id(attr_val_list, rec_id_col),
+                             val_tuple))
+
+      if (val_tuple not in seen_val_set):
+        seen_val_set.add(val_tuple)
+        uniq_val_queue.append(val_tuple)
+        uniq_rec_batch.append(attr_val_list)
+
+    yield uniq_rec_batch
+
+# -----------------------------------------------------------------------------
+
+def get_proj_col_pos(col_num, proj_col_list):
+  """Return the position of the given column in records that have been
+     loaded with the given projection column list (see
+     'load_data_set_batches'), or the column number itself if no projection
+     was used.
+  """
+
+  if (proj_col_list == None):
+    return col_num
+  else:
+    return proj_col_list.index(col_num)
+
+# -----------------------------------------------------------------------------
+
+def print_header_info(header_list, header_line, rec_id_col, use_attr_list):
+  """Print the header line and the names of the record identifier and the
+     attributes to use (or their numbers if there is no header line).
+
+     Returns the list of names of the attributes to use (empty if there is
+     no header line).
+  """
 
   use_attr_name_list = []
 
   if (header_line == True):
+    print '  Header line:', header_list
     print '  Record identifier attribute:', header_list[rec_id_col]
   else:
     print '  Record identifier attribute number:', rec_id_col
@@ -180,185 +625,549 @@ def load_data_set_extract_attr_val(file_name, rec_id_col, use_attr_list,
       use_attr_name_list.append(use_attr_name)
   print
 
+  return use_attr_name_list
+
+# -----------------------------------------------------------------------------
+
+def load_data_set_from_cache(data_set_cache, rec_id_col, use_attr_list,
+                             header_line, batch_size=None,
+                             compact_val_store=False, stats_collector=None):
+  """Get the records and dictionaries of a data set from the given data set
+     cache (see the 'datacache' module) instead of loading the data set file.
+
+     If a 'stats_collector' is given then all records are added to it.
+
+     Returns the same values as 'load_data_set_extract_attr_val'.
+  """
+
+  start_time = time.time()
+
+  use_attr_name_list = print_header_info(data_set_cache.header_list,
+                                         header_line, rec_id_col,
+                                         use_attr_list)
+
+  if (compact_val_store == True):
+    rec_val_store = data_set_cache.get_rec_val_store()
+
+    rec_val_dict =      rec_val_store.get_rec_val_dict()
+    rec_val_id_dict =   rec_val_store.get_rec_val_id_dict()
+    rec_val_freq_dict = rec_val_store.get_rec_val_freq_dict()
+  else:
+    rec_val_dict, rec_val_id_dict, rec_val_freq_dict = \
+                                            data_set_cache.get_rec_val_dicts()
+
+  if (batch_size == None):
+    total_rec_list = []
+    for rec_batch in data_set_cache.gen_rec_batches():
+      total_rec_list += rec_batch
+
+  else:  # Decode the cached records in batches each time they are needed
+    total_rec_list = lambda: data_set_cache.gen_rec_batches(batch_size)
+
+  if (stats_collector != None):
+    for rec_val_list in iter_rec_val_list(total_rec_list):
+      stats_collector.add_rec(rec_val_list)
+
+  time_used = time.time() - start_time
+  print '  Loaded %d records from cache in %d sec' % \
+        (data_set_cache.get_num_rec(), time_used)
+  print '   ', auxiliary.get_memory_usage()
+
+  print
+  print '  Number of dismissed records with value \'removed\':', \
+        data_set_cache.num_rec_with_removed
+  print '  Number of dismissed records with value \'confidential\':', \
+        data_set_cache.num_rec_with_conf
+  print
+
+  return total_rec_list, rec_val_dict, rec_val_id_dict, rec_val_freq_dict, use_attr_name_list
+
+# -----------------------------------------------------------------------------
+
+def load_data_set_extract_attr_val(file_name, rec_id_col, use_attr_list,
+                                   col_sep_char, header_line,
+                                   batch_size=None, proj_col_list=None,
+                                   num_proc=1, cache_dir=None,
+                                   compact_val_store=False,
+                                   mem_governor=None, stats_collector=None):
+  """Load the given file, extract all attributes and get them into a single 
+     list. 
+
+     If 'batch_size' is given then the records are read in batches of this
+     size and the list of total record values is not kept in memory. Instead
+     a function is returned which re-reads the file and returns a generator
+     of record batches each time it is called.
+
+     If a 'proj_col_list' is given then only the values of these columns are
+     kept in records (it must contain the record identifier column and all
+     attributes in 'use_attr_list'). Use 'get_proj_col_pos' to get the
+     positions of columns in the returned records.
+
+     If 'num_proc' is larger than 1 then the file is parsed using this number
+     of processes.
+
+     If a 'cache_dir' is given then the loaded data set is stored in binary
+     form in a sub-directory of it, and later calls with the same file (not
+     modified since) and arguments get the data set from this cache.
+
+     If 'compact_val_store' is set to True then the record values are kept in
+     a dictionary-encoded value store (see the 'valstore' module) and
+     read-only dictionary-like views of it are returned instead of the three
+     dictionaries.
+
+     If a 'mem_governor' (see the 'memgov' module) is given then it is asked
+     to check the memory use while records are loaded, and the three
+     dictionaries are created by it (so they can be spilled to disk).
+
+     The record value frequencies are always counted exactly. As the sets of
+     record identifiers of all record values are kept, counting only heavy
+     hitter values (see the 'heavyhitters' module) would not save memory.
+
+     If a 'stats_collector' (see the 'datastats' module) is given then each
+     loaded record is added to it, so statistics about the attribute values
+     are available without another pass over the records.
+
+     Returns:
+     1) a list of total record values (or a function that generates batches
+        of record values).
+     2) a dictionary of record values where keys are record ids and values
+        are all the attribute values of that record.
+     3) a dictionary of record value frequencies where keys are record
+        values and values are frequencies.
+     4) and a list of the attribute names used.
+  """
+
+  start_time = time.time()
+
+  load_info_dict = {}
+
+  if (proj_col_list != None):
+    proj_col_list = sorted(set(proj_col_list))
+
+  cache_writer = None
+
+  if (cache_dir != None):
+    cache_dir_name = datacache.get_cache_dir_name(cache_dir, file_name,
+                                                  col_sep_char, header_line,
+                                                  rec_id_col, use_attr_list,
+                                                  proj_col_list)
+
+    if (datacache.is_cached(cache_dir_name)):
+      print 'Load data set from cache:', cache_dir_name
+      print '  Data set file:', file_name
+
+      data_set_cache = datacache.DataSetCache(cache_dir_name)
+
+      return load_data_set_from_cache(data_set_cache, rec_id_col,
+                                      use_attr_list, header_line, batch_size,
+                                      compact_val_store, stats_collector)
+
+    cache_writer = datacache.DataSetCacheWriter()
+
+  rec_batch_gen = load_data_set_batches(file_name, col_sep_char, header_line,
+                                        batch_size, load_info_dict,
+                                        proj_col_list, num_proc)
+
+  # Positions of the record identifier and the attributes to use in the
+  # loaded records
+  #
+  rec_id_pos = get_proj_col_pos(rec_id_col, proj_col_list)
+  use_attr_pos_set = set([get_proj_col_pos(attr_num, proj_col_list)
+                          for attr_num in use_attr_list])
+
+  print 'Load data set from file:', file_name
+  print '  Attribute separator: %c' % (col_sep_char)
+  if (batch_size != None):
+    print '  Load records in batches of size:', batch_size
+  if (proj_col_list != None):
+    print '  Only keep columns:', proj_col_list
+  if (num_proc > 1):
+    print '  Number of processes used to parse records:', num_proc
+
   rec_num = 0
   
   # A list containing all record values
   #
   total_rec_list = []
   
-  # A dictionary of encoded record values in each record
-  #
-  rec_val_dict = {}
-  
-  # A dictionary with record values as keys and record ids as values
-  #
-  rec_val_id_dict = {}
-  
-  # A dictionary of encoded record value frequencies
-  #
-  rec_val_freq_dict = {}
-  
-  # Removed and confidential records. These records do not have any
-  # attribute values
-  num_rec_with_removed = 0
-  num_rec_with_conf = 0
+  if (mem_governor != None):
+    file_base_name = os.path.basename(file_name)
 
-  for rec_list in csv_reader:
-    
-    if('removed' in rec_list):
-      num_rec_with_removed += 1
-      continue
-      
-    if('confidential' in rec_list):
-      num_rec_with_conf += 1
-      continue
-    
-    
-    rec_num += 1
+    rec_val_dict =      mem_governor.new_spill_dict(file_base_name+'-rec_val')
+    rec_val_id_dict =   mem_governor.new_spill_dict(file_base_name+'-val_id')
+    rec_val_freq_dict = mem_governor.new_spill_dict(file_base_name+'-freq')
 
-    if (rec_num % 100000 == 0):
-      time_used = time.time() - start_time
-      print '  Processed %d records in %d sec (%.2f msec average)' % \
-            (rec_num, time_used, 1000.0*time_used/rec_num)
-      print '   ', auxiliary.get_memory_usage()
+  else:
+    # A dictionary of encoded record values in each record
+    #
+    rec_val_dict = {}
 
-      auxiliary.check_memory_use(MAX_MEMORY_USE)
-    
-    # Get record ID
-    rec_id = rec_list[rec_id_col].strip().lower()
-    if '-' in rec_id:
-      rec_id = rec_id.split('-')[1].strip()
-    
-    # A list of attribute values per record
-    rec_val_list      = []
-    
-    # A list of attribute values (per record) which will be used for encoding
-    use_attr_val_list = [] 
-    
-    # Loop over each attribute value in the record
-    for (i, attr_val) in enumerate(rec_list):
-      rec_val_list.append(attr_val.strip().lower())
-      
-      # Check if current attribute is specified to be encoded
-      if(i in use_attr_list):
-        use_attr_val_list.append(attr_val.strip().lower())
-    
-    total_rec_list.append(rec_val_list)
-    
-    # Join all attribute values to a single string
-    rec_val = ' '.join(use_attr_val_list) 
-    rec_val_dict[rec_id] = rec_val
-    
-    val_id_set = rec_val_id_dict.get(rec_val, set())
-    val_id_set.add(rec_id)
-    rec_val_id_dict[rec_val] = val_id_set
-    
-    rec_val_freq_dict[rec_val] = rec_val_freq_dict.get(rec_val, 0) + 1
+    # A dictionary with record values as keys and record ids as values
+    #
+    rec_val_id_dict = {}
+
+    # A dictionary of encoded record value frequencies
+    #
+    rec_val_freq_dict = {}
+
+  if (compact_val_store == True):
+    rec_val_store = valstore.RecValStore()
+  else:
+    rec_val_store = None
+
+  for rec_batch in rec_batch_gen:
+
+    if (rec_num == 0):  # The header line is available once reading started
+      use_attr_name_list = print_header_info(load_info_dict['header_list'],
+                                             header_line, rec_id_col,
+                                             use_attr_list)
+
+    if (batch_size == None):
+      total_rec_list = rec_batch
+
+    for rec_val_list in rec_batch:
+
+      rec_num += 1
+
+      if (rec_num % 100000 == 0):
+        time_used = time.time() - start_time
+        print '  Processed %d records in %d sec (%.2f msec average)' % \
+              (rec_num, time_used, 1000.0*time_used/rec_num)
+        print '   ', auxiliary.get_memory_usage()
+
+      if (mem_governor != None):
+        mem_governor.check()
+
+      # Get record ID
+      rec_id = rec_val_list[rec_id_pos]
+      if '-' in rec_id:
+        rec_id = rec_id.split('-')[1].strip()
+
+      # Join all attribute values which will be used for encoding to a single
+      # string
+      rec_val = ' '.join([attr_val for (i, attr_val) in
+                          enumerate(rec_val_list) if i in use_attr_pos_set])
+
+      if (rec_val_store != None):
+        rec_val_store.add_rec(rec_id, rec_val)
+
+      else:
+        rec_val_dict[rec_id] = rec_val
+
+        val_id_set = rec_val_id_dict.get(rec_val, set())
+        val_id_set.add(rec_id)
+        rec_val_id_dict[rec_val] = val_id_set
+
+        rec_val_freq_dict[rec_val] = rec_val_freq_dict.get(rec_val, 0) + 1
+
+      if (cache_writer != None):
+        cache_writer.add_rec(rec_val_list, rec_id, rec_val)
+
+      if (stats_collector != None):
+        stats_collector.add_rec(rec_val_list)
 
   time_used = time.time() - start_time
   print '  Processed %d records in %d sec (%.2f msec average)' % \
         (rec_num, time_used, 1000.0*time_used/rec_num)
   print '   ', auxiliary.get_memory_usage()
+
+  if (rec_val_store != None):
+    rec_val_store.freeze()
+
+    rec_val_dict =      rec_val_store.get_rec_val_dict()
+    rec_val_id_dict =   rec_val_store.get_rec_val_id_dict()
+    rec_val_freq_dict = rec_val_store.get_rec_val_freq_dict()
+
+    print '  Number of unique record values in value store:', \
+          len(rec_val_freq_dict)
   
   print
-  print '  Number of dismissed records with value \'removed\':', num_rec_with_removed
-  print '  Number of dismissed records with value \'confidential\':', num_rec_with_conf
+  print '  Number of dismissed records with value \'removed\':', \
+        load_info_dict['num_rec_with_removed']
+  print '  Number of dismissed records with value \'confidential\':', \
+        load_info_dict['num_rec_with_conf']
   print
-  
-  assert len(total_rec_list) == rec_num
+
+  if (cache_writer != None):
+    cache_writer.save(cache_dir_name, load_info_dict['header_list'],
+                      load_info_dict['num_rec_with_removed'],
+                      load_info_dict['num_rec_with_conf'])
+    del cache_writer
+
+    print '  Saved data set into cache:', cache_dir_name
+    print
+
+  if (batch_size == None):
+    assert len(total_rec_list) == rec_num
+
+  elif (cache_dir != None):  # Read batches from the cache written above
+    data_set_cache = datacache.DataSetCache(cache_dir_name)
+    total_rec_list = lambda: data_set_cache.gen_rec_batches(batch_size)
+
+  else:  # Re-read the file in batches each time the records are needed
+    total_rec_list = lambda: load_data_set_batches(file_name, col_sep_char,
+                                                   header_line, batch_size,
+                                                   None, proj_col_list,
+                                                   num_proc)
 
   return total_rec_list, rec_val_dict, rec_val_id_dict, rec_val_freq_dict, use_attr_name_list
 
 # -----------------------------------------------------------------------------
 
-def gen_bloom_filter_dict(rec_val_list, rec_id_col, encode_method, hash_type,
-                          bf_len, num_hash_funct, use_attr_list, q, padded, 
-                          bf_harden, enc_param_list=None, harden_param_list=None):
-  """Using given record value list generate Bloom filters by encoding specified
-     attribute values from each record using given q, bloom filter length, and
-     number of hash functions.
-     
-     When encoding use the given encode method, hashing type, padding, and 
-     hardening method.
-
-     Return a dictionary with bit-patterns each of length of the given Bloom
-     filter length.
+def sample_data_set(rec_val_list, rec_val_dict, rec_val_freq_dict,
+                    rec_id_col, sample_ratio, num_top_val,
+                    compact_val_store=False, stats_collector=None):
+  """Sample the records of a loaded data set such that the head of the record
+     value frequency distribution stays intact: all records that have one of
+     the 'num_top_val' most frequent record values are kept (so the
+     frequencies of these values are exact), while of all other records a
+     fraction of 'sample_ratio' is kept.
+
+     Whether one of the other records is kept only depends on a hash of its
+     identifier, so the same records are sampled in every run and each time
+     records loaded in batches are read.
+
+     The arguments 'rec_val_list', 'rec_val_dict' and 'rec_val_freq_dict' are
+     as returned by 'load_data_set_extract_attr_val', and 'rec_id_col' is the
+     position of the record identifier in the loaded records.
+
+     If a 'stats_collector' is given then it is reset and the sampled records
+     are added to it.
+
+     Returns the sampled list of records (or a function that generates
+     batches of sampled records), and the dictionaries of record values,
+     record identifier sets and record value frequencies of the sample.
   """
 
-  print 'Generate Bloom filter bit-patterns for %d records' % \
-        (len(rec_val_list))
-  print '  Bloom filter length:          ', bf_len
-  print '  q-gram length:                ', q
-  print '  Number of hash functions used:', num_hash_funct
-  print '  Encoding method:              ', encode_method
-  print '  Hashing type used:            ', \
-        {'dh':'Double hashing', 'rh':'Random hashing', 
-         'edh':'Enhanced Double hashing', 'th':'Triple hashing',}[hash_type]
-  print '  Padded:                       ', padded
-  print '  Hardening method:             ', bf_harden
+  start_time = time.time()
+
+  assert (sample_ratio > 0.0) and (sample_ratio <= 1.0), sample_ratio
+
+  top_val_set = set([rec_val for (rec_val, rec_val_freq) in
+                     sorted(rec_val_freq_dict.iteritems(),
+                            key=lambda t: t[1], reverse=True)[:num_top_val]])
+
+  max_hash_val = int(sample_ratio * 0xffffffff)
+
+  sample_rec_list = []
+  sample_rec_id_set = set()
+
+  if (compact_val_store == True):
+    rec_val_store = valstore.RecValStore()
+  else:
+    sample_rec_val_dict =      {}
+    sample_rec_val_id_dict =   {}
+    sample_rec_val_freq_dict = {}
+
+  if (stats_collector != None):
+    stats_collector.reset()
+
+  num_rec = 0
+
+  for attr_val_list in iter_rec_val_list(rec_val_list):
+    num_rec += 1
+
+    rec_id = attr_val_list[rec_id_col]
+    if '-' in rec_id:
+      rec_id = rec_id.split('-')[1].strip()
+
+    rec_val = rec_val_dict[rec_id]
+
+    if ((rec_val not in top_val_set) and
+        (int(hashlib.md5(rec_id).hexdigest()[:8], 16) > max_hash_val)):
+      continue  # Record not sampled
 
-  bf_dict= {}  # One BF per record
+    sample_rec_id_set.add(rec_id)
 
-  #bf_pos_map_dict = {}  # For each bit position the q-grams mapped to it
+    if (not callable(rec_val_list)):
+      sample_rec_list.append(attr_val_list)
 
-  bf_num_1_bit_list = []  # Keep number of bits set to calculate avrg and std
+    if (stats_collector != None):
+      stats_collector.add_rec(attr_val_list)
 
-  start_time = time.time()
+    if (compact_val_store == True):
+      rec_val_store.add_rec(rec_id, rec_val)
+
+    else:
+      sample_rec_val_dict[rec_id] = rec_val
+
+      val_id_set = sample_rec_val_id_dict.get(rec_val, set())
+      val_id_set.add(rec_id)
+      sample_rec_val_id_dict[rec_val] = val_id_set
+
+      sample_rec_val_freq_dict[rec_val] = \
+                                sample_rec_val_freq_dict.get(rec_val, 0) + 1
+
+  if (compact_val_store == True):
+    rec_val_store.freeze()
+
+    sample_rec_val_dict =      rec_val_store.get_rec_val_dict()
+    sample_rec_val_id_dict =   rec_val_store.get_rec_val_id_dict()
+    sample_rec_val_freq_dict = rec_val_store.get_rec_val_freq_dict()
+
+  if (callable(rec_val_list)):  # Only keep sampled records of each batch
+
+    def gen_sample_rec_batches():
+      for rec_val_list_batch in rec_val_list():
+        sample_rec_batch = []
+        for attr_val_list in rec_val_list_batch:
+          rec_id = attr_val_list[rec_id_col]
+          if '-' in rec_id:
+            rec_id = rec_id.split('-')[1].strip()
+          if (rec_id in sample_rec_id_set):
+            sample_rec_batch.append(attr_val_list)
+        if (len(sample_rec_batch) > 0):
+          yield sample_rec_batch
+
+    sample_rec_list = gen_sample_rec_batches
+
+  print 'Sampled %d of %d records (%.2f%%) in %d sec' % \
+        (len(sample_rec_val_dict), num_rec,
+         100.0*len(sample_rec_val_dict)/max(num_rec, 1),
+         time.time()-start_time)
+  print '  Sampling ratio: %.4f, all records of the %d most frequent ' % \
+        (sample_ratio, num_top_val) + 'record values kept'
+  print
+
+  return sample_rec_list, sample_rec_val_dict, sample_rec_val_id_dict, \
+         sample_rec_val_freq_dict
+
+# -----------------------------------------------------------------------------
+
+def gen_bf_encoder(encoder_spec):
+  """Generate the hashing, encoding and hardening methods used to encode
+     records into Bloom filters as given in the specification tuple
+     'encoder_spec'. The tuple only contains values that can be pickled, so
+     each process that generates Bloom filters in parallel can generate its
+     own methods (see 'init_bf_encode_proc'). It contains:
+       - encode_method, hash_type, bf_len, num_hash_funct, use_attr_list, q,
+         padded, bf_harden, enc_param_list, harden_param_list and
+         org_attr_list as given to 'gen_bloom_filter_dict'.
+       - q_gram_vocab_set  The q-gram vocabulary of the table of bit positions
+                           (see VOCAB_POS_TABLE), or None.
+       - abf_len_dict      The lengths of dynamic attribute-level Bloom filters
+                           of record-level Bloom filters, or None.
+       - bal_rand_seed     The random seed value of balancing hardening, or
+                           None to draw a new value.
+
+     The language model of Markov chain hardening is not calculated.
+
+     Returns the hashing method, the list of hashing methods (for CLK-RBF
+     encoding), the encoding method, the hardening method (None if no
+     hardening is done), and the random seed value of balancing hardening.
+  """
+
+  encode_method, hash_type, bf_len, num_hash_funct, use_attr_list, q, \
+        padded, bf_harden, enc_param_list, harden_param_list, org_attr_list, \
+        q_gram_vocab_set, abf_len_dict, bal_rand_seed = encoder_spec
 
-  rec_num = 0
-  
   hash_method_list = []
   
   #-------------------------------------------------------------------------
   # Define hashing method
   #
-  if(hash_type == 'dh'): # Double Hashing
+  if (hash_type in ['sdh','sedh','sth']): # Single digest split into integers
+    base_hash_type = hash_type[1:]
+    split_digest =   hashing.SplitDigest({'dh':2, 'edh':2, 'th':3}[base_hash_type],
+                                         SINGLE_DIGEST_FUNCT, SINGLE_DIGEST_KEY)
+  else:
+    base_hash_type = hash_type
+    split_digest =   None
+
+  if (bf_harden == 'salt'):  # Keep hash objects of q-grams to hash with salts
+    salt_prefix_size = SALT_PREFIX_CACHE_SIZE
+  else:
+    salt_prefix_size = 0
+
+  if(base_hash_type == 'dh'): # Double Hashing
     if(encode_method == 'clkrbf' and len(use_attr_list) > 1):
       dynamic_num_hash_list = enc_param_list[0]
       
       for num_hash in dynamic_num_hash_list:
         HASH_METHOD =  hashing.DoubleHashing(BF_HASH_FUNCT1, BF_HASH_FUNCT2, 
-                                         bf_len, num_hash)
+                                         bf_len, num_hash,
+                                         pos_cache_size=Q_GRAM_POS_CACHE_SIZE,
+                                         split_digest=split_digest,
+                                         salt_prefix_size=salt_prefix_size)
         hash_method_list.append(HASH_METHOD)
     else:
       HASH_METHOD =  hashing.DoubleHashing(BF_HASH_FUNCT1, BF_HASH_FUNCT2, 
-                                         bf_len, num_hash_funct)
+                                         bf_len, num_hash_funct,
+                                         pos_cache_size=Q_GRAM_POS_CACHE_SIZE,
+                                         split_digest=split_digest,
+                                         salt_prefix_size=salt_prefix_size)
   elif(hash_type == 'rh'): # Random Hashing
     if(encode_method == 'clkrbf' and len(use_attr_list) > 1):
       dynamic_num_hash_list = enc_param_list[0]
       
       for num_hash in dynamic_num_hash_list:
         HASH_METHOD =  hashing.RandomHashing(BF_HASH_FUNCT1, bf_len, 
-                                             num_hash)
+                                             num_hash,
+                                             pos_cache_size=RANDOM_HASHING_POS_CACHE_SIZE)
         hash_method_list.append(HASH_METHOD)
     else:
       HASH_METHOD =  hashing.RandomHashing(BF_HASH_FUNCT1, bf_len, 
-                                           num_hash_funct)
-  elif(hash_type == 'edh'): # Enhanced Double Hashing
+                                           num_hash_funct,
+                                           pos_cache_size=RANDOM_HASHING_POS_CACHE_SIZE)
+  elif(hash_type == 'crh'): # Counter-based Random Hashing
+    if(encode_method == 'clkrbf' and len(use_attr_list) > 1):
+      dynamic_num_hash_list = enc_param_list[0]
+      
+      for num_hash in dynamic_num_hash_list:
+        HASH_METHOD =  hashing.CounterRandomHashing(BF_HASH_FUNCT1, bf_len, 
+                                                    num_hash,
+                                                    pos_cache_size=Q_GRAM_POS_CACHE_SIZE)
+        hash_method_list.append(HASH_METHOD)
+    else:
+      HASH_METHOD =  hashing.CounterRandomHashing(BF_HASH_FUNCT1, bf_len, 
+                                                  num_hash_funct,
+                                                  pos_cache_size=Q_GRAM_POS_CACHE_SIZE)
+  elif(base_hash_type == 'edh'): # Enhanced Double Hashing
     if(encode_method == 'clkrbf' and len(use_attr_list) > 1):
       dynamic_num_hash_list = enc_param_list[0]
       
       for num_hash in dynamic_num_hash_list:
         HHASH_METHOD = hashing.EnhancedDoubleHashing(BF_HASH_FUNCT1, BF_HASH_FUNCT2,
-                                                     bf_len, num_hash)
+                                                     bf_len, num_hash,
+                                                     pos_cache_size=Q_GRAM_POS_CACHE_SIZE,
+                                                     split_digest=split_digest,
+                                                     salt_prefix_size=salt_prefix_size)
         hash_method_list.append(HASH_METHOD)
     else:
       HASH_METHOD = hashing.EnhancedDoubleHashing(BF_HASH_FUNCT1, BF_HASH_FUNCT2,
-                                                  bf_len, num_hash_funct)
-  else: # hash_type == 'th' # Triple Hashing
+                                                  bf_len, num_hash_funct,
+                                                  pos_cache_size=Q_GRAM_POS_CACHE_SIZE,
+                                                  split_digest=split_digest,
+                                                  salt_prefix_size=salt_prefix_size)
+  else: # base_hash_type == 'th' # Triple Hashing
     if(encode_method == 'clkrbf' and len(use_attr_list) > 1):
       dynamic_num_hash_list = enc_param_list[0]
       
       for num_hash in dynamic_num_hash_list:
         HASH_METHOD = hashing.TripleHashing(BF_HASH_FUNCT1, BF_HASH_FUNCT2, 
                                             BF_HASH_FUNCT3, bf_len, 
-                                            num_hash)
+                                            num_hash,
+                                            pos_cache_size=Q_GRAM_POS_CACHE_SIZE,
+                                            split_digest=split_digest,
+                                            salt_prefix_size=salt_prefix_size)
         hash_method_list.append(HASH_METHOD)
     else:
       HASH_METHOD = hashing.TripleHashing(BF_HASH_FUNCT1, BF_HASH_FUNCT2, 
                                           BF_HASH_FUNCT3, bf_len, 
-                                          num_hash_funct)
-  
+                                          num_hash_funct,
+                                          pos_cache_size=Q_GRAM_POS_CACHE_SIZE,
+                                          split_digest=split_digest,
+                                          salt_prefix_size=salt_prefix_size)
+
+  # Replace the hashing methods by tables of the bit positions of all q-grams
+  # in the vocabulary of the data set
+  #
+  if ((VOCAB_POS_TABLE == True) and (hash_type != 'rh') and
+      (bf_harden != 'salt')):
+    HASH_METHOD = hashing.VocabPosTable(HASH_METHOD, q_gram_vocab_set)
+    hash_method_list = [hashing.VocabPosTable(hash_method, q_gram_vocab_set)
+                        for hash_method in hash_method_list]
+
   #-------------------------------------------------------------------------
   # Define encoding method
   # 
@@ -371,7 +1180,8 @@ def gen_bloom_filter_dict(rec_val_list, rec_id_col, encode_method, hash_type,
     for att_num in use_attr_list:
       rec_tuple_list.append([att_num, q, padded, HASH_METHOD])
   
-    ENC_METHOD = encoding.CryptoLongtermKeyBFEncoding(rec_tuple_list)
+    ENC_METHOD = encoding.CryptoLongtermKeyBFEncoding(rec_tuple_list,
+                                                      ABF_CACHE_SIZE)
     
   elif(encode_method == 'rbf'): # Record-level Bloom filter
     
@@ -379,17 +1189,17 @@ def gen_bloom_filter_dict(rec_val_list, rec_id_col, encode_method, hash_type,
     num_bits_list = enc_param_list[1] # List of percentages of number of bits
     
     rec_tuple_list = []
+
+    if (org_attr_list == None):
+      org_attr_list = use_attr_list
     
     for (i, att_num) in enumerate(use_attr_list):
       rec_tuple_list.append([att_num, q, padded, HASH_METHOD, 
-                             int(num_bits_list[i]*bf_len)])
+                             int(num_bits_list[i]*bf_len), org_attr_list[i]])
     
     ENC_METHOD = encoding.RecordBFEncoding(rec_tuple_list)
     
-    if(abf_len_type == 'dynamic'):
-      avr_num_q_gram_dict = ENC_METHOD.get_avr_num_q_grams(rec_val_list)
-      abf_len_dict = ENC_METHOD.get_dynamic_abf_len(avr_num_q_gram_dict, 
-                                                    num_hash_funct)
+    if((abf_len_type == 'dynamic') and (abf_len_dict != None)):
       ENC_METHOD.set_abf_len(abf_len_dict)
  
   else: # encode_method == 'clkrbf'
@@ -398,7 +1208,8 @@ def gen_bloom_filter_dict(rec_val_list, rec_id_col, encode_method, hash_type,
     for (i, att_num) in enumerate(use_attr_list):
       rec_tuple_list.append([att_num, q, padded, hash_method_list[i]])
     
-    ENC_METHOD = encoding.CryptoLongtermKeyBFEncoding(rec_tuple_list)
+    ENC_METHOD = encoding.CryptoLongtermKeyBFEncoding(rec_tuple_list,
+                                                      ABF_CACHE_SIZE)
   
   #-------------------------------------------------------------------------
   # Define hardening method
@@ -407,8 +1218,9 @@ def gen_bloom_filter_dict(rec_val_list, rec_id_col, encode_method, hash_type,
     input_random_seed = harden_param_list[0]
     
     if(input_random_seed):
-      rand_seed = random.randint(1,100)
-      BFHard = hardening.Balancing(rand_seed)
+      if (bal_rand_seed == None):
+        bal_rand_seed = random.randint(1,100)
+      BFHard = hardening.Balancing(bal_rand_seed)
     else:
       BFHard = hardening.Balancing()
     
@@ -429,82 +1241,523 @@ def gen_bloom_filter_dict(rec_val_list, rec_id_col, encode_method, hash_type,
     chain_len  = harden_param_list[0]
     sel_method = harden_param_list[1]
     
-    # Get a single list of all attribute values 
-    lang_model_val_list = []
-    
-    for rec_val in rec_val_list:
-      val_list = []
-      
-      for attr_num in use_attr_list:
-        val_list.append(rec_val[attr_num])
-      
-      rec_str = ' '.join(val_list)
-      
-      lang_model_val_list.append(rec_str)
-    
     # Initialize Markov Chain class
     BFHard = hardening.MarkovChain(q, padded, chain_len, sel_method)
     
-    # Calculate transition probability
-    BFHard.calc_trans_prob(lang_model_val_list)
-    
   #elif(bf_harden == 'salt'): # Bloom filter Salting
   #  salt_str_list = ['ax', '43', 'bf7', '#']
+
+  else:  # No hardening ('none' or 'salt')
+    BFHard = None
+
+  return HASH_METHOD, hash_method_list, ENC_METHOD, BFHard, bal_rand_seed
+
+# -----------------------------------------------------------------------------
+
+def encode_rec(attr_val_list, enc_method, harden_method, encode_method,
+               bf_harden, rec_id_col, salt_col, num_attr):
+  """Encode the given record into a Bloom filter using the given encoding
+     method, and harden it using the given hardening method (see
+     'gen_bf_encoder'), where 'num_attr' is the number of attributes encoded.
+
+     Returns the identifier of the record and its Bloom filter.
+  """
+
+  rec_id = get_bf_rec_id(attr_val_list, rec_id_col)
+
+  if(bf_harden in ['balance', 'fold', 'rule90']):
+    rec_bf = enc_method.encode(attr_val_list)
+    rec_bf = harden_method.harden_bf(rec_bf)
+  
+  elif(bf_harden == 'mchain'):
+    rec_bf = enc_method.encode(attr_val_list, None, harden_method)
+
+  elif(bf_harden in ['wxor', 'resample']):
+    rec_bf = enc_method.encode(attr_val_list)
+    rec_bf = harden_method.harden_bf(rec_bf)
+
+  elif(bf_harden == 'salt'):
+    salt_str = attr_val_list[salt_col]
+    if(encode_method == 'abf'):
+      rec_bf = enc_method.encode(attr_val_list, salt_str)
+    else:
+      rec_bf = enc_method.encode(attr_val_list, 
+                                 [salt_str for _ in range(num_attr)])
+
+  else: # bf_harden == 'none'
+    rec_bf = enc_method.encode(attr_val_list)
+
+  return rec_id, rec_bf
+
+# -----------------------------------------------------------------------------
+
+def encode_rec_batch(rec_batch, enc_method, harden_method, encode_method,
+                     bf_len, bf_harden, rec_id_col, salt_col, num_attr,
+                     batch_encode):
+  """Encode the given list of records into Bloom filters, if 'batch_encode'
+     is True together into a matrix of Bloom filters (see the 'encode_batch'
+     methods of the encoding classes), otherwise one by one (see
+     'encode_rec').
+
+     Returns the list of the identifiers of the records and the list of
+     their Bloom filters.
+  """
+
+  if (len(rec_batch) == 0):
+    return [], []
+
+  if (batch_encode == False):
+    rec_id_list = []
+    rec_bf_list = []
+
+    for attr_val_list in rec_batch:
+      rec_id, rec_bf = encode_rec(attr_val_list, enc_method, harden_method,
+                                  encode_method, bf_harden, rec_id_col,
+                                  salt_col, num_attr)
+      rec_id_list.append(rec_id)
+      rec_bf_list.append(rec_bf)
+
+    return rec_id_list, rec_bf_list
+
+  if (encode_method == 'rbf'):
+    enc_bf_len = enc_method.rbf_bf_len
+  else:
+    enc_bf_len = bf_len
+
+  rec_id_list = [get_bf_rec_id(attr_val_list, rec_id_col) for
+                 attr_val_list in rec_batch]
+
+  if (bf_harden == 'salt'):
+    salt_str_list = [attr_val_list[salt_col] for attr_val_list in rec_batch]
+  else:
+    salt_str_list = None
+
+  bf_matrix, rec_id_index = enc_method.encode_batch(
+                              encoding.rec_list_to_col_batch(rec_batch),
+                              rec_id_list, salt_str_list)
+
+  # Get the Bloom filters (hardened if required) in the order of the records
+  #
+  rec_bf_list = []
+
+  for row_num in xrange(len(rec_id_list)):
+    rec_bf = hashing.packed_row_to_bf(bf_matrix[row_num], enc_bf_len)
+
+    if (bf_harden in ['fold', 'rule90', 'wxor', 'resample']):
+      rec_bf = harden_method.harden_bf(rec_bf)
+
+    rec_bf_list.append(rec_bf)
+
+  return rec_id_list, rec_bf_list
+
+# -----------------------------------------------------------------------------
+
+# The encoding and hardening methods of a process that generates Bloom filters
+# (set by 'init_bf_encode_proc')
+#
+bf_encode_proc_tuple = None
+
+def init_bf_encode_proc(encoder_spec, bal_perm_pos_list):
+  """Initialise a process that generates Bloom filters by generating its own
+     encoding and hardening methods from the given specification (see
+     'gen_bf_encoder'). If the permutation of balancing hardening is given
+     then it is used instead of drawing a new one.
+  """
+
+  global bf_encode_proc_tuple
+
+  enc_method, harden_method = gen_bf_encoder(encoder_spec)[2:4]
+
+  if (bal_perm_pos_list != None):
+    harden_method.perm_pos_list = bal_perm_pos_list
+
+  bf_encode_proc_tuple = (enc_method, harden_method)
+
+# -----------------------------------------------------------------------------
+
+def encode_rec_batch_proc(batch_tuple):
+  """Encode a batch of records in a process initialised by
+     'init_bf_encode_proc', where the given tuple contains the list of records
+     followed by the arguments of 'encode_rec_batch' after the methods.
+  """
+
+  enc_method, harden_method = bf_encode_proc_tuple
+
+  return encode_rec_batch(batch_tuple[0], enc_method, harden_method,
+                          *batch_tuple[1:])
+
+# -----------------------------------------------------------------------------
+
+def encode_rec_batches_parallel(rec_batch_iter, encoder_spec, enc_method,
+                                harden_method, encode_arg_tuple, num_proc):
+  """Generator with the same output as calling 'encode_rec_batch' for the
+     batches of records given by the iterator 'rec_batch_iter' (such as
+     'iter_rec_batches'), where the batches are encoded by a pool of
+     'num_proc' processes that
+     each generate their own methods from the given specification (see
+     'gen_bf_encoder'). The tuple 'encode_arg_tuple' contains the arguments
+     of 'encode_rec_batch' after the methods. The encoded batches are
+     generated in the order of the records, so the Bloom filters are the same
+     as when the records are encoded sequentially.
+
+     Balancing hardening draws its permutation from the random number
+     generator when the first Bloom filter is hardened, so the first record
+     is encoded with the given methods (generated from the same
+     specification) in this process, and all processes then use the same
+     permutation. Markov chain hardening draws random numbers for every
+     record and is therefore not supported.
+  """
+
+  assert (harden_method == None) or (harden_method.type != 'MC')
+
+  first_rec_batch =   []
+  bal_perm_pos_list = None
+
+  if ((harden_method != None) and (harden_method.type == 'BAL')):
+    for rec_batch in rec_batch_iter:
+      yield encode_rec_batch(rec_batch[:1], enc_method, harden_method,
+                             *encode_arg_tuple)
+      first_rec_batch = rec_batch[1:]
+      break
+
+    bal_perm_pos_list = harden_method.perm_pos_list
+
+  pool = multiprocessing.Pool(num_proc, init_bf_encode_proc,
+                              (encoder_spec, bal_perm_pos_list))
+
+  try:
+
+    # Batches which are being encoded, in the order of the records
+    #
+    enc_res_queue = collections.deque()
+
+    if (len(first_rec_batch) > 0):
+      enc_res_queue.append(pool.apply_async(encode_rec_batch_proc,
+                                  [(first_rec_batch,) + encode_arg_tuple]))
+
+    for rec_batch in rec_batch_iter:
+      enc_res_queue.append(pool.apply_async(encode_rec_batch_proc,
+                                            [(rec_batch,) + encode_arg_tuple]))
+
+      # Get the oldest encoded batch if enough batches are being encoded
+      #
+      while (len(enc_res_queue) >= 2*num_proc):
+        yield enc_res_queue.popleft().get()
+
+    while (len(enc_res_queue) > 0):
+      yield enc_res_queue.popleft().get()
+
+    pool.close()
+
+  finally:
+    pool.terminate()
+    pool.join()
+
+# -----------------------------------------------------------------------------
+
+def gen_bloom_filter_dict(rec_val_list, rec_id_col, encode_method, hash_type,
+                          bf_len, num_hash_funct, use_attr_list, q, padded, 
+                          bf_harden, enc_param_list=None, harden_param_list=None,
+                          salt_col=SALT_COL, org_attr_list=None,
+                          mem_governor=None, data_set_stats=None):
+  """Using given record value list generate Bloom filters by encoding specified
+     attribute values from each record using given q, bloom filter length, and
+     number of hash functions.
+     
+     When encoding use the given encode method, hashing type, padding, and 
+     hardening method (for salting the value in column 'salt_col' is used).
+
+     If records were loaded with a column projection then 'org_attr_list'
+     must contain the original column numbers of the attributes in
+     'use_attr_list' (these are used to seed the bit sampling of record-level
+     Bloom filters, so the encoding does not depend on the projection).
+
+     The record value list can either be a list of records or a function that
+     generates batches of records (see 'load_data_set_extract_attr_val').
+
+     If a 'mem_governor' (see the 'memgov' module) is given then it is asked
+     to check the memory use while Bloom filters are generated, and the
+     dictionary of Bloom filters is created by it.
+
+     If 'data_set_stats' (see the 'datastats' module) collected while the
+     records were loaded are given then they are used for dynamic
+     attribute-level Bloom filter lengths and the Markov chain, instead of
+     another pass over all records.
+
+     Return a dictionary with bit-patterns each of length of the given Bloom
+     filter length.
+  """
+
+  if (callable(rec_val_list)):
+    print 'Generate Bloom filter bit-patterns for records loaded in batches'
+  else:
+    print 'Generate Bloom filter bit-patterns for %d records' % \
+          (len(rec_val_list))
+  print '  Bloom filter length:          ', bf_len
+  print '  q-gram length:                ', q
+  print '  Number of hash functions used:', num_hash_funct
+  print '  Encoding method:              ', encode_method
+  print '  Hashing type used:            ', \
+        {'dh':'Double hashing', 'rh':'Random hashing', 
+         'edh':'Enhanced Double hashing', 'th':'Triple hashing',
+         'crh':'Counter-based random hashing',
+         'sdh':'Single-digest double hashing',
+         'sedh':'Single-digest enhanced double hashing',
+         'sth':'Single-digest triple hashing'}[hash_type]
+  print '  Padded:                       ', padded
+  print '  Hardening method:             ', bf_harden
+
+  if (mem_governor != None):
+    bf_dict = mem_governor.new_spill_dict('bf_dict')  # One BF per record
+  else:
+    bf_dict = {}
+
+  #bf_pos_map_dict = {}  # For each bit position the q-grams mapped to it
+
+  bf_num_1_bit_list = []  # Keep number of bits set to calculate avrg and std
+
+  start_time = time.time()
+
+  rec_num = 0
   
   #-------------------------------------------------------------------------
-  # Loop over each record and encode relevant attribute values to a 
-  # Bloom filter
+  # Define hashing, encoding and hardening methods
   #
-  for attr_val_list in rec_val_list:
-    rec_num += 1
+  if ((data_set_stats != None) and (data_set_stats.collect_vocab == True)):
+    q_gram_vocab_set = data_set_stats.get_q_gram_vocab()
+  else:
+    q_gram_vocab_set = None
 
-    if (rec_num % 100000 == 0):
-      time_used = time.time() - start_time
-      print '  Generated %d Bloom filters in %d sec (%.2f msec average)' % \
-            (rec_num, time_used, 1000.0*time_used/rec_num)
-      print '   ', auxiliary.get_memory_usage()
+  encoder_spec = (encode_method, hash_type, bf_len, num_hash_funct,
+                  use_attr_list, q, padded, bf_harden, enc_param_list,
+                  harden_param_list, org_attr_list, q_gram_vocab_set, None,
+                  None)
 
-      auxiliary.check_memory_use(MAX_MEMORY_USE)
-    
-    # Apply Bloom filter hardening if required
+  HASH_METHOD, hash_method_list, ENC_METHOD, BFHard, bal_rand_seed = \
+                                                 gen_bf_encoder(encoder_spec)
+
+  if (isinstance(HASH_METHOD, hashing.VocabPosTable)):
+    print '  Q-gram vocabulary size:       ', HASH_METHOD.get_vocab_size()
+
+  # Caches of q-gram bit positions of the hashing methods used
+  #
+  pos_cache_list = [hash_method.pos_cache for hash_method in
+                    (hash_method_list or [HASH_METHOD]) if
+                    hash_method.pos_cache != None]
+
+  # Hash objects of q-grams kept for salting
+  #
+  salt_prefixes_list = [hash_method.salt_prefixes for hash_method in
+                        (hash_method_list or [HASH_METHOD]) if
+                        getattr(hash_method, 'salt_prefixes', None) != None]
+
+  # Cache of the Bloom filters of attribute values of CLK encoding
+  #
+  abf_cache = getattr(ENC_METHOD, 'abf_cache', None)
+
+  if (mem_governor != None):
+    for (i, pos_cache) in enumerate(pos_cache_list):
+      mem_governor.register('q-gram position cache %d' % (i),
+                            evict_funct=pos_cache.evict)
+    for (i, salt_prefixes) in enumerate(salt_prefixes_list):
+      mem_governor.register('salted q-gram hash objects %d' % (i),
+                            evict_funct=salt_prefixes.evict)
+    if (abf_cache != None):
+      mem_governor.register('attribute Bloom filter cache',
+                            evict_funct=abf_cache.evict)
+  
+  # Calculate dynamic attribute-level Bloom filter lengths
+  #
+  if ((encode_method == 'rbf') and (enc_param_list[0] == 'dynamic')):
+    if (data_set_stats != None):
+      avr_num_q_gram_dict = data_set_stats.get_avr_num_q_gram_dict()
+    else:
+      avr_num_q_gram_dict = \
+               ENC_METHOD.get_avr_num_q_grams(iter_rec_val_list(rec_val_list))
+    abf_len_dict = ENC_METHOD.get_dynamic_abf_len(avr_num_q_gram_dict, 
+                                                  num_hash_funct)
+    ENC_METHOD.set_abf_len(abf_len_dict)
+  else:
+    abf_len_dict = None
+
+  # Calculate the language model of Markov chain hardening
+  #
+  if (bf_harden == 'mchain'):
+    if (data_set_stats != None):  # Transitions were counted while loading
+      BFHard.set_trans_count_dict(data_set_stats.get_trans_count_dict())
+
+    else:
+      # Get a single list of all attribute values 
+      lang_model_val_list = []
+
+      for rec_val in iter_rec_val_list(rec_val_list):
+        val_list = []
+
+        for attr_num in use_attr_list:
+          val_list.append(rec_val[attr_num])
+
+        rec_str = ' '.join(val_list)
+
+        lang_model_val_list.append(rec_str)
+
+      # Calculate transition probability
+      BFHard.calc_trans_prob(lang_model_val_list)
+
+  # The specification of the methods used by other processes
+  #
+  encoder_spec = encoder_spec[:-2] + (abf_len_dict, bal_rand_seed)
+
+  #-------------------------------------------------------------------------
+  # Encode batches of records, in parallel, into matrices of Bloom filters,
+  # or only once for each distinct tuple of encoded values if possible
+  #
+  batch_encode = (BATCH_ENCODE_SIZE > 0) and \
+                 (bf_harden not in ['balance', 'mchain'])
+
+  parallel_encode = (ENCODE_NUM_PROC > 1) and (bf_harden != 'mchain')
+
+  dedup_encode = (DEDUP_ENCODE == True) and \
+                 (bf_harden not in ['salt', 'mchain'])
+
+  encode_arg_tuple = (encode_method, bf_len, bf_harden, rec_id_col, salt_col,
+                      len(use_attr_list), batch_encode)
+
+  if ((parallel_encode == True) or (batch_encode == True) or
+      (dedup_encode == True)):
+
+    if (BATCH_ENCODE_SIZE > 0):
+      rec_batch_iter = iter_rec_batches(rec_val_list, BATCH_ENCODE_SIZE)
+    else:
+      rec_batch_iter = iter_rec_batches(rec_val_list, 10000)
+
+    # Only encode the first record with each tuple of encoded values
     #
-    rec_id = attr_val_list[rec_id_col].strip().lower() # Get record ID number
-    if '-' in rec_id:
-      rec_id = rec_id.split('-')[1].strip()
-      
-    if(bf_harden in ['balance', 'fold', 'rule90']):
-      rec_bf = ENC_METHOD.encode(attr_val_list)
-      rec_bf = BFHard.harden_bf(rec_bf)
-      
-    elif(bf_harden == 'mchain'):
-      rec_bf = ENC_METHOD.encode(attr_val_list, None, BFHard)
-    
-    elif(bf_harden in ['wxor', 'resample']):
-      rec_bf = ENC_METHOD.encode(attr_val_list)
-      rec_bf = BFHard.harden_bf(rec_bf)
+    if (dedup_encode == True):
+      pend_rec_queue = collections.deque()  # Records without Bloom filter
+      uniq_val_queue = collections.deque()  # Value tuples being encoded
+
+      rec_batch_iter = dedup_rec_batches(rec_batch_iter, use_attr_list,
+                                         rec_id_col, pend_rec_queue,
+                                         uniq_val_queue)
+
+      val_bf_dict = {}  # Bloom filters of the encoded value tuples
+
+    if (parallel_encode == True):
+      enc_batch_iter = encode_rec_batches_parallel(rec_batch_iter,
+                                                   encoder_spec, ENC_METHOD,
+                                                   BFHard, encode_arg_tuple,
+                                                   ENCODE_NUM_PROC)
+    else:
+      enc_batch_iter = (encode_rec_batch(rec_batch, ENC_METHOD, BFHard,
+                                         *encode_arg_tuple) for rec_batch in
+                        rec_batch_iter)
+
+    for (rec_id_list, rec_bf_list) in enc_batch_iter:
+
+      # Assign the Bloom filters of the encoded value tuples to all records
+      # (in their order) whose values have been encoded by now
+      #
+      if (dedup_encode == True):
+        for rec_bf in rec_bf_list:
+          val_bf_dict[uniq_val_queue.popleft()] = rec_bf
+
+        rec_id_list = []
+        rec_bf_list = []
+
+        while ((len(pend_rec_queue) > 0) and
+               (pend_rec_queue[0][1] in val_bf_dict)):
+          rec_id, val_tuple = pend_rec_queue.popleft()
+          rec_id_list.append(rec_id)
+          rec_bf_list.append(val_bf_dict[val_tuple])
+
+      prev_rec_num = rec_num
+      rec_num +=     len(rec_id_list)
+
+      if (rec_num / 100000 > prev_rec_num / 100000):
+        time_used = time.time() - start_time
+        print '  Generated %d Bloom filters in %d sec (%.2f msec average)' % \
+              (rec_num, time_used, 1000.0*time_used/rec_num)
+        print '   ', auxiliary.get_memory_usage()
+
+      if (mem_governor != None):
+        mem_governor.check()
+
+      # Add the Bloom filters in the order of the records, so later records
+      # with the same identifier replace earlier ones
+      #
+      for (rec_id, rec_bf) in zip(rec_id_list, rec_bf_list):
+        bf_dict[rec_id] = rec_bf
+
+        bf_num_1_bit_list.append(int(rec_bf.count(1)))
+
+    if (dedup_encode == True):
+      assert len(pend_rec_queue) == 0, len(pend_rec_queue)
+
+      print '  Encoded %d distinct value tuples of %d records' % \
+            (len(val_bf_dict), rec_num)
+
+      del val_bf_dict
+
+  #-------------------------------------------------------------------------
+  # Otherwise loop over each record and encode relevant attribute values to
+  # a Bloom filter
+  #
+  else:
+    for attr_val_list in iter_rec_val_list(rec_val_list):
+      rec_num += 1
+
+      if (rec_num % 100000 == 0):
+        time_used = time.time() - start_time
+        print '  Generated %d Bloom filters in %d sec (%.2f msec average)' % \
+              (rec_num, time_used, 1000.0*time_used/rec_num)
+        print '   ', auxiliary.get_memory_usage()
+
+      if (mem_governor != None):
+        mem_governor.check()
     
-    elif(bf_harden == 'salt'):
-      salt_str = attr_val_list[5] 
-      if(encode_method == 'abf'):
-        rec_bf = ENC_METHOD.encode(attr_val_list, salt_str)
-      else:
-        rec_bf = ENC_METHOD.encode(attr_val_list, 
-                                   [salt_str for _ in 
-                                    range(len(use_attr_list))])
-        
-    else: # bf_harden == 'none'
-      rec_bf = ENC_METHOD.encode(attr_val_list)
-        
-    # Add final Bloom filter to the BF dictionary
-    bf_dict[rec_id] = rec_bf
+      # Encode the record and apply Bloom filter hardening if required
+      #
+      rec_id, rec_bf = encode_rec(attr_val_list, ENC_METHOD, BFHard,
+                                  encode_method, bf_harden, rec_id_col,
+                                  salt_col, len(use_attr_list))
+
+      # Add final Bloom filter to the BF dictionary
+      bf_dict[rec_id] = rec_bf
     
-    # Count the number of 1 bits in the Bloom filter
-    bf_num_1_bit_list.append(int(rec_bf.count(1)))
+      # Count the number of 1 bits in the Bloom filter
+      bf_num_1_bit_list.append(int(rec_bf.count(1)))
 
   print '  Bloom filter generation took %d sec' % (time.time()-start_time)
   print '    Average number of bits per BF set to 1 and std-dev: %d / %.2f' \
         % (numpy.mean(bf_num_1_bit_list), numpy.std(bf_num_1_bit_list))
 
+  for (i, pos_cache) in enumerate(pos_cache_list):
+    num_pos_cache_hit, num_pos_cache_miss, num_pos_cache_q_gram = \
+                                                      pos_cache.get_stats()
+    print '    Q-gram position cache: %d hits, %d misses, %d q-grams in ' % \
+          (num_pos_cache_hit, num_pos_cache_miss, num_pos_cache_q_gram) + \
+          'cache'
+
+    if (mem_governor != None):
+      mem_governor.unregister('q-gram position cache %d' % (i))
+
+  if (abf_cache != None):
+    num_abf_hit, num_abf_miss, num_abf_val = abf_cache.get_stats()
+    print '    Attribute Bloom filter cache: %d hits, %d misses, %d values ' % \
+          (num_abf_hit, num_abf_miss, num_abf_val) + 'in cache'
+
+    if (mem_governor != None):
+      mem_governor.unregister('attribute Bloom filter cache')
+
+  for (i, salt_prefixes) in enumerate(salt_prefixes_list):
+    num_prefix_hit, num_prefix_miss, num_prefix_q_gram = \
+                                                  salt_prefixes.get_stats()
+    print '    Salted q-gram hash objects: %d hits, %d misses, %d q-grams ' % \
+          (num_prefix_hit, num_prefix_miss, num_prefix_q_gram) + 'kept'
+
+    if (mem_governor != None):
+      mem_governor.unregister('salted q-gram hash objects %d' % (i))
+
   del bf_num_1_bit_list
 
   return bf_dict
@@ -518,23 +1771,14 @@ def get_avrg_num_q_grams(rec_val_list, use_attr_list, q, padded):
   
   num_q_gram_per_rec_list = []
   
-  qm1 = q-1  # Shorthand
-  
-  for attr_val_list in rec_val_list:
+  for attr_val_list in iter_rec_val_list(rec_val_list):
     
     rec_q_gram_set = set()
     
     for attr_num in use_attr_list:
       attr_val = attr_val_list[attr_num]
       
-      attr_val_len = len(attr_val)
-      
-      if (padded == True):  # Add padding start and end characters
-        attr_val = PAD_CHAR*qm1+attr_val+PAD_CHAR*qm1
-        attr_val_len += 2*qm1
-        
-      attr_q_gram_set = set([attr_val[i:i+q] for i in 
-                             range(attr_val_len - qm1)])
+      attr_q_gram_set = qgrams.get_q_gram_set(attr_val, q, padded)
       
       rec_q_gram_set.update(attr_q_gram_set)
     
@@ -546,13 +1790,20 @@ def get_avrg_num_q_grams(rec_val_list, use_attr_list, q, padded):
       
 # -----------------------------------------------------------------------------
 
-def align_freq_bf_attr_val(bf_dict, attr_val_freq_dict, min_freq):
+def align_freq_bf_attr_val(bf_dict, attr_val_freq_dict, min_freq,
+                           hh_capacity=None):
   """Align frequent Bloom filters with frequent attribute values and return a
      list of pairs of BF and attribute values and their frequencies.
 
      Only BFs and attribute values that occur at least 'min_freq' times will be
      considered, and only BFs and attribute values will be added to the list if
      their frequencies are unique.
+
+     If a 'hh_capacity' is given then only the exact frequencies of at most
+     this number of heavy hitter BFs are counted (see the 'heavyhitters'
+     module), using two passes over the BFs. A warning is printed if the
+     maximum count error of the first pass is not smaller than 'min_freq',
+     as then BFs that occur at least 'min_freq' times can be missed.
   """
 
   print 'Align frequent BF and frequent attribute values'
@@ -560,10 +1811,24 @@ def align_freq_bf_attr_val(bf_dict, attr_val_freq_dict, min_freq):
   # Get frequencies of all Bloom filters and keep those that occur at least
   # 'min_freq' times
   #
-  bf_freq_dict = {}
+  if (hh_capacity != None):
+    bf_freq_dict, hh_max_error = heavyhitters.count_heavy_hitters(lambda:
+                    (this_bf.to01() for this_bf in bf_dict.itervalues()),
+                                                                  hh_capacity)
+
+    # Only BFs that occur more often than the maximum count error are
+    # guaranteed to be found (at most n/(hh_capacity+1) for n BFs)
+    #
+    if (hh_max_error >= min_freq):
+      print '  ** Warning: Maximum count error of heavy hitter BFs (%d) ' % \
+            (hh_max_error) + 'is not smaller than the minimum frequency ' + \
+            '(%d), frequent BFs can be missed (increase the heavy ' % \
+            (min_freq) + 'hitter capacity of %d)' % (hh_capacity)
+  else:
+    bf_freq_dict = {}
 
-  for this_bf in bf_dict.itervalues():
-    bf_freq_dict[this_bf.to01()] = bf_freq_dict.get(this_bf.to01(), 0) + 1
+    for this_bf in bf_dict.itervalues():
+      bf_freq_dict[this_bf.to01()] = bf_freq_dict.get(this_bf.to01(), 0) + 1
 
   sorted_bf_list = []
 
@@ -622,8 +1887,19 @@ def align_freq_bf_attr_val(bf_dict, attr_val_freq_dict, min_freq):
     # Loop down the list of BFs and attribute values ordered by frequency
     #
     while (rank < max_rank):
-      next_bf_freq =       sorted_bf_list[rank+1][1]
-      next_attr_val_freq = sorted_attr_val_list[rank+1][1]
+
+      # The frequencies of the next BF and attribute value (None at the end
+      # of a list)
+      #
+      if (rank+1 < len(sorted_bf_list)):
+        next_bf_freq = sorted_bf_list[rank+1][1]
+      else:
+        next_bf_freq = None
+
+      if (rank+1 < len(sorted_attr_val_list)):
+        next_attr_val_freq = sorted_attr_val_list[rank+1][1]
+      else:
+        next_attr_val_freq = None
 
       if ((this_bf_freq == next_bf_freq) or \
           (this_attr_val_freq == next_attr_val_freq)):
@@ -634,6 +1910,9 @@ def align_freq_bf_attr_val(bf_dict, attr_val_freq_dict, min_freq):
       freq_bf_attr_val_list.append((this_bf, this_bf_freq, this_attr_val, 
                                     this_attr_val_freq))
       rank += 1
+
+      if (rank == max_rank):  # All pairs of BF and attribute values aligned
+        break
       
       this_bf =            sorted_bf_list[rank][0]
       this_bf_freq =       sorted_bf_list[rank][1]
@@ -667,15 +1946,9 @@ def analyse_bf_q_gram_freq(freq_bf_attr_val_list, bf_len, q, num_hash_funct):
   #
   attr_val_q_gram_dict = {}
 
-  qm1 = q-1
-
   for (bf, bf_freq, attr_val, attr_val_freq) in freq_bf_attr_val_list:
 
-    attr_val_len = len(attr_val)
-    attr_q_gram_list = [attr_val[i:i+q] for i in range(attr_val_len - qm1)]
-    attr_q_gram_set =  set(attr_q_gram_list)
-
-    attr_val_q_gram_dict[attr_val] = attr_q_gram_set
+    attr_val_q_gram_dict[attr_val] = qgrams.get_q_gram_set(attr_val, q, False)
 
   # Step 1: For each BF position, get a set of possible q-grams assigned to
   #         this position (and a value if their likelihoods), as well as a set
@@ -909,7 +2182,8 @@ enc_param_list =            eval(sys.argv[20])
 harden_param_list =         eval(sys.argv[21])
 
 assert q >= 1, q
-assert hash_type in ['dh','rh','edh','th'], hash_type
+assert hash_type in ['dh','rh','edh','th','crh','sdh','sedh','sth'], \
+       hash_type
 if num_hash_funct.isdigit():
   num_hash_funct = int(num_hash_funct)
   assert num_hash_funct >= 1, num_hash_funct
@@ -988,19 +2262,95 @@ print
 #
 start_time = time.time()
 
+qgrams.q_gram_cache.set_max_size(Q_GRAM_CACHE_SIZE)
+
+# The memory governor that caches and large data structures register with
+#
+mem_governor = memgov.MemoryGovernor(MAX_MEMORY_USE, MEMORY_CHECK_INTERVAL,
+                                     MEMORY_SPILL_DIR, MEMORY_MAX_NUM_OVER)
+mem_governor.register('q-gram cache',
+                      evict_funct=qgrams.q_gram_cache.evict)
+
+# Columns to keep when loading the data sets (None to keep all columns)
+#
+if (PROJECT_COLUMNS == True):
+  build_proj_col_list = sorted(set([build_rec_id_col] + build_attr_list))
+  if (bf_harden == 'salt'):
+    build_proj_col_list = sorted(set(build_proj_col_list + [SALT_COL]))
+
+  analysis_proj_col_list = sorted(set([analysis_rec_id_col] + \
+                                      analysis_attr_list))
+else:
+  build_proj_col_list =    None
+  analysis_proj_col_list = None
+
+# Positions of the record identifier, attributes to encode and the salting
+# attribute in the loaded build records
+#
+build_rec_id_pos =   get_proj_col_pos(build_rec_id_col, build_proj_col_list)
+build_attr_pos_list = [get_proj_col_pos(attr_num, build_proj_col_list) for
+                       attr_num in build_attr_list]
+if (bf_harden == 'salt'):
+  build_salt_pos = get_proj_col_pos(SALT_COL, build_proj_col_list)
+else:
+  build_salt_pos = None
+
+# Statistics of the build data set needed for the optimal number of hash
+# functions, dynamic ABF lengths, the Markov chain and the q-gram vocabulary
+# are collected while the records are loaded
+#
+if ((num_hash_funct == 'opt') or (bf_harden == 'mchain') or
+    ((bf_encode == 'rbf') and (enc_param_list[0] == 'dynamic')) or
+    (VOCAB_POS_TABLE == True)):
+  build_data_set_stats = datastats.DataSetStats(build_attr_pos_list, q,
+                                                padded,
+                                                num_hash_funct == 'opt',
+                                                bf_harden == 'mchain',
+                                                VOCAB_POS_TABLE)
+else:
+  build_data_set_stats = None
+
 # Read the input data file and load all the record values to a list
 #
 build_rec_val_res_tuple = load_data_set_extract_attr_val(build_data_set_name,
                                                          build_rec_id_col,
                                                          build_attr_list,
                                                          build_col_sep_char,
-                                                         build_header_line_flag)
+                                                         build_header_line_flag,
+                                                         LOAD_BATCH_SIZE,
+                                                         build_proj_col_list,
+                                                         LOAD_NUM_PROC,
+                                                         DATA_SET_CACHE_DIR,
+                                                         COMPACT_VAL_STORE,
+                                                         mem_governor,
+                                                         build_data_set_stats)
 
 build_rec_val_list      = build_rec_val_res_tuple[0]
 build_rec_val_dict      = build_rec_val_res_tuple[1]
 build_rec_val_id_dict   = build_rec_val_res_tuple[2]
 build_rec_val_freq_dict = build_rec_val_res_tuple[3]
 build_attr_name_list    = build_rec_val_res_tuple[4]
+
+# Sample the build data set if required
+#
+if (LOAD_SAMPLE_RATIO != None):
+  if (SAMPLE_NUM_TOP_VAL != None):
+    sample_num_top_val = SAMPLE_NUM_TOP_VAL
+  else:
+    sample_num_top_val = max(num_freq_attr_val_list)
+
+  build_rec_val_list, build_rec_val_dict, build_rec_val_id_dict, \
+           build_rec_val_freq_dict = sample_data_set(build_rec_val_list,
+                                                     build_rec_val_dict,
+                                                     build_rec_val_freq_dict,
+                                                     build_rec_id_pos,
+                                                     LOAD_SAMPLE_RATIO,
+                                                     sample_num_top_val,
+                                                     COMPACT_VAL_STORE,
+                                                     build_data_set_stats)
+  sample_ratio = LOAD_SAMPLE_RATIO
+else:
+  sample_ratio = 1.0
                                            
 build_load_time = time.time() - start_time
                                            
@@ -1010,8 +2360,7 @@ if (num_hash_funct == 'opt'):
   
   # Get average number of q-grams per record
   #
-  build_avrg_num_q_gram = get_avrg_num_q_grams(build_rec_val_list, 
-                                               build_attr_list, q, padded)
+  build_avrg_num_q_gram = build_data_set_stats.get_avrg_num_q_grams()
 
   # Set number of hash functions to have in average 50% of bits set to 1
   # (reference to published paper? Only in Dinusha's submitted papers) 
@@ -1027,14 +2376,22 @@ if (num_hash_funct == 'opt'):
 #
 start_time = time.time()
 
-build_bf_dict = gen_bloom_filter_dict(build_rec_val_list, build_rec_id_col, 
+build_bf_dict = gen_bloom_filter_dict(build_rec_val_list, build_rec_id_pos, 
                                       bf_encode, hash_type, bf_len, 
-                                      num_hash_funct, build_attr_list, q, 
+                                      num_hash_funct, build_attr_pos_list, q, 
                                       padded, bf_harden, enc_param_list, 
-                                      harden_param_list)
+                                      harden_param_list, build_salt_pos,
+                                      build_attr_list, mem_governor,
+                                      build_data_set_stats)
 
 build_bf_gen_time = time.time() - start_time
 
+num_q_gram_cache_hit, num_q_gram_cache_miss, num_q_gram_cache_val = \
+                                           qgrams.q_gram_cache.get_stats()
+print 'Q-gram cache: %d hits, %d misses, %d values in cache' % \
+      (num_q_gram_cache_hit, num_q_gram_cache_miss, num_q_gram_cache_val)
+print
+
 # Load plain-text data set and extract q-grams
 #
 start_time = time.time()
@@ -1043,7 +2400,13 @@ analysis_rec_val_res_tuple = load_data_set_extract_attr_val(analysis_data_set_na
                                                          analysis_rec_id_col,
                                                          analysis_attr_list,
                                                          analysis_col_sep_char,
-                                                         analysis_header_line_flag)
+                                                         analysis_header_line_flag,
+                                                         LOAD_BATCH_SIZE,
+                                                         analysis_proj_col_list,
+                                                         LOAD_NUM_PROC,
+                                                         DATA_SET_CACHE_DIR,
+                                                         COMPACT_VAL_STORE,
+                                                         mem_governor)
 
 analysis_rec_val_list         = analysis_rec_val_res_tuple[0]
 analysis_rec_val_dict         = analysis_rec_val_res_tuple[1]
@@ -1051,6 +2414,21 @@ analysis_rec_val_id_dict      = analysis_rec_val_res_tuple[2]
 analysis_rec_val_freq_dict    = analysis_rec_val_res_tuple[3]
 analysis_guess_attr_name_list = analysis_rec_val_res_tuple[4]
 
+# Sample the analysis data set if required
+#
+if (LOAD_SAMPLE_RATIO != None):
+  analysis_rec_id_pos = get_proj_col_pos(analysis_rec_id_col,
+                                         analysis_proj_col_list)
+
+  analysis_rec_val_list, analysis_rec_val_dict, analysis_rec_val_id_dict, \
+        analysis_rec_val_freq_dict = sample_data_set(analysis_rec_val_list,
+                                                     analysis_rec_val_dict,
+                                                     analysis_rec_val_freq_dict,
+                                                     analysis_rec_id_pos,
+                                                     LOAD_SAMPLE_RATIO,
+                                                     sample_num_top_val,
+                                                     COMPACT_VAL_STORE)
+
 analysis_load_time = time.time() - start_time
 
 if (build_attr_name_list != analysis_guess_attr_name_list):
@@ -1065,7 +2443,7 @@ if (build_attr_name_list != analysis_guess_attr_name_list):
 #
 analysis_freq_bf_attr_val_list = align_freq_bf_attr_val(build_bf_dict, 
                                               analysis_rec_val_freq_dict,
-                                              min_freq)
+                                              min_freq, HEAVY_HITTER_CAPACITY)
 analysis_num_unique_freq_bf_attr_val = len(analysis_freq_bf_attr_val_list)
 
 # Check if most frequent BF's frequency is higher than 1
@@ -1188,7 +2566,11 @@ if(len(analysis_freq_bf_attr_val_list) > 0):
     print '####   BF hardening: %s' % (bf_harden)
     print '####   Hashing type: %s' % \
           ({'dh':'Double hashing', 'rh':'Random hashing', 
-            'edh':'Enhanced Double hashing', 'th':'Triple hashing'}[hash_type])
+            'edh':'Enhanced Double hashing', 'th':'Triple hashing',
+            'crh':'Counter-based random hashing',
+            'sdh':'Single-digest double hashing',
+            'sedh':'Single-digest enhanced double hashing',
+            'sth':'Single-digest triple hashing'}[hash_type])
     print '#### Number of unique frequent BF and attribute values ' + \
           '(analysis): %d' % (analysis_num_unique_freq_bf_attr_val)
   
@@ -1246,6 +2628,7 @@ if(len(analysis_freq_bf_attr_val_list) > 0):
                       'res_eval_time']
     
     header_list += attak_res_header
+    header_list += ['sample_ratio']
   
     # Check if the result file exists, if it does append, otherwise create
     #
@@ -1301,6 +2684,7 @@ if(len(analysis_freq_bf_attr_val_list) > 0):
                        ]
     
     res_list += attack_res_list
+    res_list += [sample_ratio]
       
   
     assert len(res_list) == len(header_list)
@@ -1343,7 +2727,11 @@ else:
   print '####   BF hardening: %s' % (bf_harden)
   print '####   Hashing type: %s' % \
         ({'dh':'Double hashing', 'rh':'Random hashing', 
-          'edh':'Enhanced double hashing', 'th':'Triple hashing'}[hash_type])
+          'edh':'Enhanced double hashing', 'th':'Triple hashing',
+          'crh':'Counter-based random hashing',
+          'sdh':'Single-digest double hashing',
+          'sedh':'Single-digest enhanced double hashing',
+          'sth':'Single-digest triple hashing'}[hash_type])
   print '#### Number of unique frequent BF and attribute values ' + \
         '(analysis): %d' % (analysis_num_unique_freq_bf_attr_val)
 
@@ -1377,7 +2765,7 @@ else:
                  'analysis_analyse_time', 'memo_use', \
                  'analysis_num_correct_1', \
                  'analysis_num_correct_m', 'analysis_num_wrong', \
-                 'analysis_num_no']
+                 'analysis_num_no', 'sample_ratio']
 #                 'analysis_estim_k1', 'analysis_estim_k2']
 
   # Check if the result file exists, if it does append, otherwise create
@@ -1408,10 +2796,14 @@ else:
               analysis_load_time, analysis_analyse_time,
               auxiliary.get_memory_usage_val(),
               analysis_num_correct_1_guess, analysis_num_correct_m_guess,
-              analysis_num_wrong_guess, analysis_num_no_guess]
+              analysis_num_wrong_guess, analysis_num_no_guess, sample_ratio]
 
   assert len(res_list) == len(header_list)
 
   csv_writer.writerow(res_list)
 
+# Remove the files of data structures spilled to disk
+#
+mem_governor.close()
+
 # End.
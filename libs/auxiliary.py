@@ -303,6 +303,32 @@ def get_memory_usage_val():
 
 # =============================================================================
 
+def get_memory_rss_val():
+  """Function which returns the current resident set size (the amount of
+     physical memory used) of the program in megabytes, as read from
+     '/proc/self/statm'. Currently only works on Linux!
+
+     Returns None if the resident set size cannot be calculated.
+  """
+
+  try:
+    ps = open('/proc/self/statm')
+    vs = ps.read()
+    ps.close()
+
+    page_size = os.sysconf('SC_PAGE_SIZE')
+  except:
+    return None  # Likely not on a Linux machine
+
+  statm_list = vs.split()
+
+  if (len(statm_list) < 2):
+    return None  # Invalid format in status information
+
+  return float(statm_list[1])*page_size/1048576.0
+
+# =============================================================================
+
 def check_memory_use(max_mbyte):
   """Stop the program if it uses more than the maximum specified amount of
      memory in Megabytes.
@@ -0,0 +1,415 @@
+# datacache.py - Module that implements a binary cache of loaded data sets
+#
+# October 2026
+# -----------------------------------------------------------------------------
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# =============================================================================
+
+import array
+import hashlib
+import os
+import shutil
+
+import numpy
+
+import valstore
+
+# Names of the NumPy files a cached data set consists of (string tables are
+# stored as a byte buffer and an offset array each)
+#
+CACHE_FILE_NAME_LIST = ['val_buf', 'val_off', 'rec_code', 'rec_id_buf',
+                        'rec_id_off', 'rec_val_code', 'freq_val_buf',
+                        'freq_val_off', 'freq_count', 'header_buf',
+                        'header_off', 'load_info']
+
+# =============================================================================
+
+def get_cache_dir_name(cache_base_dir, file_name, col_sep_char, header_line,
+                       rec_id_col, use_attr_list, proj_col_list):
+  """Return the name of the directory in which the given data set is cached.
+
+     The name contains a key calculated from the path, modification time and
+     size of the data set file as well as from all arguments used to load it,
+     so a changed file or different load settings result in a new cache.
+  """
+
+  file_stat = os.stat(file_name)
+
+  key_str = repr((os.path.abspath(file_name), file_stat.st_mtime,
+                  file_stat.st_size, col_sep_char, header_line, rec_id_col,
+                  use_attr_list, proj_col_list))
+
+  key = hashlib.sha1(key_str).hexdigest()[:16]
+
+  return os.path.join(cache_base_dir, os.path.basename(file_name)+'-'+key)
+
+# -----------------------------------------------------------------------------
+
+def is_cached(cache_dir_name):
+  """Return True if a complete cache exists in the given directory.
+  """
+
+  for cache_file_name in CACHE_FILE_NAME_LIST:
+    if (not os.path.isfile(os.path.join(cache_dir_name,
+                                        cache_file_name+'.npy'))):
+      return False
+
+  return True
+
+# -----------------------------------------------------------------------------
+
+def str_list_to_arrays(str_list):
+  """Convert the given list of strings into a byte buffer array (with all
+     strings concatenated) and an array of offsets into this buffer, where
+     string 'i' is stored in 'buf[off[i]:off[i+1]]'.
+  """
+
+  str_off_array = numpy.zeros(len(str_list)+1, dtype=numpy.int64)
+  str_off_array[1:] = numpy.cumsum([len(s) for s in str_list])
+
+  str_buf_array = numpy.frombuffer(''.join(str_list), dtype=numpy.uint8)
+
+  return str_buf_array, str_off_array
+
+# -----------------------------------------------------------------------------
+
+def arrays_to_str_list(str_buf_array, str_off_array):
+  """Convert a byte buffer and offset array (as generated by
+     'str_list_to_arrays') back into a list of strings.
+  """
+
+  str_buf = str_buf_array.tostring()
+  str_off_list = str_off_array.tolist()
+
+  return [str_buf[str_off_list[i]:str_off_list[i+1]] for i in
+          xrange(len(str_off_list)-1)]
+
+# -----------------------------------------------------------------------------
+
+def arrays_to_str_dict(str_buf_array, str_off_array, str_num_list):
+  """Convert only the strings with the given numbers in a byte buffer and
+     offset array (as generated by 'str_list_to_arrays') into strings, and
+     return a dictionary with the numbers as keys and the strings as values.
+  """
+
+  str_dict = {}
+
+  for str_num in str_num_list:
+    str_dict[str_num] = str_buf_array[str_off_array[str_num]:
+                                      str_off_array[str_num+1]].tostring()
+
+  return str_dict
+
+# =============================================================================
+
+class DataSetCacheWriter():
+  """Collect the records of a data set while it is being loaded and write
+     them into a cache directory.
+
+     Each distinct attribute value is stored once in a value table, and
+     records are stored as rows of integer codes into this table.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self):
+    """Initialise the cache writer.
+
+       Input arguments:
+         - This method does not require any input arguments.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    self.val_code_dict =     {}  # Distinct attribute values and their codes
+    self.rec_val_code_dict = {}  # Distinct joined record values and codes
+
+    self.rec_code_array =     array.array('i')  # Value codes of all records
+    self.rec_val_code_array = array.array('i')  # Record value code of records
+    self.rec_id_list =        []
+
+    self.num_col = None
+
+  # ---------------------------------------------------------------------------
+
+  def add_rec(self, rec_val_list, rec_id, rec_val):
+    """Add the given record to the cache.
+
+       Input arguments:
+         - rec_val_list  The list of attribute values of the record.
+         - rec_id        The identifier of the record.
+         - rec_val       The joined values of the attributes used.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    if (self.num_col == None):
+      self.num_col = len(rec_val_list)
+    else:
+      assert len(rec_val_list) == self.num_col, (len(rec_val_list),
+                                                 self.num_col)
+
+    val_code_dict = self.val_code_dict  # Short-cut
+
+    for attr_val in rec_val_list:
+      val_code = val_code_dict.get(attr_val)
+      if (val_code == None):
+        val_code = len(val_code_dict)
+        val_code_dict[attr_val] = val_code
+      self.rec_code_array.append(val_code)
+
+    rec_val_code = self.rec_val_code_dict.get(rec_val)
+    if (rec_val_code == None):
+      rec_val_code = len(self.rec_val_code_dict)
+      self.rec_val_code_dict[rec_val] = rec_val_code
+    self.rec_val_code_array.append(rec_val_code)
+
+    self.rec_id_list.append(rec_id)
+
+  # ---------------------------------------------------------------------------
+
+  def save(self, cache_dir_name, header_list, num_rec_with_removed,
+           num_rec_with_conf):
+    """Write the collected records, their record value frequencies and the
+       given load information into the given cache directory.
+
+       The files are first written into a temporary directory which is then
+       renamed, so an interrupted run does not leave a partial cache. If
+       another process (loading the same data set in parallel) already saved
+       a complete cache into the directory then this cache is kept and the
+       temporary directory is removed. The temporary directory is also
+       removed if saving fails.
+
+       Input arguments:
+         - cache_dir_name        The name of the cache directory.
+         - header_list           The header line of the data set (or None).
+         - num_rec_with_removed  The number of removed records.
+         - num_rec_with_conf     The number of confidential records.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    num_rec = len(self.rec_id_list)
+    num_col = self.num_col if (self.num_col != None) else 0
+
+    val_list = [None]*len(self.val_code_dict)
+    for (attr_val, val_code) in self.val_code_dict.iteritems():
+      val_list[val_code] = attr_val
+
+    freq_val_list = [None]*len(self.rec_val_code_dict)
+    for (rec_val, rec_val_code) in self.rec_val_code_dict.iteritems():
+      freq_val_list[rec_val_code] = rec_val
+
+    freq_count_array = numpy.bincount(numpy.frombuffer(self.rec_val_code_array,
+                                                       dtype=numpy.int32),
+                                      minlength=len(freq_val_list)).astype(
+                                                                 numpy.int64)
+
+    if (header_list == None):
+      has_header = 0
+      header_list = []
+    else:
+      has_header = 1
+
+    cache_array_dict = {}
+
+    cache_array_dict['val_buf'], cache_array_dict['val_off'] = \
+                                                 str_list_to_arrays(val_list)
+    cache_array_dict['rec_code'] = \
+             numpy.frombuffer(self.rec_code_array,
+                              dtype=numpy.int32).reshape(num_rec, num_col)
+    cache_array_dict['rec_id_buf'], cache_array_dict['rec_id_off'] = \
+                                          str_list_to_arrays(self.rec_id_list)
+    cache_array_dict['rec_val_code'] = \
+             numpy.frombuffer(self.rec_val_code_array, dtype=numpy.int32)
+    cache_array_dict['freq_val_buf'], cache_array_dict['freq_val_off'] = \
+                                            str_list_to_arrays(freq_val_list)
+    cache_array_dict['freq_count'] = freq_count_array
+    cache_array_dict['header_buf'], cache_array_dict['header_off'] = \
+                                              str_list_to_arrays(header_list)
+    cache_array_dict['load_info'] = numpy.array([num_rec_with_removed,
+                                                 num_rec_with_conf,
+                                                 has_header],
+                                                dtype=numpy.int64)
+
+    tmp_dir_name = cache_dir_name + '.tmp%d' % (os.getpid())
+
+    try:
+      if (not os.path.isdir(tmp_dir_name)):
+        os.makedirs(tmp_dir_name)
+
+      for cache_file_name in CACHE_FILE_NAME_LIST:
+        numpy.save(os.path.join(tmp_dir_name, cache_file_name+'.npy'),
+                   cache_array_dict[cache_file_name])
+
+      try:
+        os.rename(tmp_dir_name, cache_dir_name)
+
+      except OSError:  # Directory exists, only use it if it is complete
+        if (not is_cached(cache_dir_name)):
+          raise
+        shutil.rmtree(tmp_dir_name)
+
+    except:
+      shutil.rmtree(tmp_dir_name, ignore_errors=True)
+      raise
+
+# =============================================================================
+
+class DataSetCache():
+  """Access to a data set cached by the 'DataSetCacheWriter' class. All
+     arrays are memory-mapped and no values are converted back into strings
+     when the cache is opened: records are converted when they are accessed
+     (only decoding the distinct values of each batch of records), and the
+     record values only when their dictionaries are requested.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, cache_dir_name):
+    """Open the cache in the given directory.
+
+       Input arguments:
+         - cache_dir_name  The name of the cache directory.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert is_cached(cache_dir_name), cache_dir_name
+
+    cache_array_dict = {}
+
+    for cache_file_name in CACHE_FILE_NAME_LIST:
+      cache_array_dict[cache_file_name] = \
+         numpy.load(os.path.join(cache_dir_name, cache_file_name+'.npy'),
+                    mmap_mode='r')
+
+    self.val_buf_array = cache_array_dict['val_buf']
+    self.val_off_array = cache_array_dict['val_off']
+
+    self.rec_code_array =     cache_array_dict['rec_code']
+    self.rec_val_code_array = cache_array_dict['rec_val_code']
+    self.rec_id_buf_array =   cache_array_dict['rec_id_buf']
+    self.rec_id_off_array =   cache_array_dict['rec_id_off']
+
+    self.freq_val_buf_array = cache_array_dict['freq_val_buf']
+    self.freq_val_off_array = cache_array_dict['freq_val_off']
+    self.freq_count_array =   cache_array_dict['freq_count']
+
+    num_rec_with_removed, num_rec_with_conf, has_header = \
+                                          cache_array_dict['load_info'].tolist()
+
+    if (has_header == 1):
+      self.header_list = arrays_to_str_list(cache_array_dict['header_buf'],
+                                            cache_array_dict['header_off'])
+    else:
+      self.header_list = None
+
+    self.num_rec_with_removed = num_rec_with_removed
+    self.num_rec_with_conf =    num_rec_with_conf
+
+  # ---------------------------------------------------------------------------
+
+  def get_num_rec(self):
+    """Return the number of records in the cache.
+    """
+
+    return self.rec_code_array.shape[0]
+
+  # ---------------------------------------------------------------------------
+
+  def gen_rec_batches(self, batch_size=None):
+    """Generator which yields lists (batches) of at most 'batch_size' records
+       (all records in one batch if 'batch_size' is None), where each record
+       is a list of its attribute values.
+    """
+
+    num_rec = self.get_num_rec()
+
+    if (batch_size == None):
+      batch_size = max(num_rec, 1)
+
+    for start_pos in xrange(0, num_rec, batch_size):
+      rec_code_array = self.rec_code_array[start_pos:start_pos+batch_size]
+
+      # Only decode the distinct values used in this batch
+      #
+      val_dict = arrays_to_str_dict(self.val_buf_array, self.val_off_array,
+                                    numpy.unique(rec_code_array).tolist())
+
+      yield [[val_dict[val_code] for val_code in val_code_list] for
+             val_code_list in rec_code_array.tolist()]
+
+  # ---------------------------------------------------------------------------
+
+  def get_rec_val_dicts(self):
+    """Return the dictionary of record values (keys are record identifiers),
+       the dictionary of record identifier sets (keys are record values) and
+       the dictionary of record value frequencies, as generated when the data
+       set was loaded.
+    """
+
+    rec_id_list =   arrays_to_str_list(self.rec_id_buf_array,
+                                       self.rec_id_off_array)
+    freq_val_list = arrays_to_str_list(self.freq_val_buf_array,
+                                       self.freq_val_off_array)
+
+    rec_val_dict =    {}
+    rec_val_id_dict = {}
+
+    for (rec_id, rec_val_code) in zip(rec_id_list,
+                                      self.rec_val_code_array.tolist()):
+      rec_val = freq_val_list[rec_val_code]
+
+      rec_val_dict[rec_id] = rec_val
+
+      val_id_set = rec_val_id_dict.get(rec_val, set())
+      val_id_set.add(rec_id)
+      rec_val_id_dict[rec_val] = val_id_set
+
+    rec_val_freq_dict = dict(zip(freq_val_list,
+                                 self.freq_count_array.tolist()))
+
+    return rec_val_dict, rec_val_id_dict, rec_val_freq_dict
+
+  # ---------------------------------------------------------------------------
+
+  def get_rec_val_store(self):
+    """Return a frozen record value store (see the 'valstore' module) with
+       the record identifiers and record values of the cached data set.
+    """
+
+    rec_id_list =   arrays_to_str_list(self.rec_id_buf_array,
+                                       self.rec_id_off_array)
+    freq_val_list = arrays_to_str_list(self.freq_val_buf_array,
+                                       self.freq_val_off_array)
+
+    rec_val_store = valstore.RecValStore()
+
+    for (rec_id, rec_val_code) in zip(rec_id_list,
+                                      self.rec_val_code_array.tolist()):
+      rec_val_store.add_rec(rec_id, freq_val_list[rec_val_code])
+
+    rec_val_store.freeze()
+
+    return rec_val_store
+
+# =============================================================================
+# End.
@@ -0,0 +1,250 @@
+# datastats.py - Module that implements a collector of data set statistics
+#                which is fed with records while a data set is loaded
+#
+# October 2026
+# -----------------------------------------------------------------------------
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# =============================================================================
+
+import qgrams  # Shared cache of q-grams extracted from values
+
+# =============================================================================
+
+class DataSetStats():
+  """Collect statistics about the attributes of a data set in a single pass
+     over its records, so that the steps which need them (the optimal number
+     of hash functions, dynamic attribute-level Bloom filter lengths for
+     record-level Bloom filters, and the Markov chain language model) do not
+     need to read all records again.
+
+     The following statistics are collected for the attributes at the given
+     positions of the records:
+       - the sums of the numbers of q-grams of each attribute value,
+       - the sums of the lengths of each attribute value,
+       - (optional) the sum of the numbers of q-grams of the records (over
+         all attributes, with q-grams occurring in several attributes
+         counted once),
+       - (optional) the counts of pairs of consecutive q-grams in the values
+         of all attributes of a record joined with a whitespace,
+       - (optional) the vocabulary of q-grams occurring in the attributes.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, attr_pos_list, q, padded, collect_rec_q_grams=True,
+               collect_trans=False, collect_vocab=False):
+    """Initialise the statistics collector.
+
+       Input arguments:
+         - attr_pos_list        The positions of the attributes to collect
+                                statistics for in the records.
+         - q                    The length of q-grams.
+         - padded               A flag, if set to True then attribute values
+                                are padded before q-grams are extracted.
+         - collect_rec_q_grams  A flag, if set to True then the numbers of
+                                q-grams of records are collected.
+         - collect_trans        A flag, if set to True then the counts of
+                                pairs of consecutive q-grams are collected.
+         - collect_vocab        A flag, if set to True then the set of all
+                                q-grams is collected.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    self.attr_pos_list =       attr_pos_list
+    self.q =                   q
+    self.padded =              padded
+    self.collect_rec_q_grams = collect_rec_q_grams
+    self.collect_trans =       collect_trans
+    self.collect_vocab =       collect_vocab
+
+    self.reset()
+
+  # ---------------------------------------------------------------------------
+
+  def reset(self):
+    """Remove all collected statistics.
+    """
+
+    num_attr = len(self.attr_pos_list)
+
+    self.num_rec = 0
+
+    self.attr_q_gram_sum_list = [0]*num_attr
+    self.attr_val_len_sum_list = [0]*num_attr
+
+    self.rec_q_gram_sum = 0
+
+    self.trans_count_dict = {}
+
+    self.q_gram_vocab_set = set()
+
+  # ---------------------------------------------------------------------------
+
+  def add_rec(self, attr_val_list):
+    """Add the given record (a list of attribute values) to the statistics.
+    """
+
+    q =      self.q  # Short-cuts
+    padded = self.padded
+
+    attr_q_gram_sum_list =  self.attr_q_gram_sum_list
+    attr_val_len_sum_list = self.attr_val_len_sum_list
+
+    if (self.collect_rec_q_grams == True):
+      rec_q_gram_set = set()
+
+    for (j, attr_pos) in enumerate(self.attr_pos_list):
+      attr_val = attr_val_list[attr_pos]
+
+      q_gram_set = qgrams.get_q_gram_set(attr_val, q, padded)
+
+      attr_q_gram_sum_list[j] +=  len(q_gram_set)
+      attr_val_len_sum_list[j] += len(attr_val)
+
+      if (self.collect_rec_q_grams == True):
+        rec_q_gram_set.update(q_gram_set)
+
+      if (self.collect_vocab == True):
+        self.q_gram_vocab_set.update(q_gram_set)
+
+    if (self.collect_rec_q_grams == True):
+      self.rec_q_gram_sum += len(rec_q_gram_set)
+
+    if (self.collect_trans == True):
+      rec_str = ' '.join([attr_val_list[attr_pos] for attr_pos in
+                          self.attr_pos_list])
+
+      qgrams.add_q_gram_trans_counts(qgrams.get_q_gram_list(rec_str, q,
+                                                            padded),
+                                     self.trans_count_dict)
+
+    self.num_rec += 1
+
+  # ---------------------------------------------------------------------------
+
+  def get_avrg_num_q_grams(self):
+    """Return the average number of q-grams per record.
+    """
+
+    assert self.collect_rec_q_grams == True
+    assert self.num_rec > 0
+
+    return float(self.rec_q_gram_sum) / self.num_rec
+
+  # ---------------------------------------------------------------------------
+
+  def get_avr_num_q_gram_dict(self):
+    """Return a dictionary where keys are attribute positions and values
+       their average numbers of q-grams (as calculated by the method
+       'get_avr_num_q_grams' of the 'RecordBFEncoding' class).
+    """
+
+    assert self.num_rec > 0
+
+    avr_num_q_gram_dict = {}
+
+    print 'Calculate average number of q-grams for attributes:'
+
+    for (j, attr_pos) in enumerate(self.attr_pos_list):
+      attr_avr_num_q_gram = float(self.attr_q_gram_sum_list[j]) / self.num_rec
+
+      print '  Attribute number %d has an average number of q-grams of %.2f' \
+            % (attr_pos, attr_avr_num_q_gram)
+
+      avr_num_q_gram_dict[attr_pos] = attr_avr_num_q_gram
+
+    return avr_num_q_gram_dict
+
+  # ---------------------------------------------------------------------------
+
+  def get_avr_val_len_dict(self):
+    """Return a dictionary where keys are attribute positions and values
+       their average value lengths.
+    """
+
+    assert self.num_rec > 0
+
+    avr_val_len_dict = {}
+
+    for (j, attr_pos) in enumerate(self.attr_pos_list):
+      avr_val_len_dict[attr_pos] = \
+                        float(self.attr_val_len_sum_list[j]) / self.num_rec
+
+    return avr_val_len_dict
+
+  # ---------------------------------------------------------------------------
+
+  def get_trans_count_dict(self):
+    """Return the dictionary of counts of pairs of consecutive q-grams (see
+       'qgrams.add_q_gram_trans_counts'), as used by the 'MarkovChain'
+       hardening class.
+    """
+
+    assert self.collect_trans == True
+
+    return self.trans_count_dict
+
+  # ---------------------------------------------------------------------------
+
+  def get_q_gram_vocab(self):
+    """Return the set of all q-grams occurring in the attributes.
+    """
+
+    assert self.collect_vocab == True
+
+    return self.q_gram_vocab_set
+
+# =============================================================================
+# Do some tests if called from command line
+
+if (__name__ == '__main__'):
+
+  print 'Running some tests:'
+  print
+
+  test_stats = DataSetStats([1, 2], 2, False, True, True, True)
+
+  test_stats.add_rec(['1', 'anna', 'smith'])
+  test_stats.add_rec(['2', 'peter', 'nash'])
+
+  # 'anna' has 3, 'smith' 4, 'peter' 4 and 'nash' 3 distinct q-grams, and
+  # the q-grams of the two values of each record do not overlap
+  #
+  assert test_stats.get_avr_num_q_gram_dict() == {1:3.5, 2:3.5}
+  assert test_stats.get_avr_val_len_dict() == {1:4.5, 2:4.5}
+  assert test_stats.get_avrg_num_q_grams() == 7.0
+
+  test_trans_count_dict = test_stats.get_trans_count_dict()
+  assert test_trans_count_dict['an'] == {'nn':1}
+  assert test_trans_count_dict['a '] == {' s':1}
+  assert test_trans_count_dict['na'] == {'a ':1, 'as':1}
+
+  assert test_stats.get_q_gram_vocab() == set(['an', 'nn', 'na', 'sm', 'mi',
+                                               'it', 'th', 'pe', 'et', 'te',
+                                               'er', 'as', 'sh'])
+  print '  Data set statistics correct'
+
+  test_stats.reset()
+  assert test_stats.num_rec == 0 and test_stats.get_trans_count_dict() == {}
+  assert test_stats.get_q_gram_vocab() == set()
+
+  print
+  print 'All tests passed'
+
+# =============================================================================
+# End.
@@ -30,16 +30,52 @@
 #
 # =============================================================================
 
+import collections
 import random
 
 import numpy  # For the dynamic bitposition selection in Record level BFs
 
 import bitarray
 
+import hashing
+import qgrams  # Shared cache of q-gram sets extracted from values
+
 PAD_CHAR = chr(1)   # Used for q-gram padding
 
 # =============================================================================
 
+def rec_list_to_col_batch(rec_list):
+  """Convert the given list of records (each a list of attribute values)
+     into a column-oriented batch, a list with one list of the values of all
+     records per attribute, as used by the 'encode_batch' methods of the
+     encoding classes.
+  """
+
+  return [list(col_val_tuple) for col_val_tuple in zip(*rec_list)]
+
+# -----------------------------------------------------------------------------
+
+def gen_rec_id_index(rec_id_list):
+  """Return a dictionary with the given record identifiers as keys and
+     their row numbers in a matrix of Bloom filters (as returned by the
+     'encode_batch' methods) as values (for a repeated identifier the last
+     row is used).
+  """
+
+  return dict(zip(rec_id_list, xrange(len(rec_id_list))))
+
+# -----------------------------------------------------------------------------
+
+def get_col_q_gram_set_list(col_val_list, q, padded):
+  """Return a list with the q-gram set of each value in the given column.
+  """
+
+  get_q_gram_set = qgrams.get_q_gram_set  # Short-cut
+
+  return [get_q_gram_set(attr_val, q, padded) for attr_val in col_val_list]
+
+# =============================================================================
+
 class AttributeBFEncoding():
   """Attribute-level Bloom filter encoding was proposed and used by:
        - R. Schnell, T. Bachteler, and J. Reiher, Privacy-preserving record
@@ -108,10 +144,11 @@ class AttributeBFEncoding():
                             hashing method and the value in the selected
                             attribute.
          - q_gram_pos_dict  [Only returned if 'get_q_gram_pos' is set to True
-                            in the hashing method]
+                            or 'array' in the hashing method]
                             A dictionary which has q-grams as keys and where
                             values are sets with the positions these q-grams
-                            are hashed to.
+                            are hashed to (or 'QGramPosArrays' if
+                            'get_q_gram_pos' is set to 'array').
     """
 
     # Check there are enough attribute values
@@ -119,19 +156,11 @@ class AttributeBFEncoding():
     if (self.attr_num >= len(attr_val_list)):
         raise Exception, 'Not enough attributes provided'
 
-    q = self.q  # Short-cuts
-    qm1 = q - 1
-
     # Get attribute value and convert it into a q-gram set
     #
     attr_val = attr_val_list[self.attr_num]
 
-    if (self.padded == True):  # Add padding start and end characters
-      attr_val = PAD_CHAR*qm1+attr_val+PAD_CHAR*qm1
-
-    attr_val_len = len(attr_val)
-
-    q_gram_set = set([attr_val[i:i+q] for i in xrange(attr_val_len - qm1)])
+    q_gram_set = qgrams.get_q_gram_set(attr_val, self.q, self.padded)
 
     if (mc_harden_class != None):
       extra_q_gram_set = \
@@ -140,7 +169,7 @@ class AttributeBFEncoding():
 
     # Check if q-gram position dictionary is required or not
     #
-    if (self.hash_class.get_q_gram_pos == True):
+    if (self.hash_class.get_q_gram_pos in [True, 'array']):
       bf, q_gram_pos_dict = self.hash_class.hash_q_gram_set(q_gram_set, 
                                                             salt_str)
       return bf, q_gram_pos_dict
@@ -149,6 +178,137 @@ class AttributeBFEncoding():
       bf = self.hash_class.hash_q_gram_set(q_gram_set, salt_str)
       return bf
 
+  # ---------------------------------------------------------------------------
+
+  def encode_batch(self, col_val_list, rec_id_list, salt_str_list=None):
+    """Encode the values in attribute 'attr_num' of a batch of records
+       into Bloom filters in one step, in the same way as the 'encode' method
+       (the q-gram position dictionary and Markov chain hardening are not
+       supported).
+
+       Input arguments:
+         - col_val_list   A column-oriented batch of records (see the function
+                          'rec_list_to_col_batch'), where only the column at
+                          index 'attr_num' is encoded.
+         - rec_id_list    A list with the identifiers of the records.
+         - salt_str_list  An optional list with one salting string (or None)
+                          for each record.
+
+       Output:
+         - bf_matrix     A NumPy uint8 array with one row of packed bits (see
+                         the function 'hashing.gen_packed_bf_matrix') for
+                         each record.
+         - rec_id_index  A dictionary with record identifiers as keys and
+                         their row numbers in 'bf_matrix' as values.
+    """
+
+    if (self.attr_num >= len(col_val_list)):
+        raise Exception, 'Not enough attributes provided'
+
+    attr_col_list = col_val_list[self.attr_num]
+    assert len(attr_col_list) == len(rec_id_list)
+
+    q_gram_set_list = get_col_q_gram_set_list(attr_col_list, self.q,
+                                              self.padded)
+
+    bf_matrix = self.hash_class.hash_q_gram_set_list(q_gram_set_list,
+                                                     salt_str_list)
+
+    return bf_matrix, gen_rec_id_index(rec_id_list)
+
+# =============================================================================
+
+class AttrBFCache():
+  """A bounded cache of the Bloom filters of attribute values, kept as rows
+     of packed bits (see the function 'hashing.gen_packed_bf_matrix'), so the
+     Bloom filter of a value that occurs in many records is only generated
+     once. Keys are tuples of the position of the attribute in the
+     'attr_encode_tuple_list' of an encoding, the attribute value, and the
+     salting string (or None). When the cache is full the least recently used
+     value is removed.
+
+     Rows are shared between all callers and must not be modified.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, max_size):
+    """Initialise the attribute Bloom filter cache.
+
+       Input arguments:
+         - max_size  The maximum number of attribute values to keep in the
+                     cache.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert max_size > 0, max_size
+
+    self.max_size = max_size
+
+    self.cache_dict = collections.OrderedDict()  # From least to most recently
+                                                 # used attribute value
+    self.num_hit =  0
+    self.num_miss = 0
+
+  # ---------------------------------------------------------------------------
+
+  def get_bf_row(self, cache_key):
+    """Return the row of packed bits of the Bloom filter of the given key, or
+       None if the key is not in the cache.
+    """
+
+    cache_dict = self.cache_dict  # Short-cut
+
+    bf_row = cache_dict.pop(cache_key, None)
+
+    if (bf_row is None):
+      self.num_miss += 1
+
+    else:
+      self.num_hit += 1
+      cache_dict[cache_key] = bf_row  # Now the most recently used value
+
+    return bf_row
+
+  # ---------------------------------------------------------------------------
+
+  def add_bf_row(self, cache_key, bf_row):
+    """Add the row of packed bits of the Bloom filter of the given key to the
+       cache.
+    """
+
+    cache_dict = self.cache_dict  # Short-cut
+
+    if ((cache_key not in cache_dict) and (len(cache_dict) >= self.max_size)):
+      cache_dict.popitem(last=False)  # Remove least recently used value
+
+    cache_dict[cache_key] = bf_row
+
+  # ---------------------------------------------------------------------------
+
+  def evict(self):
+    """Remove all attribute values from the cache (but keep the hit and miss
+       counters) and return the number of values removed. Used to release
+       memory.
+    """
+
+    num_val = len(self.cache_dict)
+
+    self.cache_dict.clear()
+
+    return num_val
+
+  # ---------------------------------------------------------------------------
+
+  def get_stats(self):
+    """Return the number of cache hits, cache misses and the number of
+       attribute values currently in the cache.
+    """
+
+    return self.num_hit, self.num_miss, len(self.cache_dict)
+
 # =============================================================================
 
 class CryptoLongtermKeyBFEncoding():
@@ -163,7 +323,7 @@ class CryptoLongtermKeyBFEncoding():
 
   # ---------------------------------------------------------------------------
 
-  def __init__(self, attr_encode_tuple_list):
+  def __init__(self, attr_encode_tuple_list, abf_cache_size=0):
     """Initialise the cryptographic long-term key Bloom filter class by
        providing the required parameters.
 
@@ -189,6 +349,13 @@ class CryptoLongtermKeyBFEncoding():
                                                  (as implemented in the
                                                  hashing.py module which
                                                  generates one Bloom filter).
+         - abf_cache_size          The maximum number of attribute values
+                                   whose Bloom filters are kept in a cache
+                                   (see the class 'AttrBFCache'), so values
+                                   occurring in many records are only hashed
+                                   once. The cache is not used if q-gram
+                                   positions or Markov chain hardening are
+                                   required. Default is 0 (no cache).
 
        Output:
          - This method does not return anything.
@@ -196,12 +363,27 @@ class CryptoLongtermKeyBFEncoding():
        Important is that all hashing methods must generate Bloom filters of the
        same length (individual attribute level Bloom filters which will be
        combined using bit-wise OR).
+
+       If all hashing classes are vocabulary position tables (see the class
+       'VocabPosTable' in the hashing.py module) then the bit positions of
+       all attributes are gathered and set in one step.
     """
 
     self.type = 'CLK'  # To identify the encoding method
 
     self.attr_encode_tuple_list = attr_encode_tuple_list
 
+    self.vocab_pos_table_flag = True
+    for attr_encode_tuple in attr_encode_tuple_list:
+      if (not isinstance(attr_encode_tuple[3], hashing.VocabPosTable)):
+        self.vocab_pos_table_flag = False
+
+    assert abf_cache_size >= 0, abf_cache_size
+    if (abf_cache_size > 0):
+      self.abf_cache = AttrBFCache(abf_cache_size)
+    else:
+      self.abf_cache = None
+
   # ---------------------------------------------------------------------------
 
   def encode(self, attr_val_list, salt_str_list=None, mc_harden_class=None):
@@ -229,20 +411,31 @@ class CryptoLongtermKeyBFEncoding():
                             hashing method and the value in the selected
                             attributes.
          - q_gram_pos_dict  [Only returned if 'get_q_gram_pos' is set to True
-                            in the hashing method]
+                            or 'array' in the hashing method]
                             A dictionary which has q-grams as keys and where
                             values are sets with the positions these q-grams
-                            are hashed to.
+                            are hashed to (or 'QGramPosArrays' if
+                            'get_q_gram_pos' is set to 'array').
     """
 
     clk_bf = None  # Start with a non-initialised BF
 
     get_bit_pos_flag = self.attr_encode_tuple_list[0][3].get_q_gram_pos
-    assert (get_bit_pos_flag in [True,False])
+    assert (get_bit_pos_flag in [True,False,'array'])
 
     if (get_bit_pos_flag == True):
       all_q_gram_pos_dict = {}  # A dictionary with q-grams and their positions
 
+    elif (get_bit_pos_flag == 'array'):
+      q_gram_pos_arrays_list = []  # Positions of the q-grams of each attribute
+
+    elif ((self.abf_cache != None) and (mc_harden_class == None)):
+      return self.encode_cached(attr_val_list, salt_str_list)
+
+    elif (self.vocab_pos_table_flag == True):
+      return self.encode_vocab_pos(attr_val_list, salt_str_list,
+                                   mc_harden_class)
+
     for (j, attr_encode_tuple) in enumerate(self.attr_encode_tuple_list):
       attr_num =   attr_encode_tuple[0]
       q =          attr_encode_tuple[1]
@@ -259,18 +452,11 @@ class CryptoLongtermKeyBFEncoding():
       else:
         salt_str = None
 
-      qm1 = q - 1
-
       # Get attribute value and convert it into a q-gram set
       #
       attr_val = attr_val_list[attr_num]
 
-      if (padded == True):  # Add padding start and end characters
-        attr_val = PAD_CHAR*qm1+attr_val+PAD_CHAR*qm1
-
-      attr_val_len = len(attr_val)
-
-      q_gram_set = set([attr_val[i:i+q] for i in xrange(attr_val_len - qm1)])
+      q_gram_set = qgrams.get_q_gram_set(attr_val, q, padded)
 
       if (mc_harden_class != None):
         extra_q_gram_set = \
@@ -286,7 +472,12 @@ class CryptoLongtermKeyBFEncoding():
           all_pos_set = all_q_gram_pos_dict.get(q_gram, set())
           all_pos_set.update(pos_set)
           all_q_gram_pos_dict[q_gram] = all_pos_set
-        
+
+      elif (get_bit_pos_flag == 'array'):
+        bf, q_gram_pos_arrays = hash_class.hash_q_gram_set(q_gram_set,
+                                                           salt_str)
+        q_gram_pos_arrays_list.append(q_gram_pos_arrays)
+
       else:
         bf = hash_class.hash_q_gram_set(q_gram_set, salt_str)
 
@@ -299,9 +490,218 @@ class CryptoLongtermKeyBFEncoding():
 
     if (get_bit_pos_flag == True):
       return clk_bf, all_q_gram_pos_dict
+    elif (get_bit_pos_flag == 'array'):
+      return clk_bf, hashing.merge_q_gram_pos_arrays(q_gram_pos_arrays_list)
     else:
       return clk_bf
 
+  # ---------------------------------------------------------------------------
+
+  def encode_cached(self, attr_val_list, salt_str_list=None):
+    """Encode values in the given 'attr_val_list' in the same way as the
+       'encode' method, where the Bloom filters of the attribute values are
+       taken from the attribute Bloom filter cache if possible (otherwise
+       they are generated and added to it), and are combined with a bit-wise
+       OR of their rows of packed bits.
+    """
+
+    abf_cache = self.abf_cache  # Short-cut
+
+    bf_len = self.attr_encode_tuple_list[0][3].bf_len
+
+    clk_bf_row = None
+
+    for (j, attr_encode_tuple) in enumerate(self.attr_encode_tuple_list):
+      attr_num =   attr_encode_tuple[0]
+      q =          attr_encode_tuple[1]
+      padded =     attr_encode_tuple[2]
+      hash_class = attr_encode_tuple[3]
+
+      assert hash_class.bf_len == bf_len  # All BFs must be of same length
+
+      # Check there are enough attribute values
+      #
+      if (attr_num >= len(attr_val_list)):
+          raise Exception, 'Not enough attributes provided'
+
+      if (salt_str_list != None):
+        salt_str = salt_str_list[j]
+      else:
+        salt_str = None
+
+      attr_val = attr_val_list[attr_num]
+
+      cache_key = (j, attr_val, salt_str)
+
+      bf_row = abf_cache.get_bf_row(cache_key)
+
+      if (bf_row is None):
+        bf = hash_class.hash_q_gram_set(qgrams.get_q_gram_set(attr_val, q,
+                                                              padded),
+                                        salt_str)
+        bf_row = numpy.frombuffer(bf.tobytes(), dtype=numpy.uint8)
+
+        abf_cache.add_bf_row(cache_key, bf_row)
+
+      if (clk_bf_row is None):
+        clk_bf_row = bf_row
+      else:
+        clk_bf_row = clk_bf_row | bf_row  # Binary OR of attribute BFs
+
+    return hashing.packed_row_to_bf(clk_bf_row, bf_len)
+
+  # ---------------------------------------------------------------------------
+
+  def get_cached_bf_matrix(self, j, attr_col_list, salt_str_list=None):
+    """Return the matrix of packed Bloom filters (see the function
+       'hashing.gen_packed_bf_matrix') of the given column of values of the
+       attribute at position j in the 'attr_encode_tuple_list', where the
+       Bloom filters of values that are in the attribute Bloom filter cache
+       are taken from it, and those of all other distinct values are
+       generated in one step and added to it.
+    """
+
+    abf_cache = self.abf_cache  # Short-cut
+
+    q, padded, hash_class = self.attr_encode_tuple_list[j][1:4]
+
+    cache_key_list = []
+    bf_row_dict =    {}  # Rows of the distinct keys in this column
+    miss_key_list =  []  # Distinct keys not in the cache
+
+    for (i, attr_val) in enumerate(attr_col_list):
+      if (salt_str_list != None):
+        cache_key = (j, attr_val, salt_str_list[i])
+      else:
+        cache_key = (j, attr_val, None)
+
+      cache_key_list.append(cache_key)
+
+      if (cache_key not in bf_row_dict):
+        bf_row = abf_cache.get_bf_row(cache_key)
+
+        if (bf_row is None):
+          miss_key_list.append(cache_key)
+
+        bf_row_dict[cache_key] = bf_row
+
+    if (len(miss_key_list) > 0):
+      if (salt_str_list != None):
+        miss_salt_str_list = [cache_key[2] for cache_key in miss_key_list]
+      else:
+        miss_salt_str_list = None
+
+      miss_bf_matrix = hash_class.hash_q_gram_set_list(
+                         [qgrams.get_q_gram_set(cache_key[1], q, padded) for
+                          cache_key in miss_key_list], miss_salt_str_list)
+
+      # Rows are copied so the cache does not keep the whole matrix alive
+      #
+      for (cache_key, bf_row) in zip(miss_key_list, miss_bf_matrix):
+        bf_row_dict[cache_key] = bf_row
+        abf_cache.add_bf_row(cache_key, bf_row.copy())
+
+    return numpy.array([bf_row_dict[cache_key] for cache_key in
+                        cache_key_list], dtype=numpy.uint8)
+
+  # ---------------------------------------------------------------------------
+
+  def encode_vocab_pos(self, attr_val_list, salt_str_list=None,
+                       mc_harden_class=None):
+    """Encode values in the given 'attr_val_list' in the same way as the
+       'encode' method, where all hashing classes are vocabulary position
+       tables. The positions of the q-grams of all attributes are gathered
+       from the tables and then set in a single Bloom filter.
+    """
+
+    bf_len = self.attr_encode_tuple_list[0][3].bf_len
+
+    pos_array_list = []
+
+    for (j, attr_encode_tuple) in enumerate(self.attr_encode_tuple_list):
+      attr_num =   attr_encode_tuple[0]
+      q =          attr_encode_tuple[1]
+      padded =     attr_encode_tuple[2]
+      hash_class = attr_encode_tuple[3]
+
+      assert hash_class.bf_len == bf_len  # All BFs must be of same length
+
+      # Check there are enough attribute values
+      #
+      if (attr_num >= len(attr_val_list)):
+          raise Exception, 'Not enough attributes provided'
+
+      if (salt_str_list != None):
+        salt_str = salt_str_list[j]
+      else:
+        salt_str = None
+
+      q_gram_set = qgrams.get_q_gram_set(attr_val_list[attr_num], q, padded)
+
+      if (mc_harden_class != None):
+        extra_q_gram_set = \
+                 mc_harden_class.get_other_q_grams_from_lang_model(q_gram_set)
+        q_gram_set = q_gram_set | extra_q_gram_set
+
+      pos_array_list.append(hash_class.get_pos_array(q_gram_set, salt_str))
+
+    return hashing.pos_array_to_bf(numpy.concatenate(pos_array_list), bf_len)
+
+  # ---------------------------------------------------------------------------
+
+  def encode_batch(self, col_val_list, rec_id_list, salt_str_list=None):
+    """Encode the values of a batch of records into Bloom filters in the
+       same way as the 'encode' method, where each attribute is hashed for
+       all records in one step (or taken from the attribute Bloom filter cache
+       if it is used) and the attribute Bloom filters are combined with one
+       bit-wise OR of packed matrices (the q-gram position dictionary and
+       Markov chain hardening are not supported).
+
+       Input arguments:
+         - col_val_list   A column-oriented batch of records (see the function
+                          'rec_list_to_col_batch').
+         - rec_id_list    A list with the identifiers of the records.
+         - salt_str_list  An optional list with one salting string (or None)
+                          for each record, used for all attributes.
+
+       Output:
+         - bf_matrix     A NumPy uint8 array with one row of packed bits (see
+                         the function 'hashing.gen_packed_bf_matrix') for
+                         each record.
+         - rec_id_index  A dictionary with record identifiers as keys and
+                         their row numbers in 'bf_matrix' as values.
+    """
+
+    clk_bf_matrix = None
+
+    for (j, attr_encode_tuple) in enumerate(self.attr_encode_tuple_list):
+      attr_num =   attr_encode_tuple[0]
+      q =          attr_encode_tuple[1]
+      padded =     attr_encode_tuple[2]
+      hash_class = attr_encode_tuple[3]
+
+      if (attr_num >= len(col_val_list)):
+          raise Exception, 'Not enough attributes provided'
+
+      attr_col_list = col_val_list[attr_num]
+      assert len(attr_col_list) == len(rec_id_list)
+
+      if (self.abf_cache != None):
+        bf_matrix = self.get_cached_bf_matrix(j, attr_col_list, salt_str_list)
+      else:
+        bf_matrix = hash_class.hash_q_gram_set_list(
+                      get_col_q_gram_set_list(attr_col_list, q, padded),
+                      salt_str_list)
+
+      if (clk_bf_matrix is None):
+        clk_bf_matrix = bf_matrix
+      else:
+        assert bf_matrix.shape == clk_bf_matrix.shape  # Same BF lengths
+
+        clk_bf_matrix |= bf_matrix  # Binary OR of attribute BFs
+
+    return clk_bf_matrix, gen_rec_id_index(rec_id_list)
+
 # =============================================================================
 
 class RecordBFEncoding():
@@ -345,6 +745,13 @@ class RecordBFEncoding():
                                                  attribute) to be included in
                                                  the final record level Bloom
                                                  filter.
+                                   Optionally a tuple can contain a sixth
+                                   element:
+                                   - sample_seed The value used to seed the
+                                                 random sampling of bits from
+                                                 the attribute level Bloom
+                                                 filter (if not given the
+                                                 attribute number is used).
          - random_seed             The value used to seed the random generator
                                    used to shuffle the bits in the final record
                                    level Bloom filter. If no random shuffling
@@ -373,7 +780,7 @@ class RecordBFEncoding():
     # Check if bit positions of q-grams should be collected in a dictionary
     #
     self.get_bit_pos_flag = attr_encode_tuple_list[0][3].get_q_gram_pos
-    assert (self.get_bit_pos_flag in [True,False])
+    assert (self.get_bit_pos_flag in [True,False,'array'])
 
     rbf_bf_len = 0
 
@@ -405,8 +812,18 @@ class RecordBFEncoding():
       random.shuffle(perm_pos_list)
       self.perm_pos_list = perm_pos_list
 
+      # The same permutation as an array to remap q-gram position arrays
+      #
+      self.perm_pos_array = numpy.array(perm_pos_list)
+
     else:
       self.perm_pos_list = None
+      self.perm_pos_array = None
+
+    # Sample the bits to be copied from the attribute level Bloom filters into
+    # the record level Bloom filter once for all records
+    #
+    self.gen_sample_plan()
 
   # ---------------------------------------------------------------------------
 
@@ -418,8 +835,9 @@ class RecordBFEncoding():
        their corresponding average number of q-grams.
 
        Input arguments:
-         - rec_val_list  A list of records each consisting of a list of
-                         attribute values.
+         - rec_val_list  A list (or any other iterable, such as a generator)
+                         of records each consisting of a list of attribute
+                         values.
 
        Output:
          - avr_num_q_gram_dict  A dictionary where keys are attribute
@@ -431,39 +849,40 @@ class RecordBFEncoding():
 
     print 'Calculate average number of q-grams for attributes:'
 
-    # Loop over the attributes for which the average number of q-grams is to
-    # be calculated.
+    attr_encode_tuple_list = self.attr_encode_tuple_list
+
+    # Sums of q-gram set sizes for each attribute for which the average number
+    # of q-grams is to be calculated
     #
-    for attr_encode_tuple in self.attr_encode_tuple_list:
-      attr_num =    attr_encode_tuple[0]
-      q =           attr_encode_tuple[1]
-      padded =      attr_encode_tuple[2]
+    q_gram_lengh_sum_list = [0.0]*len(attr_encode_tuple_list)
+    number_of_q_grams = 0
 
-      qm1 = q - 1
+    # Loop over all records (only once, so the records can also be provided
+    # by a generator) and extract the required attribute values
+    #
+    for attr_val_list in rec_val_list:
 
-      q_gram_lengh_sum =  0.0
-      number_of_q_grams = 0
+      for (j, attr_encode_tuple) in enumerate(attr_encode_tuple_list):
+        attr_num =    attr_encode_tuple[0]
+        q =           attr_encode_tuple[1]
+        padded =      attr_encode_tuple[2]
 
-      # Loop over all records and extract the required attribute value
-      #
-      for attr_val_list in rec_val_list:
         attr_val = attr_val_list[attr_num] # Get attribute value
 
-        if (padded == True):  # Add padding start and end characters
-          attr_val = PAD_CHAR*qm1+attr_val+PAD_CHAR*qm1
-
-        attr_val_len = len(attr_val)
-  
         # Convert attribute value into its q-grams
         #
-        q_gram_set = set([attr_val[i:i+q] for i in xrange(attr_val_len - qm1)])
+        q_gram_set = qgrams.get_q_gram_set(attr_val, q, padded)
+
+        q_gram_lengh_sum_list[j] += len(q_gram_set)
 
-        q_gram_lengh_sum +=  len(q_gram_set)
-        number_of_q_grams += 1
+      number_of_q_grams += 1
+
+    for (j, attr_encode_tuple) in enumerate(attr_encode_tuple_list):
+      attr_num = attr_encode_tuple[0]
 
       # Calculate the average number of q-grams for this attribute
       #
-      attr_avr_num_q_gram = q_gram_lengh_sum / number_of_q_grams
+      attr_avr_num_q_gram = q_gram_lengh_sum_list[j] / number_of_q_grams
 
       print '  Attribute number %d has an average number of q-grams of %.2f' \
             % (attr_num, attr_avr_num_q_gram)
@@ -549,6 +968,108 @@ class RecordBFEncoding():
         hash_class = attr_encode_tuple[3]
         hash_class.bf_len = abf_len_dict[attr_num]
 
+    self.gen_sample_plan()  # Sampled bits depend on the lengths of the ABFs
+
+  # ---------------------------------------------------------------------------
+
+  def gen_sample_plan(self):
+    """Sample the bit positions to be copied from each attribute level Bloom
+       filter (ABF) into the record level Bloom filter for the current ABF
+       lengths, and combine them with the final permutation into one array
+       of positions into the concatenated ABFs, so that records can be
+       encoded without sampling bits again for each of them.
+
+       Because sampling seeds the random number generators, their states
+       after sampling the bits of each attribute are kept as well, so that
+       encoding a record leaves them in the same states as sampling for each
+       record did (generating the plan itself does not change them).
+
+       Input arguments:
+         - None
+
+       Output:
+         - This method does not return anything.
+    """
+
+    org_rand_state =    random.getstate()
+    org_np_rand_state = numpy.random.get_state()
+
+    self.abf_len_list =           []  # Length of each ABF
+    self.use_bit_pos_array_list = []  # Positions sampled from each ABF
+    self.sample_rand_state_list = []  # Random states after each sampling
+
+    gather_pos_array_list = []
+
+    abf_offset = 0  # Position of each ABF in the concatenated ABFs
+
+    for attr_encode_tuple in self.attr_encode_tuple_list:
+      attr_num =   attr_encode_tuple[0]
+      hash_class = attr_encode_tuple[3]
+      num_bf_bit = attr_encode_tuple[4]
+
+      if (len(attr_encode_tuple) > 5):
+        sample_seed = attr_encode_tuple[5]
+      else:
+        sample_seed = attr_num
+
+      abf_len = hash_class.bf_len
+
+      use_bit_pos_array = numpy.array(self.sample_bit_pos_list(abf_len,
+                                                               num_bf_bit,
+                                                               sample_seed))
+
+      if (abf_len >= num_bf_bit):  # Sampled using the 'random' module
+        self.sample_rand_state_list.append((random.getstate(), None))
+      else:
+        self.sample_rand_state_list.append((None, numpy.random.get_state()))
+
+      self.abf_len_list.append(abf_len)
+      self.use_bit_pos_array_list.append(use_bit_pos_array)
+
+      gather_pos_array_list.append(use_bit_pos_array + abf_offset)
+      abf_offset += abf_len
+
+    # Bit i of the (permuted) record level Bloom filter is the bit at
+    # position gather_pos_array[i] in the concatenated ABFs
+    #
+    gather_pos_array = numpy.concatenate(gather_pos_array_list)
+
+    if (self.random_seed != None):
+      gather_pos_array = gather_pos_array[self.perm_pos_array]
+
+    self.gather_pos_array = gather_pos_array
+
+    random.setstate(org_rand_state)
+    numpy.random.set_state(org_np_rand_state)
+
+  # ---------------------------------------------------------------------------
+
+  def check_sample_plan(self):
+    """Generate the sampling plan again if the length of an attribute level
+       Bloom filter was changed in its hashing class since it was generated.
+    """
+
+    abf_len_list = [attr_encode_tuple[3].bf_len for attr_encode_tuple in
+                    self.attr_encode_tuple_list]
+
+    if (abf_len_list != self.abf_len_list):
+      self.gen_sample_plan()
+
+  # ---------------------------------------------------------------------------
+
+  def set_sample_rand_state(self, j):
+    """Set the random number generators to the states they have after the
+       bits of the attribute at position j in the 'attr_encode_tuple_list'
+       were sampled.
+    """
+
+    rand_state, np_rand_state = self.sample_rand_state_list[j]
+
+    if (rand_state != None):
+      random.setstate(rand_state)
+    else:
+      numpy.random.set_state(np_rand_state)
+
   # ---------------------------------------------------------------------------
 
   def encode(self, attr_val_list, salt_str_list=None, mc_harden_class=None):
@@ -577,10 +1098,11 @@ class RecordBFEncoding():
                             the hashing method and the value in the selected
                             attributes.
          - q_gram_pos_dict  [Only returned if 'get_q_gram_pos' is set to True
-                            in the hashing method]
+                            or 'array' in the hashing method]
                             A dictionary which has q-grams as keys and where
                             values are sets with the positions these q-grams
-                            are hashed to.
+                            are hashed to (or 'QGramPosArrays' if
+                            'get_q_gram_pos' is set to 'array').
     """
 
     rbf_bf_len = self.rbf_bf_len
@@ -592,12 +1114,18 @@ class RecordBFEncoding():
     if (get_bit_pos_flag == True):
       rbf_q_gram_pos_dict = {}  # A dictionary with q-grams and their positions
 
-    # Initalise the record level Bloom filter
+    elif (get_bit_pos_flag == 'array'):
+      q_gram_pos_arrays_list = []  # Positions of the q-grams of each attribute
+
+    self.check_sample_plan()
+
+    # The attribute level Bloom filters concatenated, from which the bits of
+    # the record level Bloom filter are gathered
     #
-    rbf_bf = bitarray.bitarray(rbf_bf_len)
+    cat_abf = bitarray.bitarray(endian='big')
 
-    # A pointer into the record level Bloom filter for setting bit positions
-    # from the different attributes
+    # A pointer into the record level Bloom filter (before the permutation)
+    # to the first bit sampled from each attribute
     #
     rbf_bit_pos = 0
 
@@ -613,8 +1141,6 @@ class RecordBFEncoding():
       if (attr_num >= len(attr_val_list)):
           raise Exception, 'Not enough attributes provided'
 
-      qm1 = q - 1
-
       if (salt_str_list != None):
         salt_str = salt_str_list[j]
       else:
@@ -624,12 +1150,7 @@ class RecordBFEncoding():
       #
       attr_val = attr_val_list[attr_num]
 
-      if (padded == True):  # Add padding start and end characters
-        attr_val = PAD_CHAR*qm1+attr_val+PAD_CHAR*qm1
-
-      attr_val_len = len(attr_val)
-
-      q_gram_set = set([attr_val[i:i+q] for i in xrange(attr_val_len - qm1)])
+      q_gram_set = qgrams.get_q_gram_set(attr_val, q, padded)
 
       if (mc_harden_class != None):
         extra_q_gram_set = \
@@ -650,10 +1171,17 @@ class RecordBFEncoding():
             q_gram_set.add(q_gram)
             pos_q_gram_dict[pos] = q_gram_set
 
+      elif (get_bit_pos_flag == 'array'):
+        abf, q_gram_pos_arrays = hash_class.hash_q_gram_set(q_gram_set,
+                                                            salt_str)
+
       else:
         abf = hash_class.hash_q_gram_set(q_gram_set, salt_str)
 
       abf_len = len(abf)  # Get the length of this attribute level Bloom filter
+      assert abf_len == self.abf_len_list[j], (abf_len, self.abf_len_list[j])
+
+      cat_abf.extend(abf)
 
       # When ABF length is set to dynamic the output ABF length may not always
       # be higher or equal to the number of bits that need to be sampled from
@@ -662,27 +1190,24 @@ class RecordBFEncoding():
       #
       # assert abf_len >= num_bf_bit, (abf_len, num_bf_bit)
 
-      # Sample a desired number of bit positions (set the random seed to the
-      # attribute number to make sure for the same attribute the same bit
-      # positions are sampled each time)
+      # Get the bit positions sampled from this attribute (the random seed was
+      # set to the attribute number, or the given sample seed, to make sure
+      # for the same attribute the same bit positions are sampled each time)
       #
-      if(abf_len >= num_bf_bit):
-        random.seed(attr_num)
-        use_bit_pos_list = random.sample(range(abf_len), num_bf_bit)
+      use_bit_pos_array = self.use_bit_pos_array_list[j]
 
-      else:  # Sampling with replacement
-        numpy.random.seed(attr_num)
-        use_bit_pos_list = range(abf_len)  # Make sure all bits are included
-        more_sample_bits_needed = num_bf_bit - len(use_bit_pos_list)
-        use_bit_pos_list += list(numpy.random.choice(range(abf_len),
-                                 more_sample_bits_needed))
+      self.set_sample_rand_state(j)
 
-      assert len(use_bit_pos_list) == num_bf_bit
+      # Map the ABF positions of all q-grams to the RBF positions they are
+      # sampled into
+      #
+      if (get_bit_pos_flag == 'array'):
+        q_gram_pos_arrays_list.append(
+                 q_gram_pos_arrays.sample_pos(use_bit_pos_array, rbf_bit_pos))
 
-      for abf_bit_pos in use_bit_pos_list:
-        rbf_bf[rbf_bit_pos] = abf[abf_bit_pos]
+      elif (get_bit_pos_flag == True):
 
-        if (get_bit_pos_flag == True):
+        for (i, abf_bit_pos) in enumerate(use_bit_pos_array.tolist()):
 
           # Get all q-grams at this bit position in the ABF
           #
@@ -692,25 +1217,32 @@ class RecordBFEncoding():
           #
           for q_gram in pos_q_gram_set:
             q_gram_pos_set = rbf_q_gram_pos_dict.get(q_gram, set())
-            q_gram_pos_set.add(rbf_bit_pos)
+            q_gram_pos_set.add(rbf_bit_pos + i)
             rbf_q_gram_pos_dict[q_gram] = q_gram_pos_set
 
-        rbf_bit_pos += 1
+      rbf_bit_pos += num_bf_bit
 
     assert rbf_bit_pos == rbf_bf_len
 
-    # Do final permutation of the RBF if required
+    if (get_bit_pos_flag == 'array'):
+      rbf_q_gram_pos_arrays = \
+                      hashing.merge_q_gram_pos_arrays(q_gram_pos_arrays_list)
+
+    # Gather the bits of the (permuted) record level Bloom filter from the
+    # concatenated ABFs in one step
     #
-    if (self.random_seed != None):
-      perm_rbf_bf = bitarray.bitarray(rbf_bf_len)
+    cat_abf_bit_array = numpy.unpackbits(numpy.frombuffer(cat_abf.tobytes(),
+                                                          dtype=numpy.uint8))
 
-      perm_pos_list = self.perm_pos_list
+    perm_rbf_bf = hashing.packed_row_to_bf(
+                numpy.packbits(cat_abf_bit_array[self.gather_pos_array]),
+                rbf_bf_len)
 
-      for pos in xrange(rbf_bf_len):
-        perm_rbf_bf[pos] = rbf_bf[perm_pos_list[pos]]
+    # If needed also permute the bit positions of all q-grams
+    #
+    if (self.random_seed != None):
+      perm_pos_list = self.perm_pos_list
 
-      # If needed also change the bit positions of all q-grams
-      #
       if (get_bit_pos_flag == True):
 
         for q_gram in rbf_q_gram_pos_dict:
@@ -722,14 +1254,106 @@ class RecordBFEncoding():
 
           rbf_q_gram_pos_dict[q_gram] = perm_q_gram_set
 
-    else:
-      perm_rbf_bf = rbf_bf  # No permutation to be done
+      elif (get_bit_pos_flag == 'array'):
+        rbf_q_gram_pos_arrays = \
+                        rbf_q_gram_pos_arrays.map_pos(self.perm_pos_array)
 
     if (get_bit_pos_flag == True):
       return perm_rbf_bf, rbf_q_gram_pos_dict
+    elif (get_bit_pos_flag == 'array'):
+      return perm_rbf_bf, rbf_q_gram_pos_arrays
     else:
       return perm_rbf_bf
 
+  # ---------------------------------------------------------------------------
+
+  def sample_bit_pos_list(self, abf_len, num_bf_bit, sample_seed):
+    """Return the list of the positions of the bits sampled from an
+       attribute level Bloom filter of the given length into the record level
+       Bloom filter, where the random sampling is seeded with the given seed
+       (so for the same attribute the same bit positions are sampled each
+       time). If more bits are needed than the attribute level Bloom filter
+       has then all its bits plus more sampled with replacement are used.
+    """
+
+    if(abf_len >= num_bf_bit):
+      random.seed(sample_seed)
+      use_bit_pos_list = random.sample(range(abf_len), num_bf_bit)
+
+    else:  # Sampling with replacement
+      numpy.random.seed(sample_seed)
+      use_bit_pos_list = range(abf_len)  # Make sure all bits are included
+      more_sample_bits_needed = num_bf_bit - len(use_bit_pos_list)
+      use_bit_pos_list += list(numpy.random.choice(range(abf_len),
+                               more_sample_bits_needed))
+
+    assert len(use_bit_pos_list) == num_bf_bit
+
+    return use_bit_pos_list
+
+  # ---------------------------------------------------------------------------
+
+  def encode_batch(self, col_val_list, rec_id_list, salt_str_list=None):
+    """Encode the values of a batch of records into record level Bloom
+       filters in the same way as the 'encode' method, where each attribute
+       is hashed for all records in one step, and the sampling of bits from
+       the attribute level Bloom filters, their concatenation and the final
+       permutation are done on bit matrices of all records (the q-gram
+       position dictionary and Markov chain hardening are not supported).
+
+       Input arguments:
+         - col_val_list   A column-oriented batch of records (see the function
+                          'rec_list_to_col_batch').
+         - rec_id_list    A list with the identifiers of the records.
+         - salt_str_list  An optional list with one salting string (or None)
+                          for each record, used for all attributes.
+
+       Output:
+         - bf_matrix     A NumPy uint8 array with one row of packed bits (see
+                         the function 'hashing.gen_packed_bf_matrix') for
+                         each record.
+         - rec_id_index  A dictionary with record identifiers as keys and
+                         their row numbers in 'bf_matrix' as values.
+    """
+
+    self.check_sample_plan()
+
+    abf_bit_matrix_list = []  # Bits of the ABFs of each attribute
+
+    for (j, attr_encode_tuple) in enumerate(self.attr_encode_tuple_list):
+      attr_num =   attr_encode_tuple[0]
+      q =          attr_encode_tuple[1]
+      padded =     attr_encode_tuple[2]
+      hash_class = attr_encode_tuple[3]
+
+      if (attr_num >= len(col_val_list)):
+          raise Exception, 'Not enough attributes provided'
+
+      attr_col_list = col_val_list[attr_num]
+      assert len(attr_col_list) == len(rec_id_list)
+
+      abf_matrix = hash_class.hash_q_gram_set_list(
+                     get_col_q_gram_set_list(attr_col_list, q, padded),
+                     salt_str_list)
+
+      abf_len = self.abf_len_list[j]
+
+      abf_bit_matrix_list.append(numpy.unpackbits(abf_matrix,
+                                                  axis=1)[:,:abf_len])
+
+      self.set_sample_rand_state(j)
+
+    # Gather the sampled and permuted bits of all records from their
+    # concatenated ABFs in one step
+    #
+    cat_abf_bit_matrix = numpy.concatenate(abf_bit_matrix_list, axis=1)
+
+    rbf_bit_matrix = cat_abf_bit_matrix[:,self.gather_pos_array]
+    assert rbf_bit_matrix.shape[1] == self.rbf_bf_len
+
+    return numpy.packbits(rbf_bit_matrix, axis=1), \
+           gen_rec_id_index(rec_id_list)
+
 # -----------------------------------------------------------------------------
 #
 # The CLK-RBF approach, as proposed in:
@@ -919,6 +1543,52 @@ if (__name__ == '__main__'):
       for pos in pos_set:
         assert pos >= 0 and pos < bf_len
 
+  # Q-gram position arrays give the same positions as the dictionaries
+  #
+  DH2a = hashing.DoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k,
+                               'array')
+
+  CLKtuple4a = CryptoLongtermKeyBFEncoding([(0, 2, False, DH2a),
+                                            (1, 3, False, DH2a)])
+
+  for attr_val_list in rec_list:
+    for salt_str_list4 in [None, ['salt1', 'salt2']]:
+      rec_bf4, clk_q_gram_pos_dict = CLKtuple4.encode(attr_val_list,
+                                                      salt_str_list4)
+      rec_bf4a, clk_q_gram_pos_arrays = CLKtuple4a.encode(attr_val_list,
+                                                          salt_str_list4)
+      assert rec_bf4a == rec_bf4
+      assert clk_q_gram_pos_arrays.to_dict() == clk_q_gram_pos_dict
+
+    rec_bf4, q_gram_pos_dict = \
+            AttributeBFEncoding(1, 2, False, DH2).encode(attr_val_list)
+    rec_bf4a, q_gram_pos_arrays = \
+            AttributeBFEncoding(1, 2, False, DH2a).encode(attr_val_list)
+    assert rec_bf4a == rec_bf4
+    assert q_gram_pos_arrays.to_dict() == q_gram_pos_dict
+
+  # Encoding with vocabulary position tables gives the same Bloom filters
+  #
+  DHv = hashing.VocabPosTable(DH)
+  THv = hashing.VocabPosTable(TH, ['se', 'ea', 'an'])
+
+  for (attr_tuple_list, attr_tuple_listv) in \
+      [(attr_tuple_list2, [(1, 2, False, DHv), (0, 2, True, DHv),
+                           (2, 4, False, DHv)]),
+       ([(0, 2, True, TH), (2, 3, False, TH)],
+        [(0, 2, True, THv), (2, 3, False, THv)])]:
+    CLKtuple = CryptoLongtermKeyBFEncoding(attr_tuple_list)
+    CLKtuplev = CryptoLongtermKeyBFEncoding(attr_tuple_listv)
+    assert CLKtuplev.vocab_pos_table_flag == True
+
+    for attr_val_list in rec_list:
+      assert CLKtuple.encode(attr_val_list) == CLKtuplev.encode(attr_val_list)
+      assert CLKtuple.encode(attr_val_list, salt_str_list) == \
+             CLKtuplev.encode(attr_val_list, salt_str_list)
+
+      assert AttributeBFEncoding(2, 3, False, THv).encode(attr_val_list) == \
+             AttributeBFEncoding(2, 3, False, TH).encode(attr_val_list)
+
   print 'OK'
   print
 
@@ -1057,6 +1727,25 @@ if (__name__ == '__main__'):
       for pos in pos_set:
         assert pos >= 0 and pos < bf_len
 
+  # Q-gram position arrays give the same positions as the dictionaries (also
+  # with more bits sampled than an attribute level Bloom filter has)
+  #
+  for random_seed in [42, None]:
+    for num_bf_bit in [600, 1500]:
+      RBFtuple5 = RecordBFEncoding([(0, 2, False, DH2, 400),
+                                    (1, 3, False, DH2, num_bf_bit)],
+                                   random_seed)
+      RBFtuple5a = RecordBFEncoding([(0, 2, False, DH2a, 400),
+                                     (1, 3, False, DH2a, num_bf_bit)],
+                                    random_seed)
+
+      for attr_val_list in rec_list:
+        rec_bf5, rbf_q_gram_pos_dict = RBFtuple5.encode(attr_val_list)
+        rec_bf5a, rbf_q_gram_pos_arrays = RBFtuple5a.encode(attr_val_list)
+
+        assert rec_bf5a == rec_bf5
+        assert rbf_q_gram_pos_arrays.to_dict() == rbf_q_gram_pos_dict
+
   print 'OK'
   print
 
@@ -1120,5 +1809,100 @@ if (__name__ == '__main__'):
   print 'OK'
   print
 
+  print '  Testing batch encoding...',  # - - - - - - - - - - - - - - - - - - -
+
+  col_val_list = rec_list_to_col_batch(rec_list)
+  assert col_val_list[1] == ['smith', 'miller', 'tinker']
+
+  rec_id_list =   ['r1', 'r2', 'r3']
+  rec_salt_list = ['1970', None, '1985']
+
+  # New hashing methods (the lengths of the above were changed by dynamic
+  # attribute level Bloom filter lengths)
+  #
+  DH =  hashing.DoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k)
+  RH =  hashing.RandomHashing(bf_hash_funct1, bf_len, 2*k)
+  EDH = hashing.EnhancedDoubleHashing(bf_hash_funct1, bf_hash_funct2,
+                                      bf_len, 3*k)
+  TH =  hashing.TripleHashing(bf_hash_funct1, bf_hash_funct2, bf_hash_funct3,
+                              bf_len, 2*k)
+  DHv = hashing.VocabPosTable(DH)
+
+  enc_method_list = [AttributeBFEncoding(0, 2, True, EDH),
+                     AttributeBFEncoding(2, 3, False, RH),
+                     CryptoLongtermKeyBFEncoding([(0, 2, False, DH),
+                                                  (1, 2, True, TH),
+                                                  (2, 3, False, RH)]),
+                     CryptoLongtermKeyBFEncoding([(0, 2, False, DHv),
+                                                  (1, 2, True, DHv)]),
+                     RecordBFEncoding([(0, 2, False, EDH, 400),
+                                       (2, 3, True, RH, 1500),
+                                       (3, 2, False, DHv, 100)]),
+                     RecordBFEncoding([(0, 2, False, TH, 400),
+                                       (1, 2, True, DH, 600)], None)]
+
+  for enc_method in enc_method_list:
+    for salt_list in [None, rec_salt_list]:
+      bf_matrix, rec_id_index = enc_method.encode_batch(col_val_list,
+                                                        rec_id_list,
+                                                        salt_list)
+      assert rec_id_index == {'r1':0, 'r2':1, 'r3':2}
+
+      for (i, attr_val_list) in enumerate(rec_list):
+        if (salt_list == None):
+          rec_bf = enc_method.encode(attr_val_list)
+        elif (isinstance(enc_method, AttributeBFEncoding)):
+          rec_bf = enc_method.encode(attr_val_list, salt_list[i])
+        else:
+          rec_bf = enc_method.encode(attr_val_list, [salt_list[i]]*
+                                     len(enc_method.attr_encode_tuple_list))
+
+        assert hashing.packed_row_to_bf(bf_matrix[rec_id_index[
+                 rec_id_list[i]]], len(rec_bf)) == rec_bf, (enc_method, i)
+
+  print 'OK'
+  print
+
+  print '  Testing attribute Bloom filter cache...',  # - - - - - - - - - - - -
+
+  DH1 = hashing.DoubleHashing(bf_hash_funct1, bf_hash_funct2, 1001, k)
+  RH1 = hashing.RandomHashing(bf_hash_funct1, 1001, 2*k)
+
+  clk_tuple_list = [(0, 2, False, DH1), (1, 2, True, RH1)]
+
+  clk_enc =       CryptoLongtermKeyBFEncoding(clk_tuple_list)
+  clk_cache_enc = CryptoLongtermKeyBFEncoding(clk_tuple_list, 3)
+
+  cache_rec_list = rec_list + rec_list[::-1] + rec_list
+  cache_rec_id_list = ['r%d' % (i) for i in range(len(cache_rec_list))]
+  cache_salt_list = ['1970', None, '1985']*3
+
+  cache_col_val_list = rec_list_to_col_batch(cache_rec_list)
+
+  for salt_list in [None, cache_salt_list]:
+    bf_matrix, rec_id_index = clk_cache_enc.encode_batch(cache_col_val_list,
+                                                         cache_rec_id_list,
+                                                         salt_list)
+    for (i, attr_val_list) in enumerate(cache_rec_list):
+      if (salt_list == None):
+        rec_bf =       clk_enc.encode(attr_val_list)
+        cache_rec_bf = clk_cache_enc.encode(attr_val_list)
+      else:
+        rec_bf =       clk_enc.encode(attr_val_list, [salt_list[i]]*2)
+        cache_rec_bf = clk_cache_enc.encode(attr_val_list, [salt_list[i]]*2)
+
+      assert cache_rec_bf == rec_bf, i
+      assert hashing.packed_row_to_bf(bf_matrix[i], 1001) == rec_bf, i
+
+  num_hit, num_miss, num_val = clk_cache_enc.abf_cache.get_stats()
+  assert (num_hit > 0) and (num_miss > 0) and (num_val == 3), \
+         (num_hit, num_miss, num_val)
+
+  assert clk_cache_enc.abf_cache.evict() == 3
+  assert clk_cache_enc.encode(rec_list[0]) == clk_enc.encode(rec_list[0])
+
+  print 'OK'
+  print
+
 # =============================================================================
 # End.
@@ -40,6 +40,8 @@ import numpy as np
 import bitarray  # Efficient bit-arrays, available from:
                  # https://pypi.org/project/bitarray/
 
+import qgrams  # Shared cache of q-grams extracted from values
+
 PAD_CHAR = chr(1)   # Used for q-gram padding
 
 # =============================================================================
@@ -60,7 +62,8 @@ class Balancing():
        Input arguments:
          - get_q_gram_pos  A flag, if set to True then the bit positions of
                            where q-grams are hash into are returned in a
-                           dictionary.
+                           dictionary, if set to 'array' they are returned as
+                           'QGramPosArrays' (see the hashing.py module).
          - random_seed     The value used to seed the random generator used to
                            shuffle the balanced Bloom filter. If no random
                            shuffling should be done set the value of this
@@ -78,7 +81,9 @@ class Balancing():
     self.random_seed =    random_seed
     self.get_q_gram_pos = get_q_gram_pos
 
-    self.perm_pos_list = None
+    self.perm_pos_list =  None
+    self.perm_pos_array = None  # The permutation as an array (for positions
+                                # given as 'QGramPosArrays')
 
   # ---------------------------------------------------------------------------
 
@@ -96,8 +101,8 @@ class Balancing():
        Input arguments:
          - bf                   A Bloom filter assumed to have its bits set
                                 from an encoded q-gram set.
-         - org_q_gram_pos_dict  The q-gram dictionary generated when hashing
-                                q-grams into the BF.
+         - org_q_gram_pos_dict  The q-gram dictionary (or 'QGramPosArrays')
+                                generated when hashing q-grams into the BF.
 
        Output:
          - bal_bf               The balanced Bloom filter.
@@ -127,6 +132,9 @@ class Balancing():
 
         q_gram_pos_dict[q_gram] = new_pos_set
 
+    elif (self.get_q_gram_pos == 'array'):  # Complement bits are at pos+bf_len
+      q_gram_pos_arrays = org_q_gram_pos_dict.add_shifted_pos(bf_len)
+
     if (self.random_seed != None):  # Permutate the bit positions
 
       # Generate a permutation list using random shuffling of bit positions
@@ -156,11 +164,19 @@ class Balancing():
             perm_pos_set.add(perm_pos_list[pos])
           q_gram_pos_dict[q_gram] = perm_pos_set
 
+      elif (self.get_q_gram_pos == 'array'):
+        if (self.perm_pos_array is None):
+          self.perm_pos_array = np.array(perm_pos_list)
+
+        q_gram_pos_arrays = q_gram_pos_arrays.map_pos(self.perm_pos_array)
+
     else:
       perm_bal_bf = bal_bf
 
     if (self.get_q_gram_pos == True):
       return perm_bal_bf, q_gram_pos_dict
+    elif (self.get_q_gram_pos == 'array'):
+      return perm_bal_bf, q_gram_pos_arrays
     else:
       return perm_bal_bf
 
@@ -184,7 +200,8 @@ class Folding():
        Input arguments:
          - get_q_gram_pos  A flag, if set to True then the bit positions of
                            where q-grams are hash into are returned in a
-                           dictionary.
+                           dictionary, if set to 'array' they are returned as
+                           'QGramPosArrays' (see the hashing.py module).
 
        Output:
          - This method does not return anything.
@@ -207,8 +224,8 @@ class Folding():
        Input arguments:
          - bf                   A Bloom filter assumed to have its bits set
                                 from an encoded q-gram set.
-         - org_q_gram_pos_dict  The q-gram dictionary generated when hashing
-                                q-grams into the BF.
+         - org_q_gram_pos_dict  The q-gram dictionary (or 'QGramPosArrays')
+                                generated when hashing q-grams into the BF.
 
        Output:
          - fold_bf              The XOR folded Bloom filter.
@@ -246,6 +263,9 @@ class Folding():
 
       return fold_bf, q_gram_pos_dict
 
+    elif (self.get_q_gram_pos == 'array'):  # Map the upper half onto the lower
+      return fold_bf, org_q_gram_pos_dict.map_pos(np.arange(bf_len) % half_len)
+
     else:
       return fold_bf
 
@@ -384,37 +404,44 @@ class MarkovChain():
          - This method does not return anything.
     """
 
-    q = self.q  # Short-cuts
-    qm1 = q - 1
-
-    # Initialise the transition probability dictionary, where keys are q-grams
-    # and values are dictionaries with other q-grams and their probabilities
-    # of co-occurrence with the key q-gram.
+    # Initialise the transition count dictionary, where keys are q-grams and
+    # values are dictionaries with other q-grams and their counts of
+    # co-occurrence with the key q-gram.
     #
-    trans_prob_dict = {}
+    trans_count_dict = {}
 
     for str_val in val_list:
 
       # Generate the q-grams from this value
       #
-      if (self.padded == True):  # Add padding start and end characters
-        str_val = PAD_CHAR*qm1+str_val+PAD_CHAR*qm1
-
-      str_val_len = len(str_val)
-
-      q_gram_list = [str_val[i:i+q] for i in xrange(str_val_len - qm1)]
+      q_gram_list = qgrams.get_q_gram_list(str_val, self.q, self.padded)
 
       # Generate the pairs of consecutive q-grams and add them into the
       # transition dictionary
       #
-      for (i, q_gram1) in enumerate(q_gram_list[:-1]):
-        q_gram2 = q_gram_list[i+1]
+      qgrams.add_q_gram_trans_counts(q_gram_list, trans_count_dict)
 
-        # Insert the q-gram pair into the transition dictionary
-        #
-        q_gram2_dict = trans_prob_dict.get(q_gram1, {})
-        q_gram2_dict[q_gram2] = q_gram2_dict.get(q_gram2, 0) + 1
-        trans_prob_dict[q_gram1] = q_gram2_dict
+    self.set_trans_count_dict(trans_count_dict)
+
+  # ---------------------------------------------------------------------------
+
+  def set_trans_count_dict(self, trans_count_dict):
+    """Calculate transition probabilities from the given counts of pairs of
+       consecutive q-grams (as generated by 'qgrams.add_q_gram_trans_counts'
+       with the same q and padding as used by this class, for example while
+       a data set is loaded).
+
+       Input arguments:
+         - trans_count_dict  A dictionary where keys are q-grams and values
+                             are dictionaries with the q-grams following
+                             them and their counts. This dictionary is
+                             converted in place.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    trans_prob_dict = trans_count_dict
 
     print 'Transition probability dictionary contains %d q-grams' % \
           len(trans_prob_dict)
@@ -1000,6 +1027,32 @@ if ( __name__ == '__main__' ):
     assert pos_set != new_pos_set
     assert len(new_pos_set) == len(pos_set), (len(new_pos_set), len(pos_set))
 
+  # Balancing and folding of q-gram position arrays give the same positions
+  # as the dictionaries
+  #
+  RHa = hashing.RandomHashing(bf_hash_funct1, bf_len, k, 'array')
+
+  bf2a, q_gram_pos_arrays = RHa.hash_q_gram_set(test_q_gram_set)
+  assert bf2a == bf2
+  assert q_gram_pos_arrays.to_dict() == q_gram_pos_dict
+
+  for random_seed in [None, 42]:
+    BFBalHard4 = Balancing(True, random_seed)
+    BFBalHard5 = Balancing('array', random_seed)
+
+    bal_bf, bal_q_gram_pos_dict = BFBalHard4.harden_bf(bf2, q_gram_pos_dict)
+    BFBalHard5.perm_pos_list = BFBalHard4.perm_pos_list  # Same permutation
+
+    bal_bf_a, bal_q_gram_pos_arrays = BFBalHard5.harden_bf(bf2a,
+                                                           q_gram_pos_arrays)
+    assert bal_bf_a == bal_bf
+    assert bal_q_gram_pos_arrays.to_dict() == bal_q_gram_pos_dict
+
+  fold_bf_a, fold_q_gram_pos_arrays = Folding('array').harden_bf(bf2a,
+                                                        q_gram_pos_arrays)
+  assert fold_bf_a == bf_fold_hardened3
+  assert fold_q_gram_pos_arrays.to_dict() == new_q_gram_pos_dict2
+
   print 'OK'
   print
 
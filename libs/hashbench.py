@@ -0,0 +1,515 @@
+# hashbench.py - Module that implements a throughput benchmark of the Bloom
+#                filter hashing classes
+#
+# October 2026
+# -----------------------------------------------------------------------------
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# -----------------------------------------------------------------------------
+#
+# Usage:
+#   python hashbench.py [json_file_name] [grid] [num_rec]
+#
+# where:
+#
+# json_file_name  The name of the JSON file the benchmark results are written
+#                 to. If not given then only the tests are run.
+# grid            The parameter grid to benchmark, either 'quick' (default)
+#                 or 'full' (see QUICK_GRID_DICT and FULL_GRID_DICT below).
+# num_rec         The number of records hashed in each benchmark run (default
+#                 is NUM_REC below).
+#
+# Each combination of hashing type, way of calling the hashing class
+# (variant), Bloom filter length, number of hash functions, q and salting is
+# run in its own process, so that the peak memory use can be measured for
+# each of them.
+#
+# =============================================================================
+
+import bisect
+import hashlib
+import json
+import multiprocessing
+import random
+import resource
+import sys
+import time
+
+import numpy
+
+import auxiliary
+import hashing
+import qgrams  # Shared cache of q-gram sets extracted from values
+
+# Hash functions used (the same as in the attack program)
+#
+BENCH_HASH_FUNCT1 =   hashlib.sha1
+BENCH_HASH_FUNCT2 =   hashlib.md5
+BENCH_HASH_FUNCT3 =   hashlib.sha224
+BENCH_DIGEST_FUNCT =  hashlib.sha512  # For the single-digest hashing types
+
+HASH_TYPE_LIST = ['dh', 'edh', 'th', 'rh', 'crh', 'sdh', 'sedh', 'sth']
+
+# The ways of calling the hashing classes:
+#   - 'set'     One call of 'hash_q_gram_set' for each record.
+#   - 'batch'   One call of 'hash_q_gram_set_list' for all records.
+#   - 'cache'   As 'set', with a cache of the bit positions of q-grams.
+#   - 'vocab'   As 'batch', with a vocabulary position table.
+#   - 'prefix'  As 'set', with kept hash objects of q-grams (only for salted
+#               double, enhanced double and triple hashing).
+#
+VARIANT_LIST = ['set', 'batch', 'cache', 'vocab', 'prefix']
+
+POS_CACHE_SIZE =   100000  # Maximum number of q-grams in the position caches
+SALT_PREFIX_SIZE = 100000  # Maximum number of q-grams with kept hash objects
+
+NUM_REC =    2000  # Number of records hashed in each run
+NUM_REPEAT = 3     # Number of runs, the fastest is reported
+NUM_VAL =    2000  # Number of distinct values per attribute
+RAND_SEED =  42    # Seed used to generate the records
+
+# Parameter grids (the full grid covers the settings used in experiments)
+#
+QUICK_GRID_DICT = {'bf_len':[1000], 'k':[10], 'q':[2],
+                   'salted':[False, True]}
+FULL_GRID_DICT =  {'bf_len':[500, 1000, 2000, 4000], 'k':[10, 20, 30],
+                   'q':[2, 3], 'salted':[False, True]}
+
+# Distributions of the lengths of the generated first names, last names and
+# town names (lengths and their probabilities), roughly shaped like those of
+# personal names and place names
+#
+ATTR_LEN_PROB_LIST = [
+  {3:0.05, 4:0.15, 5:0.22, 6:0.22, 7:0.16, 8:0.10, 9:0.06, 10:0.03,
+   11:0.01},
+  {4:0.08, 5:0.16, 6:0.20, 7:0.19, 8:0.15, 9:0.10, 10:0.06, 11:0.04,
+   12:0.02},
+  {4:0.04, 5:0.08, 6:0.14, 7:0.16, 8:0.15, 9:0.13, 10:0.10, 11:0.08,
+   12:0.06, 13:0.04, 14:0.02}]
+
+# Letters and their frequencies in English text (in percent)
+#
+LETTER_FREQ_DICT = {'a':8.2, 'b':1.5, 'c':2.8, 'd':4.3, 'e':12.7, 'f':2.2,
+                    'g':2.0, 'h':6.1, 'i':7.0, 'j':0.2, 'k':0.8, 'l':4.0,
+                    'm':2.4, 'n':6.7, 'o':7.5, 'p':1.9, 'q':0.1, 'r':6.0,
+                    's':6.3, 't':9.1, 'u':2.8, 'v':1.0, 'w':2.4, 'x':0.2,
+                    'y':2.0, 'z':0.1}
+
+# =============================================================================
+
+def choose_weighted(rand_gen, val_list, cum_weight_list):
+  """Return a value from the given list chosen with probabilities
+     proportional to the weights whose cumulative sums are given.
+  """
+
+  r = rand_gen.random() * cum_weight_list[-1]
+
+  return val_list[bisect.bisect_left(cum_weight_list, r)]
+
+# -----------------------------------------------------------------------------
+
+def gen_rec_val_list(num_rec, seed=RAND_SEED, num_val=NUM_VAL):
+  """Generate a list of records, each with a first name, a last name, a town
+     name and a year of birth.
+
+     For each of the three name attributes a list of distinct values is
+     generated (with value lengths following 'ATTR_LEN_PROB_LIST' and letters
+     following 'LETTER_FREQ_DICT'), and values are then taken from these lists
+     with a Zipf-like distribution, so frequent values (and their q-grams)
+     occur in many records as in real data.
+
+     Input arguments:
+       - num_rec  The number of records to generate.
+       - seed     The value used to seed the random generator.
+       - num_val  The number of distinct values of each name attribute.
+
+     Output:
+       - rec_val_list  A list of records, each a list of four strings.
+  """
+
+  rand_gen = random.Random(seed)
+
+  letter_list = sorted(LETTER_FREQ_DICT.keys())
+  cum_letter_list = numpy.cumsum([LETTER_FREQ_DICT[c] for c in
+                                  letter_list]).tolist()
+
+  # Weights of the values by their rank
+  #
+  cum_rank_list = numpy.cumsum([1.0/(i+1) for i in range(num_val)]).tolist()
+
+  attr_val_list_list = []  # Distinct values of each attribute
+
+  for len_prob_dict in ATTR_LEN_PROB_LIST:
+    len_list = sorted(len_prob_dict.keys())
+    cum_len_list = numpy.cumsum([len_prob_dict[l] for l in len_list]).tolist()
+
+    val_list = []
+    for i in range(num_val):
+      val_len = choose_weighted(rand_gen, len_list, cum_len_list)
+      val_list.append(''.join([choose_weighted(rand_gen, letter_list,
+                                               cum_letter_list) for j in
+                               range(val_len)]))
+    attr_val_list_list.append(val_list)
+
+  rec_val_list = []
+
+  for i in xrange(num_rec):
+    rec = [choose_weighted(rand_gen, val_list, cum_rank_list) for val_list
+           in attr_val_list_list]
+    rec.append(str(rand_gen.randint(1930, 2005)))  # Year of birth
+
+    rec_val_list.append(rec)
+
+  return rec_val_list
+
+# -----------------------------------------------------------------------------
+
+def gen_q_gram_set_list(rec_val_list, q, padded=False):
+  """Return a list with the set of q-grams of each of the given records (of
+     all name attributes, as encoded into one Bloom filter per record).
+  """
+
+  q_gram_set_list = []
+
+  for rec in rec_val_list:
+    q_gram_set = set()
+    for attr_val in rec[:len(ATTR_LEN_PROB_LIST)]:
+      q_gram_set.update(qgrams.get_q_gram_set(attr_val, q, padded))
+
+    q_gram_set_list.append(q_gram_set)
+
+  return q_gram_set_list
+
+# -----------------------------------------------------------------------------
+
+def is_valid_config(hash_type, variant, salted):
+  """Return True if the given variant can be used with the given hashing
+     type and salting, False otherwise.
+  """
+
+  if (variant == 'prefix'):
+    return (salted == True) and (hash_type not in ['rh', 'crh'])
+
+  return True
+
+# -----------------------------------------------------------------------------
+
+def gen_hash_class(hash_type, variant, bf_len, k):
+  """Generate the hashing class for the given hashing type and variant.
+
+     Input arguments:
+       - hash_type  One of the types in 'HASH_TYPE_LIST'.
+       - variant    One of the variants in 'VARIANT_LIST'.
+       - bf_len     The length in bits of the Bloom filters.
+       - k          The number of hash functions.
+
+     Output:
+       - hash_class  The hashing class (or vocabulary position table).
+  """
+
+  if (variant == 'cache'):
+    pos_cache_size = POS_CACHE_SIZE
+  else:
+    pos_cache_size = 0
+
+  if (variant == 'prefix'):
+    salt_prefix_size = SALT_PREFIX_SIZE
+  else:
+    salt_prefix_size = 0
+
+  if (hash_type in ['sdh', 'sedh', 'sth']):  # Single-digest hashing types
+    base_hash_type = hash_type[1:]
+    split_digest =   hashing.SplitDigest({'dh':2, 'edh':2,
+                                          'th':3}[base_hash_type],
+                                         BENCH_DIGEST_FUNCT)
+  else:
+    base_hash_type = hash_type
+    split_digest =   None
+
+  if (base_hash_type == 'dh'):
+    hash_class = hashing.DoubleHashing(BENCH_HASH_FUNCT1, BENCH_HASH_FUNCT2,
+                                       bf_len, k, False, pos_cache_size,
+                                       split_digest, salt_prefix_size)
+  elif (base_hash_type == 'edh'):
+    hash_class = hashing.EnhancedDoubleHashing(BENCH_HASH_FUNCT1,
+                                               BENCH_HASH_FUNCT2, bf_len, k,
+                                               False, pos_cache_size,
+                                               split_digest, salt_prefix_size)
+  elif (base_hash_type == 'th'):
+    hash_class = hashing.TripleHashing(BENCH_HASH_FUNCT1, BENCH_HASH_FUNCT2,
+                                       BENCH_HASH_FUNCT3, bf_len, k, False,
+                                       pos_cache_size, split_digest,
+                                       salt_prefix_size)
+  elif (base_hash_type == 'rh'):
+    hash_class = hashing.RandomHashing(BENCH_HASH_FUNCT1, bf_len, k, False,
+                                       pos_cache_size)
+  elif (base_hash_type == 'crh'):
+    hash_class = hashing.CounterRandomHashing(BENCH_HASH_FUNCT1, bf_len, k,
+                                              False, pos_cache_size)
+  else:
+    raise Exception, 'Unknown hashing type: %s' % (hash_type)
+
+  if (variant == 'vocab'):
+    hash_class = hashing.VocabPosTable(hash_class)
+
+  return hash_class
+
+# -----------------------------------------------------------------------------
+
+def hash_q_gram_sets(hash_class, variant, q_gram_set_list, salt_str_list):
+  """Hash the given q-gram sets with the given hashing class in the way of
+     the given variant, and return the Bloom filters (either a list of
+     bitarrays or a matrix of packed bits, see 'hashing.gen_packed_bf_matrix').
+  """
+
+  if (variant in ['batch', 'vocab']):
+    return hash_class.hash_q_gram_set_list(q_gram_set_list, salt_str_list)
+
+  hash_q_gram_set = hash_class.hash_q_gram_set  # Short-cut
+
+  if (salt_str_list == None):
+    return [hash_q_gram_set(q_gram_set) for q_gram_set in q_gram_set_list]
+
+  return [hash_q_gram_set(q_gram_set, salt_str_list[i]) for (i, q_gram_set)
+          in enumerate(q_gram_set_list)]
+
+# -----------------------------------------------------------------------------
+
+def get_peak_memory_val():
+  """Return the peak resident set size of this process in megabytes.
+  """
+
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+# -----------------------------------------------------------------------------
+
+def run_config(config_dict):
+  """Time the hashing of records with the hashing type, variant and
+     parameters in the given configuration dictionary (with the keys
+     'hash_type', 'variant', 'bf_len', 'k', 'q', 'salted', 'num_rec',
+     'num_repeat' and 'seed'), and return a dictionary with the configuration
+     and its results.
+
+     A new hashing class is generated for each run, so caches always start
+     empty. Only the hashing itself is timed, and the fastest run is
+     reported.
+  """
+
+  rec_val_list = gen_rec_val_list(config_dict['num_rec'], config_dict['seed'])
+
+  q_gram_set_list = gen_q_gram_set_list(rec_val_list, config_dict['q'])
+
+  if (config_dict['salted'] == True):  # Salt with the year of birth
+    salt_str_list = [rec[-1] for rec in rec_val_list]
+  else:
+    salt_str_list = None
+
+  num_q_gram = sum([len(q_gram_set) for q_gram_set in q_gram_set_list])
+
+  start_mem = auxiliary.get_memory_rss_val()
+
+  time_list = []
+
+  for r in range(config_dict['num_repeat']):
+    hash_class = gen_hash_class(config_dict['hash_type'],
+                                config_dict['variant'],
+                                config_dict['bf_len'], config_dict['k'])
+
+    start_time = time.time()
+    bf_list = hash_q_gram_sets(hash_class, config_dict['variant'],
+                               q_gram_set_list, salt_str_list)
+    time_list.append(time.time() - start_time)
+
+    del bf_list
+
+  hash_time = max(min(time_list), 1e-9)
+
+  res_dict = dict(config_dict)
+
+  res_dict['num_q_gram'] =      num_q_gram
+  res_dict['time_sec'] =        hash_time
+  res_dict['q_grams_per_sec'] = num_q_gram / hash_time
+  res_dict['recs_per_sec'] =    len(q_gram_set_list) / hash_time
+  res_dict['start_mem_mb'] =    start_mem
+  res_dict['peak_mem_mb'] =     get_peak_memory_val()
+
+  return res_dict
+
+# -----------------------------------------------------------------------------
+
+def gen_config_list(grid_dict, num_rec=NUM_REC, num_repeat=NUM_REPEAT,
+                    hash_type_list=HASH_TYPE_LIST, variant_list=VARIANT_LIST,
+                    seed=RAND_SEED):
+  """Return the list of configuration dictionaries (see 'run_config') for
+     all combinations of the given hashing types, variants and the values in
+     the given parameter grid.
+  """
+
+  config_list = []
+
+  for hash_type in hash_type_list:
+    for variant in variant_list:
+      for bf_len in grid_dict['bf_len']:
+        for k in grid_dict['k']:
+          for q in grid_dict['q']:
+            for salted in grid_dict['salted']:
+
+              if (is_valid_config(hash_type, variant, salted) == True):
+                config_list.append({'hash_type':hash_type,
+                                    'variant':variant, 'bf_len':bf_len,
+                                    'k':k, 'q':q, 'salted':salted,
+                                    'num_rec':num_rec,
+                                    'num_repeat':num_repeat, 'seed':seed})
+  return config_list
+
+# -----------------------------------------------------------------------------
+
+def run_benchmark(config_list, json_file_name=None):
+  """Run the given configurations, each in its own process, and return the
+     benchmark results as a dictionary with the settings of the benchmark
+     and the list of results of each configuration. If a file name is given
+     then the results are also written into this JSON file (after each
+     configuration, so the results are kept if the benchmark is stopped).
+  """
+
+  bench_dict = {'python_version': sys.version.split()[0],
+                'numpy_version':  numpy.__version__,
+                'start_time':     time.strftime('%Y-%m-%d %H:%M:%S'),
+                'res_list':       []}
+
+  # A new process for each configuration, so peak memory use is measured
+  # per configuration
+  #
+  pool = multiprocessing.Pool(1, maxtasksperchild=1)
+
+  for (i, config_dict) in enumerate(config_list):
+    res_dict = pool.apply(run_config, (config_dict,))
+
+    bench_dict['res_list'].append(res_dict)
+
+    print '  %4d / %d: %-4s %-6s bf_len=%4d k=%2d q=%d salted=%-5s ' % \
+          (i+1, len(config_list), res_dict['hash_type'],
+           res_dict['variant'], res_dict['bf_len'], res_dict['k'],
+           res_dict['q'], res_dict['salted']) + \
+          '%9.0f q-grams/sec %8.0f records/sec, peak memory %.1f MB' % \
+          (res_dict['q_grams_per_sec'], res_dict['recs_per_sec'],
+           res_dict['peak_mem_mb'])
+
+    if (json_file_name != None):
+      out_f = open(json_file_name, 'w')
+      json.dump(bench_dict, out_f, indent=2, sort_keys=True)
+      out_f.close()
+
+  pool.close()
+  pool.join()
+
+  return bench_dict
+
+# =============================================================================
+# Run the benchmark, or some tests if no JSON file name is given
+
+if (__name__ == '__main__'):
+
+  if (len(sys.argv) > 1):
+    json_file_name = sys.argv[1]
+
+    if (len(sys.argv) > 2):
+      grid_name = sys.argv[2]
+    else:
+      grid_name = 'quick'
+    assert grid_name in ['quick', 'full'], grid_name
+
+    if (len(sys.argv) > 3):
+      num_rec = int(sys.argv[3])
+    else:
+      num_rec = NUM_REC
+
+    grid_dict = {'quick':QUICK_GRID_DICT, 'full':FULL_GRID_DICT}[grid_name]
+
+    config_list = gen_config_list(grid_dict, num_rec)
+
+    print 'Hashing benchmark with %d configurations of %d records:' % \
+          (len(config_list), num_rec)
+
+    run_benchmark(config_list, json_file_name)
+
+    print 'Benchmark results written into file:', json_file_name
+
+    sys.exit()
+
+  print 'Running some tests:'
+  print
+
+  test_rec_val_list = gen_rec_val_list(200, 1, 50)
+  assert test_rec_val_list == gen_rec_val_list(200, 1, 50)
+
+  for rec in test_rec_val_list:
+    assert len(rec) == 4
+    for (j, len_prob_dict) in enumerate(ATTR_LEN_PROB_LIST):
+      assert len(rec[j]) in len_prob_dict, (rec[j], j)
+    assert 1930 <= int(rec[3]) <= 2005
+
+  # Frequent values occur in many records
+  #
+  assert len(set([rec[0] for rec in test_rec_val_list])) < 50
+  print '  Record generation correct'
+
+  # All variants of a hashing type give the same Bloom filters
+  #
+  test_q_gram_set_list = gen_q_gram_set_list(test_rec_val_list, 2)
+  test_salt_str_list =   [rec[-1] for rec in test_rec_val_list]
+
+  for hash_type in HASH_TYPE_LIST:
+    for salt_str_list in [None, test_salt_str_list]:
+      bf_list = hash_q_gram_sets(gen_hash_class(hash_type, 'set', 100, 5),
+                                 'set', test_q_gram_set_list, salt_str_list)
+
+      for variant in VARIANT_LIST[1:]:
+        if (is_valid_config(hash_type, variant,
+                            salt_str_list != None) == False):
+          continue
+
+        hash_class = gen_hash_class(hash_type, variant, 100, 5)
+        var_bf_list = hash_q_gram_sets(hash_class, variant,
+                                       test_q_gram_set_list, salt_str_list)
+
+        for (i, bf) in enumerate(bf_list):
+          if (variant in ['batch', 'vocab']):
+            assert hashing.packed_row_to_bf(var_bf_list[i], 100) == bf, \
+                   (hash_type, variant, i)
+          else:
+            assert var_bf_list[i] == bf, (hash_type, variant, i)
+  print '  Hashing variants give the same Bloom filters'
+
+  test_config_list = gen_config_list(QUICK_GRID_DICT, 100, 1,
+                                     ['dh', 'rh'])
+  assert len(test_config_list) == 4*2 + 1 + 4*2  # 'prefix' only salted DH
+
+  test_bench_dict = run_benchmark(test_config_list[:3])
+  assert len(test_bench_dict['res_list']) == 3
+
+  for res_dict in test_bench_dict['res_list']:
+    assert res_dict['num_q_gram'] > 100
+    assert res_dict['q_grams_per_sec'] > res_dict['recs_per_sec'] > 0
+    assert res_dict['peak_mem_mb'] > 0
+
+  assert json.loads(json.dumps(test_bench_dict)) == test_bench_dict
+  print '  Benchmark runs correct'
+
+  print
+  print 'All tests passed'
+
+# =============================================================================
+# End.
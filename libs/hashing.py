@@ -30,11 +30,862 @@
 #
 # =============================================================================
 
+import collections
 import hashlib  # A standard Python library
+import hmac     # For keyed single-digest hashing
 import random   # For random hashing
 
 import bitarray  # Efficient bit-arrays, available from:
                  # https://pypi.org/project/bitarray/
+import numpy
+
+# =============================================================================
+
+def gen_packed_bf_matrix(q_gram_pos_funct, q_gram_set_list, bf_len,
+                         salt_str_list=None):
+  """Hash a sequence of q-gram sets into a matrix of Bloom filters, one row
+     per q-gram set, where the bits of each row are packed into bytes with
+     the first bit of a Bloom filter in the highest bit of the first byte
+     (the same layout as the bytes of a bitarray, see 'packed_row_to_bf').
+
+     Input arguments:
+       - q_gram_pos_funct  A function that returns the list of bit positions
+                           of a q-gram (the 'get_q_gram_pos_list' method of a
+                           hashing class).
+       - q_gram_set_list   A list of q-gram sets.
+       - bf_len            The length in bits of the Bloom filters.
+       - salt_str_list     An optional list with one salting string (or None)
+                           for each q-gram set.
+
+     Output:
+       - bf_matrix  A NumPy uint8 array with one row of (bf_len+7)/8 bytes
+                    for each q-gram set.
+  """
+
+  row_num_list = []  # Row and column of each bit to be set
+  pos_list =     []
+
+  for (row_num, q_gram_set) in enumerate(q_gram_set_list):
+
+    if (salt_str_list != None):
+      salt_str = salt_str_list[row_num]
+    else:
+      salt_str = None
+
+    for q_gram in q_gram_set:
+
+      if (salt_str != None):  # If a salt is given concatenate with q-gram
+        q_gram = q_gram + salt_str
+
+      q_gram_pos_list = q_gram_pos_funct(q_gram)
+
+      pos_list +=     q_gram_pos_list
+      row_num_list += [row_num]*len(q_gram_pos_list)
+
+  bit_matrix = numpy.zeros((len(q_gram_set_list), bf_len),
+                           dtype=numpy.bool_)
+  bit_matrix[row_num_list, pos_list] = True
+
+  return numpy.packbits(bit_matrix, axis=1)
+
+# -----------------------------------------------------------------------------
+
+def gen_packed_bf_matrix_vect(q_gram_pos_matrix_funct, q_gram_set_list, bf_len,
+                              salt_str_list=None, group_by_salt=False):
+  """Hash a sequence of q-gram sets into a matrix of packed Bloom filters in
+     the same way as 'gen_packed_bf_matrix', but calculate the positions of
+     all distinct (salted) q-grams with one call of the given function (the
+     'calc_q_gram_pos_matrix' method of a hashing class), which returns a
+     matrix with one row of positions per q-gram.
+
+     If 'group_by_salt' is set to True then instead the function is called
+     once for each distinct salting string, with the list of the (unsalted)
+     q-grams to be hashed with this salting string and the salting string.
+  """
+
+  q_gram_id_dict = {}  # Distinct q-grams and their row in the position matrix
+
+  # For each salting string its distinct (unsalted) q-grams and their rows
+  # in the position matrix (only if grouped by salting strings)
+  #
+  salt_q_gram_dict = {}
+
+  row_num_list =   []  # Bloom filter row and q-gram of each q-gram occurrence
+  q_gram_id_list = []
+
+  for (row_num, q_gram_set) in enumerate(q_gram_set_list):
+
+    if (salt_str_list != None):
+      salt_str = salt_str_list[row_num]
+    else:
+      salt_str = None
+
+    for q_gram in q_gram_set:
+
+      if (salt_str != None):  # If a salt is given concatenate with q-gram
+        salted_q_gram = q_gram + salt_str
+      else:
+        salted_q_gram = q_gram
+
+      q_gram_id = q_gram_id_dict.get(salted_q_gram)
+      if (q_gram_id == None):
+        q_gram_id = len(q_gram_id_dict)
+        q_gram_id_dict[salted_q_gram] = q_gram_id
+
+        if (group_by_salt == True):
+          salt_q_gram_list, salt_q_gram_id_list = \
+                          salt_q_gram_dict.setdefault(salt_str, ([], []))
+          salt_q_gram_list.append(q_gram)
+          salt_q_gram_id_list.append(q_gram_id)
+
+      row_num_list.append(row_num)
+      q_gram_id_list.append(q_gram_id)
+
+  bit_matrix = numpy.zeros((len(q_gram_set_list), bf_len),
+                           dtype=numpy.bool_)
+
+  if (len(q_gram_id_dict) > 0):
+
+    if (group_by_salt == True):
+      pos_matrix = None
+
+      for (salt_str, (salt_q_gram_list, salt_q_gram_id_list)) in \
+          salt_q_gram_dict.iteritems():
+
+        if (salt_str != None):
+          salt_pos_matrix = q_gram_pos_matrix_funct(salt_q_gram_list,
+                                                    salt_str)
+        else:
+          salt_pos_matrix = q_gram_pos_matrix_funct(salt_q_gram_list)
+
+        if (pos_matrix is None):
+          pos_matrix = numpy.zeros((len(q_gram_id_dict),
+                                    salt_pos_matrix.shape[1]),
+                                   dtype=salt_pos_matrix.dtype)
+        pos_matrix[salt_q_gram_id_list] = salt_pos_matrix
+
+    else:
+      q_gram_list = [None]*len(q_gram_id_dict)
+      for (q_gram, q_gram_id) in q_gram_id_dict.iteritems():
+        q_gram_list[q_gram_id] = q_gram
+
+      pos_matrix = q_gram_pos_matrix_funct(q_gram_list)
+
+    k = pos_matrix.shape[1]
+
+    bit_matrix[numpy.repeat(row_num_list, k),
+               pos_matrix[q_gram_id_list].ravel()] = True
+
+  return numpy.packbits(bit_matrix, axis=1)
+
+# -----------------------------------------------------------------------------
+
+def calc_pos_matrix(bf_len, int1_array, int2_array, i_array, add_array=None,
+                    int3_array=None, mult3_array=None):
+  """Calculate the bit positions of q-grams for double, enhanced double and
+     triple hashing with NumPy uint64 arithmetic, where the position of q-gram
+     j for hash function i is:
+
+       (int1[j] + i*int2[j] + add[i] + mult3[i]*int3[j]) mod bf_len
+
+     All input arrays must already be reduced modulo 'bf_len' (which does not
+     change the result), so no intermediate value can overflow as long as
+     'bf_len' is at most 2^31.
+
+     Input arguments:
+       - bf_len       The length in bits of the Bloom filters.
+       - int1_array   A uint64 array with the first hash value of each q-gram.
+       - int2_array   A uint64 array with the second hash value of each
+                      q-gram.
+       - i_array      A uint64 array with the numbers of the k hash functions.
+       - add_array    An optional uint64 array with a value added for each
+                      hash function.
+       - int3_array   An optional uint64 array with the third hash value of
+                      each q-gram.
+       - mult3_array  An optional uint64 array with the factor of the third
+                      hash value for each hash function.
+
+     Output:
+       - pos_matrix  A NumPy int64 array with one row of k bit positions per
+                     q-gram.
+  """
+
+  assert bf_len <= 2**31, bf_len
+
+  m = numpy.uint64(bf_len)
+
+  pos_matrix = int1_array[:,None] + (int2_array[:,None] * i_array[None,:]) % m
+
+  if (add_array is not None):
+    pos_matrix += add_array[None,:]
+
+  if (int3_array is not None):
+    pos_matrix += (int3_array[:,None] * mult3_array[None,:]) % m
+
+  pos_matrix %= m
+
+  return pos_matrix.astype(numpy.int64)
+
+# -----------------------------------------------------------------------------
+
+def calc_hash_val_array(hash_funct, q_gram_list, bf_len):
+  """Return a uint64 array with the hash values of the given q-grams
+     (hexadecimal digests converted into integers) reduced modulo 'bf_len'.
+  """
+
+  return numpy.array([int(hash_funct(q_gram).hexdigest(), 16) % bf_len
+                      for q_gram in q_gram_list], dtype=numpy.uint64)
+
+# -----------------------------------------------------------------------------
+
+# Constants of the Philox4x32 counter-based random number generator (see
+# the function 'philox4x32')
+#
+PHILOX_M0 =    numpy.uint64(0xD2511F53)  # Round multipliers
+PHILOX_M1 =    numpy.uint64(0xCD9E8D57)
+PHILOX_W0 =    numpy.uint64(0x9E3779B9)  # Key increments per round
+PHILOX_W1 =    numpy.uint64(0xBB67AE85)
+PHILOX_MASK =  numpy.uint64(0xFFFFFFFF)
+PHILOX_SHIFT = numpy.uint64(32)
+
+def philox4x32(ctr_list, key_list, num_round=10):
+  """Apply the Philox4x32 bijection (with 10 rounds this is the
+     Philox4x32-10 generator) to the given counters and keys, as proposed
+     by:
+       - J.K. Salmon, M.A. Moraes, R.O. Dror, and D.E. Shaw, Parallel random
+         numbers: as easy as 1, 2, 3, International Conference for High
+         Performance Computing, Networking, Storage and Analysis, 2011.
+
+     The counters and keys are NumPy uint64 arrays holding 32-bit values
+     (or such scalars), which are broadcast against each other, so that the
+     random words of many counters and keys are generated in one call.
+
+     Input arguments:
+       - ctr_list   A list of the four 32-bit words of the counters.
+       - key_list   A list of the two 32-bit words of the keys.
+       - num_round  The number of rounds to apply.
+
+     Output:
+       - word_list  A list of the four uint64 arrays with the 32-bit random
+                    words generated for the counters and keys.
+  """
+
+  mask =  PHILOX_MASK  # Short-cuts
+  shift = PHILOX_SHIFT
+
+  (c0, c1, c2, c3) = ctr_list
+  (k0, k1) =         key_list
+
+  for r in range(num_round):
+
+    if (r > 0):  # Increment the key for each round after the first
+      k0 = (k0 + PHILOX_W0) & mask
+      k1 = (k1 + PHILOX_W1) & mask
+
+    prod0 = PHILOX_M0 * c0  # Products of two 32-bit values fit into 64 bits
+    prod1 = PHILOX_M1 * c2
+
+    (c0, c1, c2, c3) = ((prod1 >> shift) ^ c1 ^ k0, prod1 & mask,
+                        (prod0 >> shift) ^ c3 ^ k1, prod0 & mask)
+
+  return [c0, c1, c2, c3]
+
+# -----------------------------------------------------------------------------
+
+def calc_int_array_list(int_list_list, num_int, bf_len):
+  """Return a list with one uint64 array for each of the 'num_int' integers
+     in the given lists of integers (one list per q-gram), holding these
+     integers reduced modulo 'bf_len'.
+  """
+
+  return [numpy.array([int_list[i] % bf_len for int_list in int_list_list],
+                      dtype=numpy.uint64) for i in range(num_int)]
+
+# -----------------------------------------------------------------------------
+
+def packed_row_to_bf(packed_row, bf_len):
+  """Convert one row of a matrix generated by 'gen_packed_bf_matrix' into a
+     Bloom filter (bitarray) of the given length.
+  """
+
+  bf = bitarray.bitarray(endian='big')
+  bf.frombytes(packed_row.tobytes())
+
+  del bf[bf_len:]
+
+  return bf
+
+# -----------------------------------------------------------------------------
+
+def pos_array_to_bf(pos_array, bf_len):
+  """Return a Bloom filter (bitarray) of the given length with the bits at
+     the positions in the given NumPy array set to 1.
+  """
+
+  bit_array = numpy.zeros(bf_len, dtype=numpy.bool_)
+  bit_array[pos_array] = True
+
+  return packed_row_to_bf(numpy.packbits(bit_array), bf_len)
+
+# =============================================================================
+
+class QGramPosArrays():
+  """The bit positions q-grams are hashed to, kept in NumPy arrays instead of
+     a dictionary with q-grams as keys and sets of positions as values. The
+     hashing classes return this form if 'get_q_gram_pos' is set to 'array'.
+
+     The positions are kept as pairs of a q-gram identifier (the index of the
+     q-gram in 'q_gram_list') and a bit position, in two arrays of the same
+     length. A q-gram hashed with k hash functions has k pairs (one row of the
+     [n, k] position matrix of the hashing class), but after remapping (by
+     hardening or record level Bloom filter encoding) a q-gram can have any
+     number of pairs, and the same pair can occur several times. Converting
+     into a dictionary removes these duplicates.
+
+     Remapping positions only needs array operations on the position array,
+     so the positions of all q-grams can be kept for full data sets.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, q_gram_list, q_gram_id_array, pos_array):
+    """Initialise the q-gram position arrays.
+
+       Input arguments:
+         - q_gram_list      The list of (salted) q-grams.
+         - q_gram_id_array  A NumPy array with the identifiers (indices into
+                            'q_gram_list') of the q-grams of all pairs.
+         - pos_array        A NumPy array with the bit positions of all pairs.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert len(q_gram_id_array) == len(pos_array), \
+           (len(q_gram_id_array), len(pos_array))
+
+    self.q_gram_list =     q_gram_list
+    self.q_gram_id_array = numpy.asarray(q_gram_id_array, dtype=numpy.intp)
+    self.pos_array =       numpy.asarray(pos_array, dtype=numpy.int64)
+
+  # ---------------------------------------------------------------------------
+
+  def to_dict(self):
+    """Return the positions as a dictionary which has q-grams as keys and
+       where values are sets with the positions of these q-grams (q-grams
+       without any position are not included).
+    """
+
+    q_gram_list = self.q_gram_list  # Short-cut
+
+    q_gram_pos_dict = {}
+
+    for (q_gram_id, pos) in zip(self.q_gram_id_array.tolist(),
+                                self.pos_array.tolist()):
+      q_gram = q_gram_list[q_gram_id]
+
+      pos_set = q_gram_pos_dict.get(q_gram)
+      if (pos_set == None):
+        q_gram_pos_dict[q_gram] = set([pos])
+      else:
+        pos_set.add(pos)
+
+    return q_gram_pos_dict
+
+  # ---------------------------------------------------------------------------
+
+  def map_pos(self, pos_map_array):
+    """Return new position arrays where each position p is replaced with
+       'pos_map_array[p]' (for example a permutation of the bit positions).
+    """
+
+    return QGramPosArrays(self.q_gram_list, self.q_gram_id_array,
+                          numpy.asarray(pos_map_array)[self.pos_array])
+
+  # ---------------------------------------------------------------------------
+
+  def add_shifted_pos(self, offset):
+    """Return new position arrays which contain all pairs, and a copy of all
+       pairs with their positions increased by the given offset.
+    """
+
+    return QGramPosArrays(self.q_gram_list,
+                          numpy.concatenate([self.q_gram_id_array,
+                                             self.q_gram_id_array]),
+                          numpy.concatenate([self.pos_array,
+                                             self.pos_array + offset]))
+
+  # ---------------------------------------------------------------------------
+
+  def sample_pos(self, sample_pos_array, offset=0):
+    """Return new position arrays for a Bloom filter where bit 'offset+i' is
+       copied from bit 'sample_pos_array[i]' of the Bloom filter of these
+       positions. A pair is replaced with one pair for each time its position
+       is sampled (so a pair whose position is not sampled is removed).
+    """
+
+    sample_pos_array = numpy.asarray(sample_pos_array, dtype=numpy.int64)
+
+    # Sampled positions in sorted order, so the sample indices of each
+    # position are a range found with binary search
+    #
+    order_array =       numpy.argsort(sample_pos_array, kind='mergesort')
+    sorted_pos_array =  sample_pos_array[order_array]
+
+    start_array = numpy.searchsorted(sorted_pos_array, self.pos_array, 'left')
+    count_array = numpy.searchsorted(sorted_pos_array, self.pos_array,
+                                     'right') - start_array
+
+    # Index of each new pair into the sorted samples: the start of the range
+    # of its original pair plus its number within that range
+    #
+    num_new_pair = count_array.sum()
+    first_array = numpy.cumsum(count_array) - count_array
+
+    sorted_index_array = numpy.repeat(start_array - first_array,
+                                      count_array) + numpy.arange(num_new_pair)
+
+    return QGramPosArrays(self.q_gram_list,
+                          numpy.repeat(self.q_gram_id_array, count_array),
+                          order_array[sorted_index_array] + offset)
+
+# -----------------------------------------------------------------------------
+
+def gen_q_gram_pos_arrays(q_gram_list, pos_matrix):
+  """Return the position arrays for the given list of q-grams and the matrix
+     with one row of bit positions for each of these q-grams.
+  """
+
+  pos_matrix = numpy.asarray(pos_matrix)
+
+  num_pos = pos_matrix.shape[1] if (pos_matrix.ndim == 2) else 0
+
+  return QGramPosArrays(q_gram_list,
+                        numpy.repeat(numpy.arange(len(q_gram_list)), num_pos),
+                        pos_matrix.ravel())
+
+# -----------------------------------------------------------------------------
+
+def merge_q_gram_pos_arrays(q_gram_pos_arrays_list):
+  """Merge the given list of position arrays into one, where a q-gram that
+     occurs in several of them is given one identifier (so converting the
+     merged arrays into a dictionary gives the union of the position sets of
+     each q-gram).
+  """
+
+  q_gram_id_dict = {}  # Merged q-grams and their identifiers
+  q_gram_list =    []
+
+  q_gram_id_array_list = []
+  pos_array_list =       []
+
+  for q_gram_pos_arrays in q_gram_pos_arrays_list:
+
+    id_map_list = []  # New identifiers of the q-grams of these arrays
+
+    for q_gram in q_gram_pos_arrays.q_gram_list:
+      q_gram_id = q_gram_id_dict.get(q_gram)
+      if (q_gram_id == None):
+        q_gram_id = len(q_gram_list)
+        q_gram_id_dict[q_gram] = q_gram_id
+        q_gram_list.append(q_gram)
+      id_map_list.append(q_gram_id)
+
+    id_map_array = numpy.array(id_map_list, dtype=numpy.intp)
+
+    q_gram_id_array_list.append(id_map_array[q_gram_pos_arrays.q_gram_id_array])
+    pos_array_list.append(q_gram_pos_arrays.pos_array)
+
+  if (len(q_gram_id_array_list) == 0):
+    return QGramPosArrays([], [], [])
+
+  return QGramPosArrays(q_gram_list, numpy.concatenate(q_gram_id_array_list),
+                        numpy.concatenate(pos_array_list))
+
+# -----------------------------------------------------------------------------
+
+def hash_q_gram_set_pos_arrays(hash_class, q_gram_set, salt_str=None):
+  """Hash the given q-gram set with the given hashing class, and return the
+     Bloom filter together with the positions of the (salted) q-grams as
+     'QGramPosArrays'. The positions of all q-grams are calculated with one
+     call of the vectorised method of the hashing class if it has one.
+  """
+
+  if (salt_str != None):
+    q_gram_list = [q_gram + salt_str for q_gram in q_gram_set]
+  else:
+    q_gram_list = list(q_gram_set)
+
+  k = hash_class.num_hash_funct
+
+  if (len(q_gram_list) == 0):
+    pos_matrix = numpy.zeros((0, k), dtype=numpy.int64)
+
+  elif (hasattr(hash_class, 'calc_q_gram_pos_matrix')):
+    pos_matrix = hash_class.calc_q_gram_pos_matrix(q_gram_list)
+
+  else:
+    pos_matrix = numpy.array([hash_class.get_q_gram_pos_list(q_gram) for
+                              q_gram in q_gram_list],
+                             dtype=numpy.int64).reshape(len(q_gram_list), k)
+
+  bf = pos_array_to_bf(pos_matrix.ravel(), hash_class.bf_len)
+
+  return bf, gen_q_gram_pos_arrays(q_gram_list, pos_matrix)
+
+# =============================================================================
+
+class QGramPosCache():
+  """A bounded cache of the bit positions q-grams are hashed to, for hashing
+     methods where these positions only depend on the (salted) q-gram. When
+     the cache is full the least recently used q-gram is removed.
+
+     Positions are kept as tuples which are shared between all callers.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, calc_pos_funct, max_size):
+    """Initialise the position cache.
+
+       Input arguments:
+         - calc_pos_funct  A function that calculates the list of bit
+                           positions of a (salted) q-gram.
+         - max_size        The maximum number of q-grams to keep in the
+                           cache.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert max_size > 0, max_size
+
+    self.calc_pos_funct = calc_pos_funct
+    self.max_size =       max_size
+
+    self.cache_dict = collections.OrderedDict()  # From least to most recently
+                                                 # used q-gram
+    self.num_hit =  0
+    self.num_miss = 0
+
+  # ---------------------------------------------------------------------------
+
+  def get_pos_tuple(self, q_gram):
+    """Return the tuple of bit positions of the given (salted) q-gram,
+       calculating them if the q-gram is not in the cache.
+    """
+
+    cache_dict = self.cache_dict  # Short-cut
+
+    pos_tuple = cache_dict.pop(q_gram, None)
+
+    if (pos_tuple != None):
+      self.num_hit += 1
+
+    else:
+      self.num_miss += 1
+
+      pos_tuple = tuple(self.calc_pos_funct(q_gram))
+
+      if (len(cache_dict) >= self.max_size):
+        cache_dict.popitem(last=False)  # Remove least recently used q-gram
+
+    cache_dict[q_gram] = pos_tuple  # Now the most recently used q-gram
+
+    return pos_tuple
+
+  # ---------------------------------------------------------------------------
+
+  def get_pos_tuple_list(self, q_gram_list, calc_pos_matrix_funct, salt_str):
+    """Return the list of the tuples of bit positions of the given distinct
+       q-grams, each concatenated with the salting string, where the
+       positions of all salted q-grams not in the cache are calculated with
+       one call of the given function (the 'calc_q_gram_pos_matrix' method
+       of a hashing class) with the list of these (unsalted) q-grams and the
+       salting string.
+    """
+
+    cache_dict = self.cache_dict  # Short-cut
+
+    pos_tuple_list = []
+    miss_j_list =    []  # Positions in the list of q-grams not in the cache
+
+    for (j, q_gram) in enumerate(q_gram_list):
+      salted_q_gram = q_gram + salt_str
+
+      pos_tuple = cache_dict.pop(salted_q_gram, None)
+
+      if (pos_tuple != None):
+        self.num_hit += 1
+        cache_dict[salted_q_gram] = pos_tuple  # Now most recently used
+      else:
+        miss_j_list.append(j)
+
+      pos_tuple_list.append(pos_tuple)
+
+    if (len(miss_j_list) > 0):
+      pos_matrix = calc_pos_matrix_funct([q_gram_list[j] for j in
+                                          miss_j_list], salt_str)
+
+      for (j, pos_list) in zip(miss_j_list, pos_matrix.tolist()):
+        self.num_miss += 1
+
+        pos_tuple = tuple(pos_list)
+
+        if (len(cache_dict) >= self.max_size):
+          cache_dict.popitem(last=False)  # Remove least recently used q-gram
+
+        cache_dict[q_gram_list[j] + salt_str] = pos_tuple
+        pos_tuple_list[j] = pos_tuple
+
+    return pos_tuple_list
+
+  # ---------------------------------------------------------------------------
+
+  def warm(self, q_gram_iter, calc_pos_matrix_funct=None):
+    """Calculate the bit positions of all (salted) q-grams in the given
+       iterable (a vocabulary) and add them to the cache. If a function is
+       given that calculates the positions of a list of q-grams as a matrix
+       (the 'calc_q_gram_pos_matrix' method of a hashing class) then the
+       positions of all q-grams not in the cache are calculated in one call.
+    """
+
+    if (calc_pos_matrix_funct == None):
+      for q_gram in q_gram_iter:
+        self.get_pos_tuple(q_gram)
+      return
+
+    cache_dict = self.cache_dict  # Short-cut
+
+    new_q_gram_list = []
+    new_q_gram_set =  set()
+
+    for q_gram in q_gram_iter:
+      if (q_gram in cache_dict):
+        self.get_pos_tuple(q_gram)
+      elif (q_gram not in new_q_gram_set):
+        new_q_gram_list.append(q_gram)
+        new_q_gram_set.add(q_gram)
+
+    if (len(new_q_gram_list) == 0):
+      return
+
+    pos_matrix = calc_pos_matrix_funct(new_q_gram_list)
+
+    for (q_gram, pos_list) in zip(new_q_gram_list, pos_matrix.tolist()):
+      self.num_miss += 1
+
+      if (len(cache_dict) >= self.max_size):
+        cache_dict.popitem(last=False)  # Remove least recently used q-gram
+
+      cache_dict[q_gram] = tuple(pos_list)
+
+  # ---------------------------------------------------------------------------
+
+  def evict(self):
+    """Remove all q-grams from the cache (but keep the hit and miss counters)
+       and return the number of q-grams removed. Used to release memory.
+    """
+
+    num_q_gram = len(self.cache_dict)
+
+    self.cache_dict.clear()
+
+    return num_q_gram
+
+  # ---------------------------------------------------------------------------
+
+  def get_stats(self):
+    """Return the number of cache hits, cache misses and the number of
+       q-grams currently in the cache.
+    """
+
+    return self.num_hit, self.num_miss, len(self.cache_dict)
+
+# =============================================================================
+
+class QGramHashPrefixes():
+  """A bounded store of hash objects (with the 'copy', 'update' and
+     'hexdigest' methods of the objects of the 'hashlib' module) that have
+     already been fed with a q-gram, for salted hashing where q-grams are
+     concatenated with a salting string before they are hashed. The digests
+     of a salted q-gram are then calculated by copying the hash objects of
+     the q-gram and feeding the copies with the salting string only. When
+     the store is full the least recently used q-gram is removed.
+
+     This only saves time if q-grams are longer than the block size of the
+     hash functions (64 bytes for MD5 and SHA-1), as otherwise copying a
+     hash object is not faster than hashing the salted q-gram again.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, hash_funct_list, max_size):
+    """Initialise the store of hash objects.
+
+       Input arguments:
+         - hash_funct_list  The list of hash functions which return a hash
+                            object fed with the string they are called with.
+         - max_size         The maximum number of q-grams to keep the hash
+                            objects of.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert max_size > 0, max_size
+
+    self.hash_funct_list = hash_funct_list
+    self.max_size =        max_size
+
+    self.prefix_dict = collections.OrderedDict()  # From least to most
+                                                  # recently used q-gram
+    self.num_hit =  0
+    self.num_miss = 0
+
+  # ---------------------------------------------------------------------------
+
+  def get_hex_digest_list(self, q_gram, salt_str):
+    """Return the list of the hexadecimal digests of the q-gram concatenated
+       with the salting string, one per hash function.
+    """
+
+    prefix_dict = self.prefix_dict  # Short-cut
+
+    hash_obj_list = prefix_dict.pop(q_gram, None)
+
+    if (hash_obj_list != None):
+      self.num_hit += 1
+
+    else:
+      self.num_miss += 1
+
+      hash_obj_list = [hash_funct(q_gram) for hash_funct in
+                       self.hash_funct_list]
+
+      if (len(prefix_dict) >= self.max_size):
+        prefix_dict.popitem(last=False)  # Remove least recently used q-gram
+
+    prefix_dict[q_gram] = hash_obj_list  # Now the most recently used q-gram
+
+    hex_str_list = []
+
+    for hash_obj in hash_obj_list:
+      salted_hash_obj = hash_obj.copy()
+      salted_hash_obj.update(salt_str)
+      hex_str_list.append(salted_hash_obj.hexdigest())
+
+    return hex_str_list
+
+  # ---------------------------------------------------------------------------
+
+  def evict(self):
+    """Remove all q-grams from the store (but keep the hit and miss counters)
+       and return the number of q-grams removed. Used to release memory.
+    """
+
+    num_q_gram = len(self.prefix_dict)
+
+    self.prefix_dict.clear()
+
+    return num_q_gram
+
+  # ---------------------------------------------------------------------------
+
+  def get_stats(self):
+    """Return the number of hits, misses and the number of q-grams whose
+       hash objects are currently kept.
+    """
+
+    return self.num_hit, self.num_miss, len(self.prefix_dict)
+
+# =============================================================================
+
+class SplitDigest():
+  """Calculate one wide digest per q-gram and split it into the several
+     integers needed by double, enhanced double and triple hashing, instead
+     of calculating a separate digest with each of two or three hash
+     functions. If a secret key is given then the digest is a keyed HMAC
+     (as used in deployments of Bloom filter encoding where the parties
+     share a secret key).
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, num_int, digest_funct=hashlib.sha512, key=None):
+    """Initialise the digest splitting class.
+
+       Input arguments:
+         - num_int       The number of integers to split each digest into.
+         - digest_funct  The hash function used to calculate digests (at
+                         least 4 bytes of digest are needed per integer).
+         - key           An optional secret key (string), if given then
+                         digests are HMACs with this key.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert num_int > 0, num_int
+    self.num_int = num_int
+
+    self.digest_funct = digest_funct
+    self.key =          key
+
+    if (key != None):
+      self.hmac_base = hmac.new(key, digestmod=digest_funct)  # Key is only
+      digest_size =    self.hmac_base.digest_size             # processed once
+    else:
+      digest_size = digest_funct().digest_size
+
+    self.int_hex_len = 2*(digest_size / num_int)  # Hex digits per integer
+    assert self.int_hex_len >= 8, (digest_size, num_int)
+
+  # ---------------------------------------------------------------------------
+
+  def new_hash_obj(self, q_gram):
+    """Return a new hash object (or HMAC object if a key is used) fed with
+       the given q-gram.
+    """
+
+    if (self.key != None):
+      hmac_funct = self.hmac_base.copy()
+      hmac_funct.update(q_gram)
+      return hmac_funct
+
+    return self.digest_funct(q_gram)
+
+  # ---------------------------------------------------------------------------
+
+  def split_hex_digest(self, hex_str):
+    """Return the list of integers obtained by splitting the given
+       hexadecimal digest into equally long parts (remaining digits are not
+       used).
+    """
+
+    l = self.int_hex_len  # Short-cut
+
+    return [int(hex_str[i*l:(i+1)*l], 16) for i in range(self.num_int)]
+
+  # ---------------------------------------------------------------------------
+
+  def get_int_list(self, q_gram):
+    """Return the list of integers obtained by splitting the digest of the
+       given q-gram.
+    """
+
+    return self.split_hex_digest(self.new_hash_obj(q_gram).hexdigest())
+
+  # ---------------------------------------------------------------------------
+
+  def get_int_array_list(self, q_gram_list, bf_len):
+    """Return a list with one uint64 array per integer, holding the integers
+       of the given q-grams reduced modulo 'bf_len' (as the function
+       'calc_hash_val_array' does for separate hash functions).
+    """
+
+    return calc_int_array_list([self.get_int_list(q_gram) for q_gram in
+                                q_gram_list], self.num_int, bf_len)
 
 # =============================================================================
 
@@ -48,19 +899,710 @@ class DoubleHashing():
 
   # ---------------------------------------------------------------------------
 
-  def __init__(self, hash_funct1, hash_funct2, bf_len, num_hash_funct,
-               get_q_gram_pos=False):
-    """Initialise the double-hashing class by providing the required
+  def __init__(self, hash_funct1, hash_funct2, bf_len, num_hash_funct,
+               get_q_gram_pos=False, pos_cache_size=0, split_digest=None,
+               salt_prefix_size=0):
+    """Initialise the double-hashing class by providing the required
+       parameters.
+
+       Input arguments:
+         - hash_funct1, hash_funct2  Two hash functions.
+         - bf_len                    The length in bits of the Bloom filters
+                                     to be generated.
+         - num_hash_funct            The number of hash functions to be used.
+         - get_q_gram_pos            A flag, if set to True then the bit
+                                     positions of where q-grams are hash into
+                                     are returned in a dictionary, if set to
+                                     'array' they are returned as
+                                     'QGramPosArrays'.
+         - pos_cache_size            The maximum number of q-grams whose bit
+                                     positions are kept in a cache (0 for no
+                                     caching).
+         - split_digest              An optional 'SplitDigest' object giving
+                                     the two integers of a q-gram from one
+                                     digest, in which case the two hash
+                                     functions are not used (and can be
+                                     None).
+         - salt_prefix_size          The maximum number of q-grams whose
+                                     hash objects are kept to calculate the
+                                     digests of salted q-grams (0 for not
+                                     keeping hash objects).
+
+       Output:
+         - This method does not return anything.
+    """
+
+    # Initialise the class variables
+    #
+    self.hash_funct1 = hash_funct1
+    self.hash_funct2 = hash_funct2
+
+    if (split_digest != None):
+      assert split_digest.num_int == 2, split_digest.num_int
+    self.split_digest = split_digest
+
+    if (split_digest != None):
+      self.hash_obj_funct_list = [split_digest.new_hash_obj]
+    else:
+      self.hash_obj_funct_list = [hash_funct1, hash_funct2]
+
+    assert salt_prefix_size >= 0, salt_prefix_size
+    if (salt_prefix_size > 0):
+      self.salt_prefixes = QGramHashPrefixes(self.hash_obj_funct_list,
+                                             salt_prefix_size)
+    else:
+      self.salt_prefixes = None
+
+    assert bf_len > 1, bf_len
+    self.bf_len = bf_len
+
+    assert num_hash_funct > 0
+    self.num_hash_funct = num_hash_funct
+
+    assert get_q_gram_pos in [True, False, 'array']
+    self.get_q_gram_pos = get_q_gram_pos
+
+    assert pos_cache_size >= 0, pos_cache_size
+    if (pos_cache_size > 0):
+      self.pos_cache = QGramPosCache(self.calc_q_gram_pos_list,
+                                     pos_cache_size)
+      self.pos_cache_bf_len = bf_len  # Length the cached positions are for
+    else:
+      self.pos_cache = None
+
+  # ---------------------------------------------------------------------------
+
+  def hash_q_gram_set(self, q_gram_set, salt_str=None):
+    """Hash the given q-gram set according to the parameter using when
+       initialising the class.
+
+       Input arguments:
+         - q_gram_set  The set of q-grams (strings) to be hashed into a Bloom
+                       filter.
+         - salt_str    An optional string used for salting, if provided this
+                       string will be concatenated with every q-gram in the
+                       given q-gram set. If set to None no salting will be
+                       done.
+
+       Output:
+         - bf               A Bloom filter with bits set according to the input
+                            q-gram set and double hashing parameters.
+         - q_gram_pos_dict  [Only returned if 'get_q_gram_pos' is set to True]
+                            A dictionary which has q-grams as keys and where
+                            values are sets with the positions these q-grams
+                            are hashed to ('QGramPosArrays' if
+                            'get_q_gram_pos' is set to 'array').
+    """
+
+    if (self.get_q_gram_pos == 'array'):  # Positions of all q-grams together
+      return hash_q_gram_set_pos_arrays(self, q_gram_set, salt_str)
+
+    if (salt_str != None):  # Calculate the positions of all salted q-grams
+      return self.hash_salted_q_gram_set(q_gram_set, salt_str)  # together
+
+    bf_len = self.bf_len  # Short-cuts
+
+    get_q_gram_pos = self.get_q_gram_pos
+    if (get_q_gram_pos == True):
+      q_gram_pos_dict = {}
+
+    # Initialise the Bloom filter to have only 0-bits
+    #
+    bf = bitarray.bitarray(bf_len)
+    bf.setall(0)
+
+    # Hash the q-grams into the Bloom filter
+    #
+    for q_gram in q_gram_set:
+
+      q_gram_pos_list = self.get_q_gram_pos_list(q_gram)
+
+      for pos_i in q_gram_pos_list:
+        bf[pos_i] = 1
+
+      if (get_q_gram_pos == True):
+        q_gram_pos_dict[q_gram] = set(q_gram_pos_list)
+
+    if (get_q_gram_pos == True):
+      return bf, q_gram_pos_dict
+    else:
+      return bf
+
+  # ---------------------------------------------------------------------------
+
+  def hash_salted_q_gram_set(self, q_gram_set, salt_str):
+    """Hash the given q-gram set with each q-gram concatenated with the given
+       salting string, in the same way as 'hash_q_gram_set' but calculating
+       the positions of all salted q-grams (not in the position cache) with
+       one call of 'calc_q_gram_pos_matrix'.
+    """
+
+    q_gram_list = list(q_gram_set)
+
+    q_gram_pos_list_list = self.get_salted_q_gram_pos_lists(q_gram_list,
+                                                            salt_str)
+
+    # Initialise the Bloom filter to have only 0-bits
+    #
+    bf = bitarray.bitarray(self.bf_len)
+    bf.setall(0)
+
+    for q_gram_pos_list in q_gram_pos_list_list:
+      for pos_i in q_gram_pos_list:
+        bf[pos_i] = 1
+
+    if (self.get_q_gram_pos == True):
+      q_gram_pos_dict = {}
+
+      for (j, q_gram) in enumerate(q_gram_list):
+        q_gram_pos_dict[q_gram + salt_str] = set(q_gram_pos_list_list[j])
+
+      return bf, q_gram_pos_dict
+    else:
+      return bf
+
+  # ---------------------------------------------------------------------------
+
+  def get_salted_q_gram_pos_lists(self, q_gram_list, salt_str):
+    """Return a list with the lists of the bit positions the q-grams in the
+       given list (each concatenated with the salting string) are hashed to,
+       from the position cache if one is used.
+    """
+
+    if (self.pos_cache != None):
+      if (self.pos_cache_bf_len != self.bf_len):  # Bloom filter length was
+        self.pos_cache.evict()                    # changed after caching
+        self.pos_cache_bf_len = self.bf_len
+
+      return self.pos_cache.get_pos_tuple_list(q_gram_list,
+                                               self.calc_q_gram_pos_matrix,
+                                               salt_str)
+
+    return self.calc_q_gram_pos_matrix(q_gram_list, salt_str).tolist()
+
+  # ---------------------------------------------------------------------------
+
+  def get_q_gram_pos_list(self, q_gram):
+    """Return the list of the bit positions the given q-gram (which is
+       already salted if required) is hashed to, from the position cache if
+       one is used (in which case a shared tuple is returned).
+    """
+
+    if (self.pos_cache != None):
+      if (self.pos_cache_bf_len != self.bf_len):  # Bloom filter length was
+        self.pos_cache.evict()                    # changed after caching
+        self.pos_cache_bf_len = self.bf_len
+
+      return self.pos_cache.get_pos_tuple(q_gram)
+
+    return self.calc_q_gram_pos_list(q_gram)
+
+  # ---------------------------------------------------------------------------
+
+  def calc_q_gram_pos_list(self, q_gram):
+    """Calculate the list of the bit positions the given q-gram (which is
+       already salted if required) is hashed to.
+    """
+
+    bf_len = self.bf_len  # Short-cuts
+    k =      self.num_hash_funct
+
+    if (self.split_digest != None):
+      int1, int2 = self.split_digest.get_int_list(q_gram)
+
+    else:
+      hex_str1 = self.hash_funct1(q_gram).hexdigest()
+      int1 =     int(hex_str1, 16)
+
+      hex_str2 = self.hash_funct2(q_gram).hexdigest()
+      int2 =     int(hex_str2, 16)
+
+    q_gram_pos_list = []
+
+    for i in range(1, k+1):
+      pos_i = int1 + i*int2
+      q_gram_pos_list.append(int(pos_i % bf_len))
+
+    return q_gram_pos_list
+
+  # ---------------------------------------------------------------------------
+
+  def get_salted_int_list(self, q_gram, salt_str):
+    """Return the list of the hash values (integers) of the given q-gram
+       concatenated with the salting string, reusing the hash objects of the
+       q-gram if they are kept.
+    """
+
+    if (self.salt_prefixes != None):
+      hex_str_list = self.salt_prefixes.get_hex_digest_list(q_gram, salt_str)
+    else:
+      hex_str_list = [hash_obj_funct(q_gram + salt_str).hexdigest() for
+                      hash_obj_funct in self.hash_obj_funct_list]
+
+    if (self.split_digest != None):
+      return self.split_digest.split_hex_digest(hex_str_list[0])
+
+    return [int(hex_str, 16) for hex_str in hex_str_list]
+
+  # ---------------------------------------------------------------------------
+
+  def calc_q_gram_pos_matrix(self, q_gram_list, salt_str=None):
+    """Calculate the bit positions of all q-grams in the given list (each
+       concatenated with the salting string if one is given) with NumPy
+       arithmetic (see the function 'calc_pos_matrix'), and return them as a
+       matrix with one row of positions per q-gram, equal to the lists
+       returned by 'calc_q_gram_pos_list'.
+    """
+
+    bf_len = self.bf_len  # Short-cuts
+    k =      self.num_hash_funct
+
+    i_array = numpy.array([i % bf_len for i in range(1, k+1)],
+                          dtype=numpy.uint64)
+
+    if (salt_str != None):
+      int1_array, int2_array = \
+                 calc_int_array_list([self.get_salted_int_list(q_gram,
+                                                               salt_str)
+                                      for q_gram in q_gram_list], 2, bf_len)
+    elif (self.split_digest != None):
+      int1_array, int2_array = \
+                 self.split_digest.get_int_array_list(q_gram_list, bf_len)
+    else:
+      int1_array = calc_hash_val_array(self.hash_funct1, q_gram_list, bf_len)
+      int2_array = calc_hash_val_array(self.hash_funct2, q_gram_list, bf_len)
+
+    return calc_pos_matrix(bf_len, int1_array, int2_array, i_array)
+
+  # ---------------------------------------------------------------------------
+
+  def hash_q_gram_set_list(self, q_gram_set_list, salt_str_list=None):
+    """Hash each of the given q-gram sets into a Bloom filter in one call,
+       and return the Bloom filters as a matrix of packed bits (see the
+       function 'gen_packed_bf_matrix').
+
+       Input arguments:
+         - q_gram_set_list  A list of sets of q-grams (strings) to be hashed.
+         - salt_str_list    An optional list with one salting string (or
+                            None) for each q-gram set.
+
+       Output:
+         - bf_matrix  A NumPy uint8 array with one row of packed bits per
+                      q-gram set, with bits set according to the double
+                      hashing parameters.
+    """
+
+    # If hash objects of q-grams are kept then the q-grams of all Bloom
+    # filters with the same salting string are hashed together
+    #
+    return gen_packed_bf_matrix_vect(self.calc_q_gram_pos_matrix,
+                                     q_gram_set_list, self.bf_len,
+                                     salt_str_list,
+                                     self.salt_prefixes != None)
+
+  # ---------------------------------------------------------------------------
+
+  def warm_pos_cache(self, q_gram_iter, salt_str=None):
+    """Add the bit positions of all q-grams in the given iterable (a
+       vocabulary of q-grams, salted with the optional salting string) to the
+       position cache.
+    """
+
+    assert self.pos_cache != None
+
+    if (salt_str != None):
+      q_gram_iter = (q_gram + salt_str for q_gram in q_gram_iter)
+
+    self.pos_cache.warm(q_gram_iter)
+
+# =============================================================================
+
+class EnhancedDoubleHashing():
+  """Enhanced Double-hashing for Bloom filters was proposed and used by:
+       - P.C. Dillinger and P. Manolios, Bloom filters in probabilistic
+         verification, International Conference on Formal Methods in
+         Computer-Aided Design, 2004, pp. 367-381.
+       - P.C. Dillinger and P. Manolios, Fast and accurate bitstate
+         verification for SPIN, International SPIN Workshop on Model
+         Checking of Software, 2004, pp. 57-75.
+  """
+
+  # ----------------------------------------------------------------------------
+
+  def __init__(self, hash_funct1, hash_funct2, bf_len, num_hash_funct,
+               get_q_gram_pos=False, pos_cache_size=0, split_digest=None,
+               salt_prefix_size=0):
+    """Initialise the enhanced double-hashing class by providing the required
+       parameters.
+
+       Input arguments:
+         - hash_funct1, hash_funct2  Two hash functions.
+         - bf_len                    The length in bits of the Bloom filters
+                                     to be generated.
+         - num_hash_funct            The number of hash functions to be used.
+         - get_q_gram_pos            A flag, if set to True then the bit
+                                     positions of where q-grams are hash into
+                                     are returned in a dictionary, if set to
+                                     'array' they are returned as
+                                     'QGramPosArrays'.
+         - pos_cache_size            The maximum number of q-grams whose bit
+                                     positions are kept in a cache (0 for no
+                                     caching).
+         - split_digest              An optional 'SplitDigest' object giving
+                                     the two integers of a q-gram from one
+                                     digest, in which case the two hash
+                                     functions are not used (and can be
+                                     None).
+         - salt_prefix_size          The maximum number of q-grams whose
+                                     hash objects are kept to calculate the
+                                     digests of salted q-grams (0 for not
+                                     keeping hash objects).
+
+       Output:
+         - This method does not return anything.
+    """
+
+    # Initialise the class variables
+    #
+    self.hash_funct1 = hash_funct1
+    self.hash_funct2 = hash_funct2
+
+    if (split_digest != None):
+      assert split_digest.num_int == 2, split_digest.num_int
+    self.split_digest = split_digest
+
+    if (split_digest != None):
+      self.hash_obj_funct_list = [split_digest.new_hash_obj]
+    else:
+      self.hash_obj_funct_list = [hash_funct1, hash_funct2]
+
+    assert salt_prefix_size >= 0, salt_prefix_size
+    if (salt_prefix_size > 0):
+      self.salt_prefixes = QGramHashPrefixes(self.hash_obj_funct_list,
+                                             salt_prefix_size)
+    else:
+      self.salt_prefixes = None
+
+    assert bf_len > 1, bf_len
+    self.bf_len = bf_len
+
+    assert num_hash_funct > 0
+    self.num_hash_funct = num_hash_funct
+
+    assert get_q_gram_pos in [True, False, 'array']
+    self.get_q_gram_pos = get_q_gram_pos
+
+    assert pos_cache_size >= 0, pos_cache_size
+    if (pos_cache_size > 0):
+      self.pos_cache = QGramPosCache(self.calc_q_gram_pos_list,
+                                     pos_cache_size)
+      self.pos_cache_bf_len = bf_len  # Length the cached positions are for
+    else:
+      self.pos_cache = None
+
+  # ---------------------------------------------------------------------------
+
+  def hash_q_gram_set(self, q_gram_set, salt_str=None):
+    """Hash the given q-gram set according to the parameter using when
+       initialising the class.
+
+       Input arguments:
+         - q_gram_set  The set of q-grams (strings) to be hashed into a Bloom
+                       filter.
+         - salt_str    An optional string used for salting, if provided this
+                       string will be concatenated with every q-gram in the
+                       given q-gram set. If set to None no salting will be
+                       done.
+
+       Output:
+         - bf               A Bloom filter with bits set according to the input
+                            q-gram set and enhanced double hashing parameters.
+         - q_gram_pos_dict  [Only returned if 'get_q_gram_pos' is set to True]
+                            A dictionary which has q-grams as keys and where
+                            values are sets with the positions these q-grams
+                            are hashed to ('QGramPosArrays' if
+                            'get_q_gram_pos' is set to 'array').
+    """
+
+    if (self.get_q_gram_pos == 'array'):  # Positions of all q-grams together
+      return hash_q_gram_set_pos_arrays(self, q_gram_set, salt_str)
+
+    if (salt_str != None):  # Calculate the positions of all salted q-grams
+      return self.hash_salted_q_gram_set(q_gram_set, salt_str)  # together
+
+    bf_len = self.bf_len  # Short-cuts
+
+    get_q_gram_pos = self.get_q_gram_pos
+    if (get_q_gram_pos == True):
+      q_gram_pos_dict = {}
+
+    # Initialise the Bloom filter to have only 0-bits
+    #
+    bf = bitarray.bitarray(bf_len)
+    bf.setall(0)
+
+    # Hash the q-grams into the Bloom filter
+    #
+    for q_gram in q_gram_set:
+
+      q_gram_pos_list = self.get_q_gram_pos_list(q_gram)
+
+      for pos_i in q_gram_pos_list:
+        bf[pos_i] = 1
+
+      if (get_q_gram_pos == True):
+        q_gram_pos_dict[q_gram] = set(q_gram_pos_list)
+
+    if (get_q_gram_pos == True):
+      return bf, q_gram_pos_dict
+    else:
+      return bf
+
+  # ---------------------------------------------------------------------------
+
+  def hash_salted_q_gram_set(self, q_gram_set, salt_str):
+    """Hash the given q-gram set with each q-gram concatenated with the given
+       salting string, in the same way as 'hash_q_gram_set' but calculating
+       the positions of all salted q-grams (not in the position cache) with
+       one call of 'calc_q_gram_pos_matrix'.
+    """
+
+    q_gram_list = list(q_gram_set)
+
+    q_gram_pos_list_list = self.get_salted_q_gram_pos_lists(q_gram_list,
+                                                            salt_str)
+
+    # Initialise the Bloom filter to have only 0-bits
+    #
+    bf = bitarray.bitarray(self.bf_len)
+    bf.setall(0)
+
+    for q_gram_pos_list in q_gram_pos_list_list:
+      for pos_i in q_gram_pos_list:
+        bf[pos_i] = 1
+
+    if (self.get_q_gram_pos == True):
+      q_gram_pos_dict = {}
+
+      for (j, q_gram) in enumerate(q_gram_list):
+        q_gram_pos_dict[q_gram + salt_str] = set(q_gram_pos_list_list[j])
+
+      return bf, q_gram_pos_dict
+    else:
+      return bf
+
+  # ---------------------------------------------------------------------------
+
+  def get_salted_q_gram_pos_lists(self, q_gram_list, salt_str):
+    """Return a list with the lists of the bit positions the q-grams in the
+       given list (each concatenated with the salting string) are hashed to,
+       from the position cache if one is used.
+    """
+
+    if (self.pos_cache != None):
+      if (self.pos_cache_bf_len != self.bf_len):  # Bloom filter length was
+        self.pos_cache.evict()                    # changed after caching
+        self.pos_cache_bf_len = self.bf_len
+
+      return self.pos_cache.get_pos_tuple_list(q_gram_list,
+                                               self.calc_q_gram_pos_matrix,
+                                               salt_str)
+
+    return self.calc_q_gram_pos_matrix(q_gram_list, salt_str).tolist()
+
+  # ---------------------------------------------------------------------------
+
+  def get_q_gram_pos_list(self, q_gram):
+    """Return the list of the bit positions the given q-gram (which is
+       already salted if required) is hashed to, from the position cache if
+       one is used (in which case a shared tuple is returned).
+    """
+
+    if (self.pos_cache != None):
+      if (self.pos_cache_bf_len != self.bf_len):  # Bloom filter length was
+        self.pos_cache.evict()                    # changed after caching
+        self.pos_cache_bf_len = self.bf_len
+
+      return self.pos_cache.get_pos_tuple(q_gram)
+
+    return self.calc_q_gram_pos_list(q_gram)
+
+  # ---------------------------------------------------------------------------
+
+  def calc_q_gram_pos_list(self, q_gram):
+    """Calculate the list of the bit positions the given q-gram (which is
+       already salted if required) is hashed to.
+    """
+
+    bf_len = self.bf_len  # Short-cuts
+    k =      self.num_hash_funct
+
+    if (self.split_digest != None):
+      int1, int2 = self.split_digest.get_int_list(q_gram)
+
+    else:
+      hex_str1 = self.hash_funct1(q_gram).hexdigest()
+      int1 =     int(hex_str1, 16)
+
+      hex_str2 = self.hash_funct2(q_gram).hexdigest()
+      int2 =     int(hex_str2, 16)
+
+    q_gram_pos_list = []
+
+    for i in range(1, k+1):
+      pos_i = int1 + i*int2 + int((float(i*i*i) - i) / 6.0)
+      q_gram_pos_list.append(int(pos_i % bf_len))
+
+    return q_gram_pos_list
+
+  # ---------------------------------------------------------------------------
+
+  def get_salted_int_list(self, q_gram, salt_str):
+    """Return the list of the hash values (integers) of the given q-gram
+       concatenated with the salting string, reusing the hash objects of the
+       q-gram if they are kept.
+    """
+
+    if (self.salt_prefixes != None):
+      hex_str_list = self.salt_prefixes.get_hex_digest_list(q_gram, salt_str)
+    else:
+      hex_str_list = [hash_obj_funct(q_gram + salt_str).hexdigest() for
+                      hash_obj_funct in self.hash_obj_funct_list]
+
+    if (self.split_digest != None):
+      return self.split_digest.split_hex_digest(hex_str_list[0])
+
+    return [int(hex_str, 16) for hex_str in hex_str_list]
+
+  # ---------------------------------------------------------------------------
+
+  def calc_q_gram_pos_matrix(self, q_gram_list, salt_str=None):
+    """Calculate the bit positions of all q-grams in the given list (each
+       concatenated with the salting string if one is given) with NumPy
+       arithmetic (see the function 'calc_pos_matrix'), and return them as a
+       matrix with one row of positions per q-gram, equal to the lists
+       returned by 'calc_q_gram_pos_list'.
+    """
+
+    bf_len = self.bf_len  # Short-cuts
+    k =      self.num_hash_funct
+
+    i_array = numpy.array([i % bf_len for i in range(1, k+1)],
+                          dtype=numpy.uint64)
+
+    # The cubic term is calculated in exactly the same way (including its
+    # conversion to a float) as in 'calc_q_gram_pos_list'
+    #
+    add_array = numpy.array([int((float(i*i*i) - i) / 6.0) % bf_len
+                             for i in range(1, k+1)], dtype=numpy.uint64)
+
+    if (salt_str != None):
+      int1_array, int2_array = \
+                 calc_int_array_list([self.get_salted_int_list(q_gram,
+                                                               salt_str)
+                                      for q_gram in q_gram_list], 2, bf_len)
+    elif (self.split_digest != None):
+      int1_array, int2_array = \
+                 self.split_digest.get_int_array_list(q_gram_list, bf_len)
+    else:
+      int1_array = calc_hash_val_array(self.hash_funct1, q_gram_list, bf_len)
+      int2_array = calc_hash_val_array(self.hash_funct2, q_gram_list, bf_len)
+
+    return calc_pos_matrix(bf_len, int1_array, int2_array, i_array, add_array)
+
+  # ---------------------------------------------------------------------------
+
+  def hash_q_gram_set_list(self, q_gram_set_list, salt_str_list=None):
+    """Hash each of the given q-gram sets into a Bloom filter in one call,
+       and return the Bloom filters as a matrix of packed bits (see the
+       function 'gen_packed_bf_matrix').
+
+       Input arguments:
+         - q_gram_set_list  A list of sets of q-grams (strings) to be hashed.
+         - salt_str_list    An optional list with one salting string (or
+                            None) for each q-gram set.
+
+       Output:
+         - bf_matrix  A NumPy uint8 array with one row of packed bits per
+                      q-gram set, with bits set according to the enhanced
+                      double hashing parameters.
+    """
+
+    # If hash objects of q-grams are kept then the q-grams of all Bloom
+    # filters with the same salting string are hashed together
+    #
+    return gen_packed_bf_matrix_vect(self.calc_q_gram_pos_matrix,
+                                     q_gram_set_list, self.bf_len,
+                                     salt_str_list,
+                                     self.salt_prefixes != None)
+
+  # ---------------------------------------------------------------------------
+
+  def warm_pos_cache(self, q_gram_iter, salt_str=None):
+    """Add the bit positions of all q-grams in the given iterable (a
+       vocabulary of q-grams, salted with the optional salting string) to the
+       position cache.
+    """
+
+    assert self.pos_cache != None
+
+    if (salt_str != None):
+      q_gram_iter = (q_gram + salt_str for q_gram in q_gram_iter)
+
+    self.pos_cache.warm(q_gram_iter)
+
+# =============================================================================
+
+class TripleHashing():
+  """Triple-hashing for Bloom filters was proposed and used by:
+       - P.C. Dillinger and P. Manolios, Bloom filters in probabilistic
+         verification, International Conference on Formal Methods in
+         Computer-Aided Design, 2004, pp. 367-381.
+       - P.C. Dillinger and P. Manolios, Fast and accurate bitstate
+         verification for spin, International SPIN Workshop on Model
+         Checking of Software, 2004, pp. 57-75.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, hash_funct1, hash_funct2, hash_funct3, bf_len,
+               num_hash_funct, get_q_gram_pos=False, pos_cache_size=0,
+               split_digest=None,
+               salt_prefix_size=0):
+    """Initialise the triple-hashing class by providing the required
        parameters.
 
        Input arguments:
-         - hash_funct1, hash_funct2  Two hash functions.
-         - bf_len                    The length in bits of the Bloom filters
-                                     to be generated.
-         - num_hash_funct            The number of hash functions to be used.
-         - get_q_gram_pos            A flag, if set to True then the bit
-                                     positions of where q-grams are hash into
-                                     are returned in a dictionary.
+         - hash_funct1, hash_funct2, hash_funct3  Three hash functions.
+         - bf_len                                 The length in bits of the
+                                                  Bloom filters to be
+                                                  generated.
+         - num_hash_funct                         The number of hash functions
+                                                  to be used.
+         - get_q_gram_pos                         A flag, if set to True then
+                                                  the bit positions of where
+                                                  q-grams are hash into are
+                                                  returned in a dictionary,
+                                                  if set to 'array' they are
+                                                  returned as
+                                                  'QGramPosArrays'.
+         - pos_cache_size                         The maximum number of
+                                                  q-grams whose bit positions
+                                                  are kept in a cache (0 for
+                                                  no caching).
+         - split_digest                           An optional 'SplitDigest'
+                                                  object giving the three
+                                                  integers of a q-gram from
+                                                  one digest, in which case
+                                                  the three hash functions
+                                                  are not used (and can be
+                                                  None).
+         - salt_prefix_size                       The maximum number of
+                                                  q-grams whose hash objects
+                                                  are kept to calculate the
+                                                  digests of salted q-grams
+                                                  (0 for not keeping hash
+                                                  objects).
 
        Output:
          - This method does not return anything.
@@ -70,6 +1612,23 @@ class DoubleHashing():
     #
     self.hash_funct1 = hash_funct1
     self.hash_funct2 = hash_funct2
+    self.hash_funct3 = hash_funct3
+
+    if (split_digest != None):
+      assert split_digest.num_int == 3, split_digest.num_int
+    self.split_digest = split_digest
+
+    if (split_digest != None):
+      self.hash_obj_funct_list = [split_digest.new_hash_obj]
+    else:
+      self.hash_obj_funct_list = [hash_funct1, hash_funct2, hash_funct3]
+
+    assert salt_prefix_size >= 0, salt_prefix_size
+    if (salt_prefix_size > 0):
+      self.salt_prefixes = QGramHashPrefixes(self.hash_obj_funct_list,
+                                             salt_prefix_size)
+    else:
+      self.salt_prefixes = None
 
     assert bf_len > 1, bf_len
     self.bf_len = bf_len
@@ -77,9 +1636,17 @@ class DoubleHashing():
     assert num_hash_funct > 0
     self.num_hash_funct = num_hash_funct
 
-    assert get_q_gram_pos in [True, False]
+    assert get_q_gram_pos in [True, False, 'array']
     self.get_q_gram_pos = get_q_gram_pos
 
+    assert pos_cache_size >= 0, pos_cache_size
+    if (pos_cache_size > 0):
+      self.pos_cache = QGramPosCache(self.calc_q_gram_pos_list,
+                                     pos_cache_size)
+      self.pos_cache_bf_len = bf_len  # Length the cached positions are for
+    else:
+      self.pos_cache = None
+
   # ---------------------------------------------------------------------------
 
   def hash_q_gram_set(self, q_gram_set, salt_str=None):
@@ -96,15 +1663,21 @@ class DoubleHashing():
 
        Output:
          - bf               A Bloom filter with bits set according to the input
-                            q-gram set and double hashing parameters.
+                            q-gram set and triple hashing parameters.
          - q_gram_pos_dict  [Only returned if 'get_q_gram_pos' is set to True]
                             A dictionary which has q-grams as keys and where
                             values are sets with the positions these q-grams
-                            are hashed to.
+                            are hashed to ('QGramPosArrays' if
+                            'get_q_gram_pos' is set to 'array').
     """
 
+    if (self.get_q_gram_pos == 'array'):  # Positions of all q-grams together
+      return hash_q_gram_set_pos_arrays(self, q_gram_set, salt_str)
+
+    if (salt_str != None):  # Calculate the positions of all salted q-grams
+      return self.hash_salted_q_gram_set(q_gram_set, salt_str)  # together
+
     bf_len = self.bf_len  # Short-cuts
-    k =      self.num_hash_funct
 
     get_q_gram_pos = self.get_q_gram_pos
     if (get_q_gram_pos == True):
@@ -119,61 +1692,249 @@ class DoubleHashing():
     #
     for q_gram in q_gram_set:
 
+      q_gram_pos_list = self.get_q_gram_pos_list(q_gram)
+
+      for pos_i in q_gram_pos_list:
+        bf[pos_i] = 1
+
       if (get_q_gram_pos == True):
-        q_gram_pos_set = set()
+        q_gram_pos_dict[q_gram] = set(q_gram_pos_list)
 
-      if (salt_str != None):  # If a salt is given concatenate with q-gram
-        q_gram = q_gram + salt_str
+    if (get_q_gram_pos == True):
+      return bf, q_gram_pos_dict
+    else:
+      return bf
+
+  # ---------------------------------------------------------------------------
+
+  def hash_salted_q_gram_set(self, q_gram_set, salt_str):
+    """Hash the given q-gram set with each q-gram concatenated with the given
+       salting string, in the same way as 'hash_q_gram_set' but calculating
+       the positions of all salted q-grams (not in the position cache) with
+       one call of 'calc_q_gram_pos_matrix'.
+    """
+
+    q_gram_list = list(q_gram_set)
+
+    q_gram_pos_list_list = self.get_salted_q_gram_pos_lists(q_gram_list,
+                                                            salt_str)
+
+    # Initialise the Bloom filter to have only 0-bits
+    #
+    bf = bitarray.bitarray(self.bf_len)
+    bf.setall(0)
+
+    for q_gram_pos_list in q_gram_pos_list_list:
+      for pos_i in q_gram_pos_list:
+        bf[pos_i] = 1
+
+    if (self.get_q_gram_pos == True):
+      q_gram_pos_dict = {}
+
+      for (j, q_gram) in enumerate(q_gram_list):
+        q_gram_pos_dict[q_gram + salt_str] = set(q_gram_pos_list_list[j])
+
+      return bf, q_gram_pos_dict
+    else:
+      return bf
+
+  # ---------------------------------------------------------------------------
+
+  def get_salted_q_gram_pos_lists(self, q_gram_list, salt_str):
+    """Return a list with the lists of the bit positions the q-grams in the
+       given list (each concatenated with the salting string) are hashed to,
+       from the position cache if one is used.
+    """
+
+    if (self.pos_cache != None):
+      if (self.pos_cache_bf_len != self.bf_len):  # Bloom filter length was
+        self.pos_cache.evict()                    # changed after caching
+        self.pos_cache_bf_len = self.bf_len
+
+      return self.pos_cache.get_pos_tuple_list(q_gram_list,
+                                               self.calc_q_gram_pos_matrix,
+                                               salt_str)
+
+    return self.calc_q_gram_pos_matrix(q_gram_list, salt_str).tolist()
+
+  # ---------------------------------------------------------------------------
+
+  def get_q_gram_pos_list(self, q_gram):
+    """Return the list of the bit positions the given q-gram (which is
+       already salted if required) is hashed to, from the position cache if
+       one is used (in which case a shared tuple is returned).
+    """
+
+    if (self.pos_cache != None):
+      if (self.pos_cache_bf_len != self.bf_len):  # Bloom filter length was
+        self.pos_cache.evict()                    # changed after caching
+        self.pos_cache_bf_len = self.bf_len
+
+      return self.pos_cache.get_pos_tuple(q_gram)
+
+    return self.calc_q_gram_pos_list(q_gram)
+
+  # ---------------------------------------------------------------------------
+
+  def calc_q_gram_pos_list(self, q_gram):
+    """Calculate the list of the bit positions the given q-gram (which is
+       already salted if required) is hashed to.
+    """
+
+    bf_len = self.bf_len  # Short-cuts
+    k =      self.num_hash_funct
+
+    if (self.split_digest != None):
+      int1, int2, int3 = self.split_digest.get_int_list(q_gram)
 
+    else:
       hex_str1 = self.hash_funct1(q_gram).hexdigest()
       int1 =     int(hex_str1, 16)
 
       hex_str2 = self.hash_funct2(q_gram).hexdigest()
       int2 =     int(hex_str2, 16)
 
-      for i in range(1, k+1):
-        pos_i = int1 + i*int2
-        pos_i = int(pos_i % bf_len)
-        bf[pos_i] = 1
+      hex_str3 = self.hash_funct3(q_gram).hexdigest()
+      int3 =     int(hex_str3, 16)
 
-        if (get_q_gram_pos == True):
-          q_gram_pos_set.add(pos_i)
+    q_gram_pos_list = []
 
-      if (get_q_gram_pos == True):
-        q_gram_pos_dict[q_gram] = q_gram_pos_set
+    for i in range(1, k+1):
+      pos_i = int1 + i*int2 + int(float(i*(i-1)/2.0))*int3
+      q_gram_pos_list.append(int(pos_i % bf_len))
 
-    if (get_q_gram_pos == True):
-      return bf, q_gram_pos_dict
+    return q_gram_pos_list
+
+  # ---------------------------------------------------------------------------
+
+  def get_salted_int_list(self, q_gram, salt_str):
+    """Return the list of the hash values (integers) of the given q-gram
+       concatenated with the salting string, reusing the hash objects of the
+       q-gram if they are kept.
+    """
+
+    if (self.salt_prefixes != None):
+      hex_str_list = self.salt_prefixes.get_hex_digest_list(q_gram, salt_str)
     else:
-      return bf
+      hex_str_list = [hash_obj_funct(q_gram + salt_str).hexdigest() for
+                      hash_obj_funct in self.hash_obj_funct_list]
+
+    if (self.split_digest != None):
+      return self.split_digest.split_hex_digest(hex_str_list[0])
+
+    return [int(hex_str, 16) for hex_str in hex_str_list]
+
+  # ---------------------------------------------------------------------------
+
+  def calc_q_gram_pos_matrix(self, q_gram_list, salt_str=None):
+    """Calculate the bit positions of all q-grams in the given list (each
+       concatenated with the salting string if one is given) with NumPy
+       arithmetic (see the function 'calc_pos_matrix'), and return them as a
+       matrix with one row of positions per q-gram, equal to the lists
+       returned by 'calc_q_gram_pos_list'.
+    """
+
+    bf_len = self.bf_len  # Short-cuts
+    k =      self.num_hash_funct
+
+    i_array = numpy.array([i % bf_len for i in range(1, k+1)],
+                          dtype=numpy.uint64)
+
+    # The factors of the third hash value are calculated in exactly the same
+    # way (including their conversion to a float) as in
+    # 'calc_q_gram_pos_list'
+    #
+    mult3_array = numpy.array([int(float(i*(i-1)/2.0)) % bf_len
+                               for i in range(1, k+1)], dtype=numpy.uint64)
+
+    if (salt_str != None):
+      int1_array, int2_array, int3_array = \
+                 calc_int_array_list([self.get_salted_int_list(q_gram,
+                                                               salt_str)
+                                      for q_gram in q_gram_list], 3, bf_len)
+    elif (self.split_digest != None):
+      int1_array, int2_array, int3_array = \
+                 self.split_digest.get_int_array_list(q_gram_list, bf_len)
+    else:
+      int1_array = calc_hash_val_array(self.hash_funct1, q_gram_list, bf_len)
+      int2_array = calc_hash_val_array(self.hash_funct2, q_gram_list, bf_len)
+      int3_array = calc_hash_val_array(self.hash_funct3, q_gram_list, bf_len)
+
+    return calc_pos_matrix(bf_len, int1_array, int2_array, i_array, None,
+                           int3_array, mult3_array)
+
+  # ---------------------------------------------------------------------------
+
+  def hash_q_gram_set_list(self, q_gram_set_list, salt_str_list=None):
+    """Hash each of the given q-gram sets into a Bloom filter in one call,
+       and return the Bloom filters as a matrix of packed bits (see the
+       function 'gen_packed_bf_matrix').
+
+       Input arguments:
+         - q_gram_set_list  A list of sets of q-grams (strings) to be hashed.
+         - salt_str_list    An optional list with one salting string (or
+                            None) for each q-gram set.
+
+       Output:
+         - bf_matrix  A NumPy uint8 array with one row of packed bits per
+                      q-gram set, with bits set according to the triple
+                      hashing parameters.
+    """
+
+    # If hash objects of q-grams are kept then the q-grams of all Bloom
+    # filters with the same salting string are hashed together
+    #
+    return gen_packed_bf_matrix_vect(self.calc_q_gram_pos_matrix,
+                                     q_gram_set_list, self.bf_len,
+                                     salt_str_list,
+                                     self.salt_prefixes != None)
+
+  # ---------------------------------------------------------------------------
+
+  def warm_pos_cache(self, q_gram_iter, salt_str=None):
+    """Add the bit positions of all q-grams in the given iterable (a
+       vocabulary of q-grams, salted with the optional salting string) to the
+       position cache.
+    """
+
+    assert self.pos_cache != None
+
+    if (salt_str != None):
+      q_gram_iter = (q_gram + salt_str for q_gram in q_gram_iter)
+
+    self.pos_cache.warm(q_gram_iter)
 
 # =============================================================================
 
-class EnhancedDoubleHashing():
-  """Enhanced Double-hashing for Bloom filters was proposed and used by:
-       - P.C. Dillinger and P. Manolios, Bloom filters in probabilistic
-         verification, International Conference on Formal Methods in
-         Computer-Aided Design, 2004, pp. 367-381.
-       - P.C. Dillinger and P. Manolios, Fast and accurate bitstate
-         verification for SPIN, International SPIN Workshop on Model
-         Checking of Software, 2004, pp. 57-75.
+class RandomHashing():
+  """Random-hashing for Bloom filters was proposed and used by:
+       - R. Schnell and C. Borgs, Randomized response and balanced Bloom
+         filters for privacy preserving record linkage, Workshop on Data
+         Integration and Applications, held at ICDM, Barcelona, 2016.
   """
 
-  # ----------------------------------------------------------------------------
+  # ---------------------------------------------------------------------------
 
-  def __init__(self, hash_funct1, hash_funct2, bf_len, num_hash_funct,
-               get_q_gram_pos=False):
-    """Initialise the enhanced double-hashing class by providing the required
+  def __init__(self, hash_funct, bf_len, num_hash_funct,
+               get_q_gram_pos=False, pos_cache_size=0):
+    """Initialise the random-hashing class by providing the required
        parameters.
 
        Input arguments:
-         - hash_funct1, hash_funct2  Two hash functions.
-         - bf_len                    The length in bits of the Bloom filters
-                                     to be generated.
-         - num_hash_funct            The number of hash functions to be used.
-         - get_q_gram_pos            A flag, if set to True then the bit
-                                     positions of where q-grams are hash into
-                                     are returned in a dictionary.
+         - hash_funct      The hash function to be used to encode q-grams.
+         - bf_len          The length in bits of the Bloom filters to be
+                           generated.
+         - num_hash_funct  The number of hash functions to be used.
+         - get_q_gram_pos  A flag, if set to True then the bit positions of
+                           where q-grams are hash into are returned in a
+                           dictionary, if set to 'array' they are returned as
+                           'QGramPosArrays'.
+         - pos_cache_size  The maximum number of q-grams whose bit positions
+                           are kept in a cache (0 for no caching). If
+                           positive then positions are calculated with a
+                           random number generator owned by this class, so
+                           the state of the global generator of the 'random'
+                           module is not changed.
 
        Output:
          - This method does not return anything.
@@ -181,8 +1942,7 @@ class EnhancedDoubleHashing():
 
     # Initialise the class variables
     #
-    self.hash_funct1 = hash_funct1
-    self.hash_funct2 = hash_funct2
+    self.hash_funct = hash_funct
 
     assert bf_len > 1, bf_len
     self.bf_len = bf_len
@@ -190,9 +1950,19 @@ class EnhancedDoubleHashing():
     assert num_hash_funct > 0
     self.num_hash_funct = num_hash_funct
 
-    assert get_q_gram_pos in [True, False]
+    assert get_q_gram_pos in [True, False, 'array']
     self.get_q_gram_pos = get_q_gram_pos
 
+    assert pos_cache_size >= 0, pos_cache_size
+    if (pos_cache_size > 0):
+      self.rand_gen = random.Random()  # Seeded for each q-gram
+
+      self.pos_cache = QGramPosCache(self.calc_q_gram_pos_list,
+                                     pos_cache_size)
+      self.pos_cache_bf_len = bf_len  # Length the cached positions are for
+    else:
+      self.pos_cache = None
+
   # ---------------------------------------------------------------------------
 
   def hash_q_gram_set(self, q_gram_set, salt_str=None):
@@ -209,15 +1979,18 @@ class EnhancedDoubleHashing():
 
        Output:
          - bf               A Bloom filter with bits set according to the input
-                            q-gram set and enhanced double hashing parameters.
+                            q-gram set and random hashing parameters.
          - q_gram_pos_dict  [Only returned if 'get_q_gram_pos' is set to True]
                             A dictionary which has q-grams as keys and where
                             values are sets with the positions these q-grams
-                            are hashed to.
+                            are hashed to ('QGramPosArrays' if
+                            'get_q_gram_pos' is set to 'array').
     """
 
+    if (self.get_q_gram_pos == 'array'):  # Positions of all q-grams together
+      return hash_q_gram_set_pos_arrays(self, q_gram_set, salt_str)
+
     bf_len = self.bf_len  # Short-cuts
-    k =      self.num_hash_funct
 
     get_q_gram_pos = self.get_q_gram_pos
     if (get_q_gram_pos == True):
@@ -232,64 +2005,144 @@ class EnhancedDoubleHashing():
     #
     for q_gram in q_gram_set:
 
-      if (get_q_gram_pos == True):
-        q_gram_pos_set = set()
-
       if (salt_str != None):  # If a salt is given concatenate with q-gram
         q_gram = q_gram + salt_str
 
-      hex_str1 = self.hash_funct1(q_gram).hexdigest()
-      int1 =     int(hex_str1, 16)
-
-      hex_str2 = self.hash_funct2(q_gram).hexdigest()
-      int2 =     int(hex_str2, 16)
+      q_gram_pos_list = self.get_q_gram_pos_list(q_gram)
 
-      for i in range(1, k+1):
-        pos_i = int1 + i*int2 + int((float(i*i*i) - i) / 6.0)
-        pos_i = int(pos_i % bf_len)
+      for pos_i in q_gram_pos_list:
         bf[pos_i] = 1
 
-        if (get_q_gram_pos == True):
-          q_gram_pos_set.add(pos_i)
-
       if (get_q_gram_pos == True):
-        q_gram_pos_dict[q_gram] = q_gram_pos_set
+        q_gram_pos_dict[q_gram] = set(q_gram_pos_list)
 
     if (get_q_gram_pos == True):
       return bf, q_gram_pos_dict
     else:
       return bf
 
+  # ---------------------------------------------------------------------------
+
+  def get_q_gram_pos_list(self, q_gram):
+    """Return the list of the bit positions the given q-gram (which is
+       already salted if required) is hashed to, from the position cache if
+       one is used (in which case a shared tuple is returned).
+
+       Without a cache the global random number generator is seeded with
+       the q-gram, as done originally (other code might depend on the state
+       this leaves the global generator in).
+    """
+
+    if (self.pos_cache != None):
+      if (self.pos_cache_bf_len != self.bf_len):  # Bloom filter length was
+        self.pos_cache.evict()                    # changed after caching
+        self.pos_cache_bf_len = self.bf_len
+
+      return self.pos_cache.get_pos_tuple(q_gram)
+
+    # Bloom filter length minus 1 using for position index in Bloom filter
+    #
+    bf_len_m1 = self.bf_len - 1
+
+    # Use q-gram itself to see random number generator
+    #
+    hex_str = self.hash_funct(q_gram).hexdigest()
+    random_seed = random.seed(int(hex_str, 16))
+
+    return [random.randint(0, bf_len_m1) for i in range(self.num_hash_funct)]
+
+  # ---------------------------------------------------------------------------
+
+  def calc_q_gram_pos_list(self, q_gram):
+    """Calculate the list of the bit positions the given q-gram (which is
+       already salted if required) is hashed to, in the same way as done
+       with the global random number generator but using the generator of
+       this class.
+    """
+
+    bf_len_m1 = self.bf_len - 1  # Short-cuts
+    rand_gen =  self.rand_gen
+
+    rand_gen.seed(int(self.hash_funct(q_gram).hexdigest(), 16))
+
+    return [rand_gen.randint(0, bf_len_m1) for i in range(self.num_hash_funct)]
+
+  # ---------------------------------------------------------------------------
+
+  def hash_q_gram_set_list(self, q_gram_set_list, salt_str_list=None):
+    """Hash each of the given q-gram sets into a Bloom filter in one call,
+       and return the Bloom filters as a matrix of packed bits (see the
+       function 'gen_packed_bf_matrix').
+
+       Input arguments:
+         - q_gram_set_list  A list of sets of q-grams (strings) to be hashed.
+         - salt_str_list    An optional list with one salting string (or
+                            None) for each q-gram set.
+
+       Output:
+         - bf_matrix  A NumPy uint8 array with one row of packed bits per
+                      q-gram set, with bits set according to the random
+                      hashing parameters.
+    """
+
+    return gen_packed_bf_matrix(self.get_q_gram_pos_list, q_gram_set_list,
+                                self.bf_len, salt_str_list)
+
+  # ---------------------------------------------------------------------------
+
+  def warm_pos_cache(self, q_gram_iter, salt_str=None):
+    """Add the bit positions of all q-grams in the given iterable (a
+       vocabulary of q-grams, salted with the optional salting string) to the
+       position cache.
+    """
+
+    assert self.pos_cache != None
+
+    if (salt_str != None):
+      q_gram_iter = (q_gram + salt_str for q_gram in q_gram_iter)
+
+    self.pos_cache.warm(q_gram_iter)
+
 # =============================================================================
 
-class TripleHashing():
-  """Triple-hashing for Bloom filters was proposed and used by:
-       - P.C. Dillinger and P. Manolios, Bloom filters in probabilistic
-         verification, International Conference on Formal Methods in
-         Computer-Aided Design, 2004, pp. 367-381.
-       - P.C. Dillinger and P. Manolios, Fast and accurate bitstate
-         verification for spin, International SPIN Workshop on Model
-         Checking of Software, 2004, pp. 57-75.
+class CounterRandomHashing():
+  """A counter-based variant of random hashing, where the k bit positions of
+     a q-gram are generated by the Philox4x32-10 random number generator
+     (see the function 'philox4x32') keyed with a hash value of the q-gram,
+     rather than by seeding the Mersenne Twister generator of the 'random'
+     module with the q-gram (as done by the 'RandomHashing' class).
+
+     The counter of random word j is (j div 4, seed, 0, 0) and the key is
+     formed by the first 8 bytes of the digest of the q-gram. Each random
+     word w is mapped to the position (w * bf_len) div 2^32. Because no
+     generator state is kept, the positions of all q-grams of a vocabulary
+     are generated with a few NumPy operations, and the state of the global
+     random number generator is not changed. The Bloom filters generated are
+     not the same as those of the 'RandomHashing' class.
   """
 
   # ---------------------------------------------------------------------------
 
-  def __init__(self, hash_funct1, hash_funct2, hash_funct3, bf_len,
-               num_hash_funct, get_q_gram_pos=False):
-    """Initialise the triple-hashing class by providing the required
-       parameters.
+  def __init__(self, hash_funct, bf_len, num_hash_funct,
+               get_q_gram_pos=False, pos_cache_size=0, seed=0):
+    """Initialise the counter-based random-hashing class by providing the
+       required parameters.
 
        Input arguments:
-         - hash_funct1, hash_funct2, hash_funct3  Three hash functions.
-         - bf_len                                 The length in bits of the
-                                                  Bloom filters to be
-                                                  generated.
-         - num_hash_funct                         The number of hash functions
-                                                  to be used.
-         - get_q_gram_pos                         A flag, if set to True then
-                                                  the bit positions of where
-                                                  q-grams are hash into are
-                                                  returned in a dictionary.
+         - hash_funct      The hash function to be used to encode q-grams
+                           (its digests must be at least 8 bytes long).
+         - bf_len          The length in bits of the Bloom filters to be
+                           generated.
+         - num_hash_funct  The number of hash functions to be used.
+         - get_q_gram_pos  A flag, if set to True then the bit positions of
+                           where q-grams are hash into are returned in a
+                           dictionary, if set to 'array' they are returned as
+                           'QGramPosArrays'.
+         - pos_cache_size  The maximum number of q-grams whose bit positions
+                           are kept in a cache (0 for no caching).
+         - seed            A 32-bit integer which is part of the counters of
+                           the random number generator, different seeds give
+                           different bit positions.
 
        Output:
          - This method does not return anything.
@@ -297,19 +2150,28 @@ class TripleHashing():
 
     # Initialise the class variables
     #
-    self.hash_funct1 = hash_funct1
-    self.hash_funct2 = hash_funct2
-    self.hash_funct3 = hash_funct3
+    self.hash_funct = hash_funct
 
-    assert bf_len > 1, bf_len
+    assert bf_len > 1 and bf_len <= 2**32, bf_len
     self.bf_len = bf_len
 
     assert num_hash_funct > 0
     self.num_hash_funct = num_hash_funct
 
-    assert get_q_gram_pos in [True, False]
+    assert get_q_gram_pos in [True, False, 'array']
     self.get_q_gram_pos = get_q_gram_pos
 
+    assert seed >= 0 and seed < 2**32, seed
+    self.seed = seed
+
+    assert pos_cache_size >= 0, pos_cache_size
+    if (pos_cache_size > 0):
+      self.pos_cache = QGramPosCache(self.calc_q_gram_pos_list,
+                                     pos_cache_size)
+      self.pos_cache_bf_len = bf_len  # Length the cached positions are for
+    else:
+      self.pos_cache = None
+
   # ---------------------------------------------------------------------------
 
   def hash_q_gram_set(self, q_gram_set, salt_str=None):
@@ -326,15 +2188,18 @@ class TripleHashing():
 
        Output:
          - bf               A Bloom filter with bits set according to the input
-                            q-gram set and triple hashing parameters.
+                            q-gram set and random hashing parameters.
          - q_gram_pos_dict  [Only returned if 'get_q_gram_pos' is set to True]
                             A dictionary which has q-grams as keys and where
                             values are sets with the positions these q-grams
-                            are hashed to.
+                            are hashed to ('QGramPosArrays' if
+                            'get_q_gram_pos' is set to 'array').
     """
 
+    if (self.get_q_gram_pos == 'array'):  # Positions of all q-grams together
+      return hash_q_gram_set_pos_arrays(self, q_gram_set, salt_str)
+
     bf_len = self.bf_len  # Short-cuts
-    k =      self.num_hash_funct
 
     get_q_gram_pos = self.get_q_gram_pos
     if (get_q_gram_pos == True):
@@ -349,148 +2214,391 @@ class TripleHashing():
     #
     for q_gram in q_gram_set:
 
-      if (get_q_gram_pos == True):
-        q_gram_pos_set = set()
-
       if (salt_str != None):  # If a salt is given concatenate with q-gram
         q_gram = q_gram + salt_str
 
-      hex_str1 = self.hash_funct1(q_gram).hexdigest()
-      int1 =     int(hex_str1, 16)
-
-      hex_str2 = self.hash_funct2(q_gram).hexdigest()
-      int2 =     int(hex_str2, 16)
-
-      hex_str3 = self.hash_funct3(q_gram).hexdigest()
-      int3 =     int(hex_str3, 16)
+      q_gram_pos_list = self.get_q_gram_pos_list(q_gram)
 
-      for i in range(1, k+1):
-        pos_i = int1 + i*int2 + int(float(i*(i-1)/2.0))*int3
-        pos_i = int(pos_i % bf_len)
+      for pos_i in q_gram_pos_list:
         bf[pos_i] = 1
 
-        if (get_q_gram_pos == True):
-          q_gram_pos_set.add(pos_i)
-
       if (get_q_gram_pos == True):
-        q_gram_pos_dict[q_gram] = q_gram_pos_set
+        q_gram_pos_dict[q_gram] = set(q_gram_pos_list)
 
     if (get_q_gram_pos == True):
       return bf, q_gram_pos_dict
     else:
       return bf
 
+  # ---------------------------------------------------------------------------
+
+  def get_q_gram_pos_list(self, q_gram):
+    """Return the list of the bit positions the given q-gram (which is
+       already salted if required) is hashed to, from the position cache if
+       one is used (in which case a shared tuple is returned).
+    """
+
+    if (self.pos_cache != None):
+      if (self.pos_cache_bf_len != self.bf_len):  # Bloom filter length was
+        self.pos_cache.evict()                    # changed after caching
+        self.pos_cache_bf_len = self.bf_len
+
+      return self.pos_cache.get_pos_tuple(q_gram)
+
+    return self.calc_q_gram_pos_list(q_gram)
+
+  # ---------------------------------------------------------------------------
+
+  def calc_q_gram_pos_list(self, q_gram):
+    """Calculate the list of the bit positions the given q-gram (which is
+       already salted if required) is hashed to.
+    """
+
+    return self.calc_q_gram_pos_matrix([q_gram])[0].tolist()
+
+  # ---------------------------------------------------------------------------
+
+  def calc_q_gram_pos_matrix(self, q_gram_list):
+    """Calculate the bit positions of all (salted) q-grams in the given list
+       with one call of the function 'philox4x32', and return them as a
+       matrix with one row of positions per q-gram.
+    """
+
+    k = self.num_hash_funct  # Short-cut
+
+    num_q_gram = len(q_gram_list)
+    num_block =  (k + 3) / 4  # Each counter gives four random words
+
+    key_str = ''.join([self.hash_funct(q_gram).digest()[:8]
+                       for q_gram in q_gram_list])
+    key_matrix = numpy.frombuffer(key_str, dtype='<u4').reshape(num_q_gram,
+                                                                 2)
+    key_matrix = key_matrix.astype(numpy.uint64)
+
+    word_list = philox4x32([numpy.arange(num_block, dtype=numpy.uint64),
+                            numpy.uint64(self.seed), numpy.uint64(0),
+                            numpy.uint64(0)],
+                           [key_matrix[:,0:1], key_matrix[:,1:2]])
+
+    # Interleave the four words of each counter, and keep the first k words
+    #
+    word_matrix = numpy.dstack(word_list).reshape(num_q_gram, 4*num_block)
+
+    pos_matrix = (word_matrix[:,:k] * numpy.uint64(self.bf_len)) >> \
+                 PHILOX_SHIFT
+
+    return pos_matrix.astype(numpy.int64)
+
+  # ---------------------------------------------------------------------------
+
+  def hash_q_gram_set_list(self, q_gram_set_list, salt_str_list=None):
+    """Hash each of the given q-gram sets into a Bloom filter in one call,
+       and return the Bloom filters as a matrix of packed bits (see the
+       function 'gen_packed_bf_matrix').
+
+       Input arguments:
+         - q_gram_set_list  A list of sets of q-grams (strings) to be hashed.
+         - salt_str_list    An optional list with one salting string (or
+                            None) for each q-gram set.
+
+       Output:
+         - bf_matrix  A NumPy uint8 array with one row of packed bits per
+                      q-gram set, with bits set according to the random
+                      hashing parameters.
+    """
+
+    return gen_packed_bf_matrix_vect(self.calc_q_gram_pos_matrix,
+                                     q_gram_set_list, self.bf_len,
+                                     salt_str_list)
+
+  # ---------------------------------------------------------------------------
+
+  def warm_pos_cache(self, q_gram_iter, salt_str=None):
+    """Add the bit positions of all q-grams in the given iterable (a
+       vocabulary of q-grams, salted with the optional salting string) to the
+       position cache, calculating the positions of all q-grams not yet in
+       the cache in one call.
+    """
+
+    assert self.pos_cache != None
+
+    if (salt_str != None):
+      q_gram_iter = (q_gram + salt_str for q_gram in q_gram_iter)
+
+    if (self.pos_cache_bf_len != self.bf_len):
+      self.pos_cache.evict()
+      self.pos_cache_bf_len = self.bf_len
+
+    self.pos_cache.warm(q_gram_iter, self.calc_q_gram_pos_matrix)
+
 # =============================================================================
 
-class RandomHashing():
-  """Random-hashing for Bloom filters was proposed and used by:
-       - R. Schnell and C. Borgs, Randomized response and balanced Bloom
-         filters for privacy preserving record linkage, Workshop on Data
-         Integration and Applications, held at ICDM, Barcelona, 2016.
+class VocabPosTable():
+  """A dense table of the bit positions of a vocabulary of q-grams, which can
+     be used instead of the hashing class it is built with.
+
+     Each (salted) q-gram of the vocabulary is given an integer identifier,
+     and row i of a [vocabulary size, k] int32 array holds the k bit positions
+     the hashing class hashes the q-gram with identifier i to. Hashing a
+     q-gram set then becomes a gather of rows of this table followed by
+     setting the gathered bits, which gives the same Bloom filters as the
+     hashing class. Q-grams not in the vocabulary are added when they are
+     hashed for the first time.
+
+     This is only useful for hashing classes where the positions of a q-gram
+     do not depend on anything else, and for vocabularies of limited size
+     (for example not when each record has its own salt).
   """
 
   # ---------------------------------------------------------------------------
 
-  def __init__(self, hash_funct, bf_len, num_hash_funct,
-               get_q_gram_pos=False):
-    """Initialise the random-hashing class by providing the required
-       parameters.
+  def __init__(self, hash_class, vocab_iter=None, salt_str=None):
+    """Initialise the position table.
 
        Input arguments:
-         - hash_funct      The hash function to be used to encode q-grams.
-         - bf_len          The length in bits of the Bloom filters to be
-                           generated.
-         - num_hash_funct  The number of hash functions to be used.
-         - get_q_gram_pos  A flag, if set to True then the bit positions of
-                           where q-grams are hash into are returned in a
-                           dictionary.
+         - hash_class  The hashing class used to calculate the positions of
+                       q-grams.
+         - vocab_iter  An optional iterable of the q-grams in the vocabulary.
+         - salt_str    An optional string concatenated with each q-gram in
+                       the vocabulary.
 
        Output:
          - This method does not return anything.
     """
 
-    # Initialise the class variables
-    #
-    self.hash_funct = hash_funct
+    self.hash_class = hash_class
 
-    assert bf_len > 1, bf_len
-    self.bf_len = bf_len
+    self.bf_len =         hash_class.bf_len
+    self.num_hash_funct = hash_class.num_hash_funct
+    self.get_q_gram_pos = hash_class.get_q_gram_pos
 
-    assert num_hash_funct > 0
-    self.num_hash_funct = num_hash_funct
+    self.pos_cache = None  # Not needed, all positions are in the table
 
-    assert get_q_gram_pos in [True, False]
-    self.get_q_gram_pos = get_q_gram_pos
+    self.vocab_id_dict = {}  # Q-grams and their identifiers
+
+    self.pos_table = numpy.zeros((1024, self.num_hash_funct),
+                                 dtype=numpy.int32)
+    self.pos_table_bf_len = self.bf_len  # Length the positions are for
+
+    if (vocab_iter != None):
+      self.add_vocab(vocab_iter, salt_str)
 
   # ---------------------------------------------------------------------------
 
-  def hash_q_gram_set(self, q_gram_set, salt_str=None):
-    """Hash the given q-gram set according to the parameter using when
-       initialising the class.
+  def check_bf_len(self):
+    """If the Bloom filter length was changed since the positions in the
+       table were calculated (as done by the 'set_abf_len' method of record
+       level Bloom filter encoding) then recalculate all positions.
+    """
 
-       Input arguments:
-         - q_gram_set  The set of q-grams (strings) to be hashed into a Bloom
-                       filter.
-         - salt_str    An optional string used for salting, if provided this
-                       string will be concatenated with every q-gram in the
-                       given q-gram set. If set to None no salting will be
-                       done.
+    if (self.bf_len == self.pos_table_bf_len):
+      return
 
-       Output:
-         - bf               A Bloom filter with bits set according to the input
-                            q-gram set and random hashing parameters.
-         - q_gram_pos_dict  [Only returned if 'get_q_gram_pos' is set to True]
-                            A dictionary which has q-grams as keys and where
-                            values are sets with the positions these q-grams
-                            are hashed to.
+    self.hash_class.bf_len = self.bf_len
+    self.pos_table_bf_len =  self.bf_len
+
+    q_gram_list = self.vocab_id_dict.keys()
+    q_gram_id_list = [self.vocab_id_dict[q_gram] for q_gram in q_gram_list]
+
+    self.pos_table[q_gram_id_list] = self.calc_pos_matrix(q_gram_list)
+
+  # ---------------------------------------------------------------------------
+
+  def calc_pos_matrix(self, q_gram_list):
+    """Return a matrix with one row of bit positions for each of the given
+       (salted) q-grams, calculated with the vectorised method of the hashing
+       class if it has one.
     """
 
-    bf_len = self.bf_len  # Short-cuts
-    k =      self.num_hash_funct
+    if (hasattr(self.hash_class, 'calc_q_gram_pos_matrix')):
+      return self.hash_class.calc_q_gram_pos_matrix(q_gram_list)
 
-    get_q_gram_pos = self.get_q_gram_pos
-    if (get_q_gram_pos == True):
-      q_gram_pos_dict = {}
+    return numpy.array([self.hash_class.get_q_gram_pos_list(q_gram) for
+                        q_gram in q_gram_list],
+                       dtype=numpy.int32).reshape(len(q_gram_list),
+                                                  self.num_hash_funct)
 
-    # Initialise the Bloom filter to have only 0-bits
-    #
-    bf = bitarray.bitarray(bf_len)
-    bf.setall(0)
+  # ---------------------------------------------------------------------------
 
-    # Bloom filter length minus 1 using for position index in Bloom filter
-    #
-    bf_len_m1 = bf_len - 1
+  def add_q_gram(self, q_gram):
+    """Add the given (salted) q-gram to the vocabulary and return its
+       identifier.
+    """
 
-    # Hash the q-grams into the Bloom filter
-    #
-    for q_gram in q_gram_set:
+    self.check_bf_len()
 
-      if (get_q_gram_pos == True):
-        q_gram_pos_set = set()
+    q_gram_id = self.vocab_id_dict.get(q_gram)
 
-      if (salt_str != None):  # If a salt is given concatenate with q-gram
+    if (q_gram_id == None):
+      q_gram_id = len(self.vocab_id_dict)
+
+      if (q_gram_id == len(self.pos_table)):  # Double the size of the table
+        self.pos_table = numpy.concatenate([self.pos_table,
+                                            numpy.zeros_like(self.pos_table)])
+
+      self.pos_table[q_gram_id] = self.hash_class.get_q_gram_pos_list(q_gram)
+      self.vocab_id_dict[q_gram] = q_gram_id
+
+    return q_gram_id
+
+  # ---------------------------------------------------------------------------
+
+  def add_vocab(self, q_gram_iter, salt_str=None):
+    """Add all q-grams in the given iterable (concatenated with the optional
+       salting string) to the vocabulary.
+    """
+
+    self.check_bf_len()
+
+    vocab_id_dict = self.vocab_id_dict  # Short-cut
+
+    new_q_gram_list = []  # Q-grams not in the vocabulary yet
+
+    for q_gram in q_gram_iter:
+      if (salt_str != None):
         q_gram = q_gram + salt_str
 
-      # Use q-gram itself to see random number generator
-      #
-      hex_str = self.hash_funct(q_gram).hexdigest()
-      random_seed = random.seed(int(hex_str, 16))
+      if (q_gram not in vocab_id_dict):
+        vocab_id_dict[q_gram] = len(vocab_id_dict)
+        new_q_gram_list.append(q_gram)
 
-      for i in range(k):
-        pos_i = random.randint(0, bf_len_m1)
-        bf[pos_i] = 1
+    if (len(new_q_gram_list) == 0):
+      return
 
-        if (get_q_gram_pos == True):
-          q_gram_pos_set.add(pos_i)
+    new_vocab_size = len(vocab_id_dict)
 
-      if (get_q_gram_pos == True):
-        q_gram_pos_dict[q_gram] = q_gram_pos_set
+    if (new_vocab_size > len(self.pos_table)):  # Enlarge the table
+      new_pos_table = numpy.zeros((max(new_vocab_size, 2*len(self.pos_table)),
+                                   self.num_hash_funct), dtype=numpy.int32)
+      new_pos_table[:len(self.pos_table)] = self.pos_table
+      self.pos_table = new_pos_table
+
+    self.pos_table[new_vocab_size-len(new_q_gram_list):new_vocab_size] = \
+                                         self.calc_pos_matrix(new_q_gram_list)
+
+  # ---------------------------------------------------------------------------
+
+  def get_vocab_size(self):
+    """Return the number of q-grams in the vocabulary.
+    """
+
+    return len(self.vocab_id_dict)
+
+  # ---------------------------------------------------------------------------
+
+  def get_q_gram_id_array(self, q_gram_set, salt_str=None):
+    """Return a NumPy array with the identifiers of the q-grams in the given
+       set (concatenated with the optional salting string).
+    """
+
+    self.check_bf_len()
+
+    vocab_id_dict = self.vocab_id_dict  # Short-cut
+
+    q_gram_id_list = []
+
+    for q_gram in q_gram_set:
+      if (salt_str != None):
+        q_gram = q_gram + salt_str
+
+      q_gram_id = vocab_id_dict.get(q_gram)
+      if (q_gram_id == None):
+        q_gram_id = self.add_q_gram(q_gram)
+
+      q_gram_id_list.append(q_gram_id)
+
+    return numpy.array(q_gram_id_list, dtype=numpy.intp)
+
+  # ---------------------------------------------------------------------------
+
+  def get_pos_array(self, q_gram_set, salt_str=None):
+    """Return a NumPy array with the bit positions of all q-grams in the given
+       set (a position occurs several times if several q-grams are hashed to
+       it).
+    """
+
+    return self.pos_table[self.get_q_gram_id_array(q_gram_set,
+                                                   salt_str)].ravel()
+
+  # ---------------------------------------------------------------------------
+
+  def get_q_gram_pos_list(self, q_gram):
+    """Return the list of the bit positions the given (salted) q-gram is
+       hashed to.
+    """
+
+    return self.pos_table[self.add_q_gram(q_gram)].tolist()
+
+  # ---------------------------------------------------------------------------
+
+  def hash_q_gram_set(self, q_gram_set, salt_str=None):
+    """Hash the given q-gram set in the same way as the 'hash_q_gram_set'
+       method of the hashing class the table was built with.
+    """
+
+    if (self.get_q_gram_pos == 'array'):  # Rows of the table of all q-grams
+      if (salt_str != None):
+        q_gram_list = [q_gram + salt_str for q_gram in q_gram_set]
+      else:
+        q_gram_list = list(q_gram_set)
+
+      pos_matrix = self.pos_table[self.get_q_gram_id_array(q_gram_list)]
+
+      return pos_array_to_bf(pos_matrix.ravel(), self.bf_len), \
+             gen_q_gram_pos_arrays(q_gram_list, pos_matrix)
+
+    bf = pos_array_to_bf(self.get_pos_array(q_gram_set, salt_str),
+                         self.bf_len)
+
+    if (self.get_q_gram_pos == True):
+      q_gram_pos_dict = {}
+
+      for q_gram in q_gram_set:
+        if (salt_str != None):
+          q_gram = q_gram + salt_str
+        q_gram_pos_dict[q_gram] = set(self.get_q_gram_pos_list(q_gram))
 
-    if (get_q_gram_pos == True):
       return bf, q_gram_pos_dict
+
     else:
       return bf
 
+  # ---------------------------------------------------------------------------
+
+  def hash_q_gram_set_list(self, q_gram_set_list, salt_str_list=None):
+    """Hash each of the given q-gram sets into a Bloom filter, and return the
+       Bloom filters as a matrix of packed bits (see the function
+       'gen_packed_bf_matrix'), by setting all gathered positions at once.
+    """
+
+    k = self.num_hash_funct
+
+    q_gram_id_array_list = []
+    row_num_array_list =   []
+
+    for (row_num, q_gram_set) in enumerate(q_gram_set_list):
+
+      if (salt_str_list != None):
+        salt_str = salt_str_list[row_num]
+      else:
+        salt_str = None
+
+      q_gram_id_array = self.get_q_gram_id_array(q_gram_set, salt_str)
+
+      q_gram_id_array_list.append(q_gram_id_array)
+      row_num_array_list.append(numpy.repeat(row_num,
+                                             len(q_gram_id_array)*k))
+
+    bit_matrix = numpy.zeros((len(q_gram_set_list), self.bf_len),
+                             dtype=numpy.bool_)
+
+    if (len(q_gram_id_array_list) > 0):
+      pos_array = self.pos_table[numpy.concatenate(q_gram_id_array_list)]
+      bit_matrix[numpy.concatenate(row_num_array_list),
+                 pos_array.ravel()] = True
+
+    return numpy.packbits(bit_matrix, axis=1)
+
 # =============================================================================
 # Some testing code if called from the command line
 
@@ -680,5 +2788,488 @@ if (__name__ == '__main__'):
   print 'OK'
   print
 
+  print '  Testing batch hashing into packed Bloom filter matrices...',  # - - -
+
+  test_q_gram_set_list = [test_q_gram_set, set(['pe','et','te','er']), set(),
+                          set(['an','nn','na'])]
+  test_salt_str_list = ['salt1', None, 'salt3', 'salt4']
+
+  for HM in [DH, EDH, TH, RH]:
+    for salt_str_list in [None, test_salt_str_list]:
+      bf_matrix = HM.hash_q_gram_set_list(test_q_gram_set_list, salt_str_list)
+
+      assert bf_matrix.dtype == numpy.uint8
+      assert bf_matrix.shape == (len(test_q_gram_set_list), (bf_len+7)/8)
+
+      for (i, q_gram_set) in enumerate(test_q_gram_set_list):
+        if (salt_str_list != None):
+          salt_str = salt_str_list[i]
+        else:
+          salt_str = None
+        assert packed_row_to_bf(bf_matrix[i], bf_len) == \
+               HM.hash_q_gram_set(q_gram_set, salt_str)
+
+  # Bloom filter lengths that are not a multiple of 8
+  #
+  DH3 = DoubleHashing(bf_hash_funct1, bf_hash_funct2, 13, 3)
+  bf_matrix = DH3.hash_q_gram_set_list(test_q_gram_set_list)
+  assert bf_matrix.shape == (len(test_q_gram_set_list), 2)
+  for (i, q_gram_set) in enumerate(test_q_gram_set_list):
+    assert packed_row_to_bf(bf_matrix[i], 13) == \
+           DH3.hash_q_gram_set(q_gram_set)
+
+  assert DH.hash_q_gram_set_list([]).shape == (0, (bf_len+7)/8)
+
+  print 'OK'
+  print
+
+  print '  Testing q-gram position caches...',  # - - - - - - - - - - - - - - -
+
+  DHc = DoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k, False, 4)
+  EDHc = EnhancedDoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k,
+                               False, 4)
+  THc = TripleHashing(bf_hash_funct1, bf_hash_funct2, bf_hash_funct3, bf_len,
+                      k, False, 4)
+
+  for (HM, HMc) in [(DH, DHc), (EDH, EDHc), (TH, THc)]:
+    for salt_str in [None, 'test salt str']:
+      assert HMc.hash_q_gram_set(test_q_gram_set, salt_str) == \
+             HM.hash_q_gram_set(test_q_gram_set, salt_str)
+      assert HMc.hash_q_gram_set(test_q_gram_set, salt_str) == \
+             HM.hash_q_gram_set(test_q_gram_set, salt_str)
+    assert (HMc.hash_q_gram_set_list(test_q_gram_set_list) ==
+            HM.hash_q_gram_set_list(test_q_gram_set_list)).all()
+
+    num_hit, num_miss, num_q_gram = HMc.pos_cache.get_stats()
+    assert num_q_gram == 4
+    assert num_hit + num_miss == 4*len(test_q_gram_set)
+
+  # Least recently used q-grams are removed, and warming only calculates
+  # positions of q-grams not in the cache
+  #
+  DHc = DoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k, False, 3)
+  DHc.warm_pos_cache(['he', 'el', 'll'])
+  assert DHc.pos_cache.get_stats() == (0, 3, 3)
+  DHc.get_q_gram_pos_list('he')  # Now 'el' is the least recently used
+  DHc.get_q_gram_pos_list('lo')
+  assert 'el' not in DHc.pos_cache.cache_dict
+  assert DHc.pos_cache.get_stats() == (1, 4, 3)
+  assert list(DHc.get_q_gram_pos_list('lo')) == DH.get_q_gram_pos_list('lo')
+  DHc.warm_pos_cache(['l', 'o'], 'o')  # 'lo' and 'oo', one hit and one miss
+  assert DHc.pos_cache.get_stats() == (3, 5, 3)
+  assert DHc.pos_cache.evict() == 3
+  assert DHc.pos_cache.get_stats() == (3, 5, 0)
+
+  print 'OK'
+  print
+
+  print '  Testing vocabulary position tables...',  # - - - - - - - - - - - - -
+
+  for HM in [DH, EDH, TH, DH3, DH2]:
+    VT = VocabPosTable(HM, ['he', 'el', 'pe'])
+    assert VT.get_vocab_size() == 3
+    assert VT.get_q_gram_pos_list('el') == list(HM.get_q_gram_pos_list('el'))
+
+    for salt_str in [None, 'test salt str']:
+      for q_gram_set in test_q_gram_set_list:
+        assert VT.hash_q_gram_set(q_gram_set, salt_str) == \
+               HM.hash_q_gram_set(q_gram_set, salt_str)
+
+    for salt_str_list in [None, test_salt_str_list]:
+      assert (VT.hash_q_gram_set_list(test_q_gram_set_list, salt_str_list) ==
+              HM.hash_q_gram_set_list(test_q_gram_set_list,
+                                      salt_str_list)).all()
+    assert VT.hash_q_gram_set_list([]).shape == (0, (HM.bf_len+7)/8)
+
+  # Changing the Bloom filter length recalculates all cached positions
+  #
+  DHl1 = DoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k, False, 10)
+  DHl2 = DoubleHashing(bf_hash_funct1, bf_hash_funct2, 77, k)
+  VT = VocabPosTable(DoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k,
+                                   False, 10), test_q_gram_set)
+  assert DHl1.hash_q_gram_set(test_q_gram_set) == dh_bf1
+  assert VT.hash_q_gram_set(test_q_gram_set) == dh_bf1
+  DHl1.bf_len = 77
+  VT.bf_len =   77
+  assert DHl1.hash_q_gram_set(test_q_gram_set) == \
+         DHl2.hash_q_gram_set(test_q_gram_set)
+  assert VT.hash_q_gram_set(test_q_gram_set) == \
+         DHl2.hash_q_gram_set(test_q_gram_set)
+
+  VT = VocabPosTable(TH)
+  VT.add_vocab(['%d' % (i) for i in range(2000)], 'salt')
+  VT.add_vocab(['%d' % (i) for i in range(1000, 2100)], 'salt')
+  assert VT.get_vocab_size() == 2100
+  for i in [0, 1999, 2000, 2099]:
+    assert VT.get_q_gram_pos_list('%dsalt' % (i)) == \
+           list(TH.get_q_gram_pos_list('%dsalt' % (i)))
+
+  # Growing the table keeps the positions of existing q-grams
+  #
+  VT = VocabPosTable(DH)
+  for i in range(3000):
+    VT.add_q_gram(str(i))
+  assert VT.get_vocab_size() == 3000
+  for i in [0, 1023, 1024, 2999]:
+    assert VT.get_q_gram_pos_list(str(i)) == DH.get_q_gram_pos_list(str(i))
+
+  print 'OK'
+  print
+
+  print '  Testing vectorised position calculation...',  # - - - - - - - - - -
+
+  # The vectorised positions must be exactly the same as the positions
+  # calculated with Python integers for all Bloom filter lengths and numbers
+  # of hash functions used (including dynamic attribute-level Bloom filter
+  # lengths and very large numbers of hash functions, where the float
+  # conversions of enhanced double and triple hashing matter)
+  #
+  test_q_gram_list = ['%c%c' % (chr(97+i), chr(97+j)) for i in range(26)
+                      for j in range(26)]
+  test_q_gram_list += [q_gram+'salt' for q_gram in test_q_gram_list[:50]]
+  test_q_gram_list += ['', chr(1)+'a', 'a'+chr(1)]
+
+  for test_bf_len in [2, 13, 34, 44, 58, 150, 500, 1000, 1024, 2000, 4096,
+                      10007, 2**20+7, 2**31]:
+    for test_k in [1, 2, 5, 10, 15, 20, 30, 50, 100, 1000]:
+      for HM in [DoubleHashing(bf_hash_funct1, bf_hash_funct2, test_bf_len,
+                               test_k),
+                 EnhancedDoubleHashing(bf_hash_funct1, bf_hash_funct2,
+                                       test_bf_len, test_k),
+                 TripleHashing(bf_hash_funct1, bf_hash_funct2,
+                               bf_hash_funct3, test_bf_len, test_k)]:
+
+        if (test_k >= 100):  # Limit the run time of these tests
+          q_gram_list = test_q_gram_list[:20]
+        else:
+          q_gram_list = test_q_gram_list
+
+        pos_matrix = HM.calc_q_gram_pos_matrix(q_gram_list)
+        assert pos_matrix.shape == (len(q_gram_list), test_k)
+
+        for (j, q_gram) in enumerate(q_gram_list):
+          assert pos_matrix[j].tolist() == HM.calc_q_gram_pos_list(q_gram), \
+                 (HM, test_bf_len, test_k, q_gram)
+
+  # Values where the cubic term of enhanced double hashing is large
+  #
+  EDHl = EnhancedDoubleHashing(bf_hash_funct1, bf_hash_funct2, 10007, 5000)
+  assert EDHl.calc_q_gram_pos_matrix(['ab'])[0].tolist() == \
+         EDHl.calc_q_gram_pos_list('ab')
+  THl = TripleHashing(bf_hash_funct1, bf_hash_funct2, bf_hash_funct3, 10007,
+                      5000)
+  assert THl.calc_q_gram_pos_matrix(['ab'])[0].tolist() == \
+         THl.calc_q_gram_pos_list('ab')
+
+  print 'OK'
+  print
+
+  print '  Testing single-digest hashing...',  # - - - - - - - - - - - - - - - -
+
+  SD2 = SplitDigest(2)
+  SD3 = SplitDigest(3)
+  SD2k = SplitDigest(2, key='secret key')
+
+  hex_str = hashlib.sha512('ab').hexdigest()
+  assert SD2.get_int_list('ab') == [int(hex_str[:64], 16),
+                                    int(hex_str[64:], 16)]
+  assert SD3.get_int_list('ab') == [int(hex_str[:42], 16),
+                                    int(hex_str[42:84], 16),
+                                    int(hex_str[84:126], 16)]
+  hex_str = hmac.new('secret key', 'ab', hashlib.sha512).hexdigest()
+  assert SD2k.get_int_list('ab') == [int(hex_str[:64], 16),
+                                     int(hex_str[64:], 16)]
+  assert SD2k.get_int_list('ab') == SD2k.get_int_list('ab')
+  assert SplitDigest(2, hashlib.md5).int_hex_len == 16
+
+  for test_bf_len in [13, 1000, 2**31]:
+    for test_k in [1, 10, 30]:
+      for HM in [DoubleHashing(None, None, test_bf_len, test_k,
+                               split_digest=SD2),
+                 EnhancedDoubleHashing(None, None, test_bf_len, test_k,
+                                       split_digest=SD2k),
+                 TripleHashing(None, None, None, test_bf_len, test_k,
+                               split_digest=SD3)]:
+        pos_matrix = HM.calc_q_gram_pos_matrix(test_q_gram_list[:100])
+        for (j, q_gram) in enumerate(test_q_gram_list[:100]):
+          assert pos_matrix[j].tolist() == HM.calc_q_gram_pos_list(q_gram)
+
+  for (HM, bf) in [(DoubleHashing(None, None, bf_len, k, split_digest=SD2),
+                    dh_bf1),
+                   (EnhancedDoubleHashing(None, None, bf_len, k, False, 10,
+                                          SD2), edh_bf1),
+                   (TripleHashing(None, None, None, bf_len, k,
+                                  split_digest=SD3), th_bf1)]:
+    sd_bf = HM.hash_q_gram_set(test_q_gram_set)
+    assert sd_bf.count(1) > 0 and sd_bf != bf
+    assert sd_bf == HM.hash_q_gram_set(test_q_gram_set)
+
+    for salt_str_list in [None, test_salt_str_list]:
+      bf_matrix = HM.hash_q_gram_set_list(test_q_gram_set_list, salt_str_list)
+      for (i, q_gram_set) in enumerate(test_q_gram_set_list):
+        if (salt_str_list != None):
+          salt_str = salt_str_list[i]
+        else:
+          salt_str = None
+        assert packed_row_to_bf(bf_matrix[i], bf_len) == \
+               HM.hash_q_gram_set(q_gram_set, salt_str)
+
+  assert DoubleHashing(None, None, bf_len, k, split_digest=SD2k). \
+         hash_q_gram_set(test_q_gram_set) != \
+         DoubleHashing(None, None, bf_len, k, split_digest=SD2). \
+         hash_q_gram_set(test_q_gram_set)
+
+  print 'OK'
+  print
+
+  print '  Testing salted hashing with kept hash objects...',  # - - - - - - -
+
+  test_salt_str_list2 = ['salt1', None, 'salt1', 'salt4', 'lt4']
+  test_q_gram_set_list2 = test_q_gram_set_list + [set(['sa', 'an'])]
+
+  for (HM, HMp) in \
+    [(DH, DoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k,
+                        salt_prefix_size=3)),
+     (EDH, EnhancedDoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k,
+                                 False, 5, salt_prefix_size=100)),
+     (TH, TripleHashing(bf_hash_funct1, bf_hash_funct2, bf_hash_funct3,
+                        bf_len, k, salt_prefix_size=100)),
+     (DoubleHashing(None, None, bf_len, k, split_digest=SD2k),
+      DoubleHashing(None, None, bf_len, k, False, 5, SD2k, 100)),
+     (TripleHashing(None, None, None, bf_len, k, split_digest=SD3),
+      TripleHashing(None, None, None, bf_len, k, split_digest=SD3,
+                    salt_prefix_size=2))]:
+
+    for salt_str in [None, 'test salt str', 'salt1']:
+      for q_gram_set in test_q_gram_set_list2:
+        assert HMp.hash_q_gram_set(q_gram_set, salt_str) == \
+               HM.hash_q_gram_set(q_gram_set, salt_str)
+
+    for q_gram in ['he', 'el', '']:
+      assert HMp.calc_q_gram_pos_matrix([q_gram], 'salt')[0].tolist() == \
+             HM.calc_q_gram_pos_list(q_gram+'salt')
+    assert HMp.calc_q_gram_pos_matrix(test_q_gram_list, 'salt').tolist() \
+           == HM.calc_q_gram_pos_matrix([q_gram+'salt' for q_gram in
+                                         test_q_gram_list]).tolist()
+
+    # Salted q-grams that are the same for different salting strings
+    #
+    test_salt_str_list3 = [None, 'salt1', 'salt1', 'salt4', '4']
+    test_q_gram_set_list3 = [set(['ab']), set(['ab', 'cd']), set(),
+                             set(['ab', 'lt']), set(['abl', 'ablt'])]
+
+    for (salt_str_list, q_gram_set_list) in \
+      [(None, test_q_gram_set_list2),
+       (test_salt_str_list2, test_q_gram_set_list2),
+       (test_salt_str_list3, test_q_gram_set_list3)]:
+      assert (HMp.hash_q_gram_set_list(q_gram_set_list, salt_str_list) ==
+              HM.hash_q_gram_set_list(q_gram_set_list, salt_str_list)).all()
+
+    num_hit, num_miss, num_q_gram = HMp.salt_prefixes.get_stats()
+    assert num_hit > 0 and num_q_gram <= HMp.salt_prefixes.max_size
+
+  # Positions of salted q-grams from the position cache, and dictionaries of
+  # the positions of salted q-grams
+  #
+  DHc = DoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k, True, 12)
+  for salt_str in ['test salt str', 'salt1', 'test salt str']:
+    dh_bf, dh_q_gram_pos_dict = DHc.hash_q_gram_set(test_q_gram_set, salt_str)
+    assert (dh_bf, dh_q_gram_pos_dict) == \
+           DH2.hash_q_gram_set(test_q_gram_set, salt_str)
+    assert sorted(dh_q_gram_pos_dict.keys()) == \
+           sorted([q_gram+salt_str for q_gram in test_q_gram_set])
+  assert DHc.pos_cache.get_stats() == (2, 28, 12), DHc.pos_cache.get_stats()
+
+  # The salting string is only fed to copies of the kept hash objects
+  #
+  test_prefixes = QGramHashPrefixes([hashlib.md5, hashlib.sha1], 1)
+  assert test_prefixes.get_hex_digest_list('ab', 'c') == \
+         [hashlib.md5('abc').hexdigest(), hashlib.sha1('abc').hexdigest()]
+  assert test_prefixes.get_hex_digest_list('ab', 'd') == \
+         [hashlib.md5('abd').hexdigest(), hashlib.sha1('abd').hexdigest()]
+  assert test_prefixes.get_hex_digest_list('a', 'bd') == \
+         [hashlib.md5('abd').hexdigest(), hashlib.sha1('abd').hexdigest()]
+  assert test_prefixes.get_stats() == (1, 2, 1)
+  assert test_prefixes.evict() == 1
+
+  print 'OK'
+  print
+
+  print '  Testing cached random hashing...',  # - - - - - - - - - - - - - - - -
+
+  # The cached positions are the same as those of the global random number
+  # generator, and the global generator is not used
+  #
+  RHc = RandomHashing(bf_hash_funct1, bf_len, k, False, 4)
+  RHc2 = RandomHashing(bf_hash_funct1, bf_len, k, True, 100)
+
+  random.seed(123)
+  test_rand_state = random.getstate()
+
+  for salt_str in [None, 'test salt str']:
+    for q_gram_set in [test_q_gram_set]+test_q_gram_set_list:
+      assert RHc.hash_q_gram_set(q_gram_set, salt_str) == \
+             RH2.hash_q_gram_set(q_gram_set, salt_str)[0]
+      random.setstate(test_rand_state)
+      assert RHc2.hash_q_gram_set(q_gram_set, salt_str) == \
+             RH2.hash_q_gram_set(q_gram_set, salt_str)
+      if (len(q_gram_set) > 0):  # The original method seeds the global
+        assert random.getstate() != test_rand_state  # generator
+      random.setstate(test_rand_state)
+
+  RHc.hash_q_gram_set_list(test_q_gram_set_list, test_salt_str_list)
+  RHc.warm_pos_cache(['x', 'y'], 'salt')
+  assert random.getstate() == test_rand_state
+
+  assert (RHc.hash_q_gram_set_list(test_q_gram_set_list) ==
+          RH.hash_q_gram_set_list(test_q_gram_set_list)).all()
+
+  RHc.bf_len = 77
+  assert RHc.hash_q_gram_set(test_q_gram_set) == \
+         RandomHashing(bf_hash_funct1, 77, k).hash_q_gram_set(test_q_gram_set)
+
+  print 'OK'
+  print
+
+  print '  Testing counter-based random hashing...',  # - - - - - - - - - - - -
+
+  # Known answers of Philox4x32-10 from the Random123 library
+  #
+  u = numpy.uint64
+  for (ctr_list, key_list, word_list) in \
+    [([0, 0, 0, 0], [0, 0], [0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8]),
+     ([0xffffffff]*4, [0xffffffff]*2,
+      [0x408f276d, 0x41c83b0e, 0xa20bc7c6, 0x6d5451fd]),
+     ([0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344],
+      [0xa4093822, 0x299f31d0],
+      [0xd16cfe09, 0x94fdcceb, 0x5001e420, 0x24126ea1])]:
+    assert philox4x32([u(c) for c in ctr_list],
+                      [u(w) for w in key_list]) == \
+           word_list
+
+  CRH = CounterRandomHashing(bf_hash_funct1, bf_len, k)
+  CRH2 = CounterRandomHashing(bf_hash_funct1, bf_len, k, True)
+  CRHs = CounterRandomHashing(bf_hash_funct1, bf_len, k, seed=1)
+
+  crh_bf1 = CRH.hash_q_gram_set(test_q_gram_set)
+  assert len(crh_bf1) == bf_len
+  assert crh_bf1.count(1) > 0
+  assert crh_bf1 == CRH.hash_q_gram_set(test_q_gram_set)
+  assert crh_bf1 != CRH.hash_q_gram_set(test_q_gram_set, 'test salt str')
+  assert crh_bf1 != CRHs.hash_q_gram_set(test_q_gram_set)
+  assert crh_bf1 != rh_bf1
+
+  crh_bf, crh_q_gram_pos_dict = CRH2.hash_q_gram_set(test_q_gram_set)
+  assert crh_bf == crh_bf1
+  assert len(crh_q_gram_pos_dict) == len(test_q_gram_set)
+
+  # Positions are in range and all random words are used
+  #
+  for test_bf_len in [2, 13, 1000, 2**31, 2**32]:
+    for test_k in [1, 3, 4, 5, 30]:
+      CRHt = CounterRandomHashing(bf_hash_funct1, test_bf_len, test_k)
+      pos_matrix = CRHt.calc_q_gram_pos_matrix(test_q_gram_list)
+      assert pos_matrix.shape == (len(test_q_gram_list), test_k)
+      assert pos_matrix.min() >= 0 and pos_matrix.max() < test_bf_len
+      if (test_bf_len >= 1000):
+        assert len(set(pos_matrix.ravel().tolist())) > \
+               0.5*min(test_bf_len, pos_matrix.size)
+      for j in [0, 17, len(test_q_gram_list)-1]:
+        assert pos_matrix[j].tolist() == \
+               CRHt.calc_q_gram_pos_list(test_q_gram_list[j])
+
+  # The first positions do not change with the number of hash functions
+  #
+  assert CounterRandomHashing(bf_hash_funct1, bf_len, 3).get_q_gram_pos_list(
+         'ab') == CRH.get_q_gram_pos_list('ab')[:3]
+
+  CRHc = CounterRandomHashing(bf_hash_funct1, bf_len, k, False, 4)
+  CRHc.warm_pos_cache(['he', 'el', 'll', 'he'])
+  assert CRHc.pos_cache.get_stats() == (0, 3, 3)
+  CRHc.warm_pos_cache(['he', 'lo', 'o '])  # One hit, removes 'el' and 'll'
+  assert CRHc.pos_cache.get_stats() == (1, 5, 4)
+  assert 'el' not in CRHc.pos_cache.cache_dict
+  for salt_str in [None, 'test salt str']:
+    assert CRHc.hash_q_gram_set(test_q_gram_set, salt_str) == \
+           CRH.hash_q_gram_set(test_q_gram_set, salt_str)
+
+  for salt_str_list in [None, test_salt_str_list]:
+    bf_matrix = CRH.hash_q_gram_set_list(test_q_gram_set_list, salt_str_list)
+    assert (VocabPosTable(CRH).hash_q_gram_set_list(test_q_gram_set_list,
+                                                    salt_str_list) ==
+            bf_matrix).all()
+    for (i, q_gram_set) in enumerate(test_q_gram_set_list):
+      if (salt_str_list != None):
+        salt_str = salt_str_list[i]
+      else:
+        salt_str = None
+      assert packed_row_to_bf(bf_matrix[i], bf_len) == \
+             CRH.hash_q_gram_set(q_gram_set, salt_str)
+
+  print 'OK'
+  print
+
+  print '  Testing q-gram position arrays...',  # - - - - - - - - - - - - - - -
+
+  split_digest = SplitDigest(3)
+
+  for get_pos in [True, 'array']:
+    hash_class_list = [
+      DoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k, get_pos),
+      EnhancedDoubleHashing(bf_hash_funct1, bf_hash_funct2, bf_len, k,
+                            get_pos, 5, None, 5),
+      TripleHashing(None, None, None, bf_len, k, get_pos,
+                    split_digest=split_digest),
+      RandomHashing(bf_hash_funct1, bf_len, k, get_pos),
+      CounterRandomHashing(bf_hash_funct1, bf_len, k, get_pos)]
+    hash_class_list.append(VocabPosTable(hash_class_list[0]))
+
+    if (get_pos == True):
+      dict_result_list = []
+      for hash_class in hash_class_list:
+        for salt_str in [None, 'salt']:
+          for q_gram_set in [test_q_gram_set, set()]:
+            dict_result_list.append(hash_class.hash_q_gram_set(q_gram_set,
+                                                               salt_str))
+    else:  # The same Bloom filters and positions as the dictionaries
+      dict_result_iter = iter(dict_result_list)
+      for hash_class in hash_class_list:
+        for salt_str in [None, 'salt']:
+          for q_gram_set in [test_q_gram_set, set()]:
+            bf, q_gram_pos_arrays = hash_class.hash_q_gram_set(q_gram_set,
+                                                               salt_str)
+            assert isinstance(q_gram_pos_arrays, QGramPosArrays)
+            assert len(q_gram_pos_arrays.pos_array) == k*len(q_gram_set)
+
+            (dict_bf, q_gram_pos_dict) = dict_result_iter.next()
+            assert bf == dict_bf
+            assert q_gram_pos_arrays.to_dict() == q_gram_pos_dict
+
+  # Remapping, sampling and merging of positions
+  #
+  test_arrays = QGramPosArrays(['ab', 'bc', 'cd'], [0, 0, 1, 2, 2],
+                               [1, 3, 3, 0, 1])
+  assert test_arrays.to_dict() == {'ab':set([1,3]), 'bc':set([3]),
+                                   'cd':set([0,1])}
+  assert test_arrays.map_pos([0, 0, 1, 1]).to_dict() == \
+         {'ab':set([0,1]), 'bc':set([1]), 'cd':set([0])}
+  assert test_arrays.add_shifted_pos(4).to_dict() == \
+         {'ab':set([1,3,5,7]), 'bc':set([3,7]), 'cd':set([0,1,4,5])}
+
+  # Bit 10+i is sampled from bit [1, 2, 1, 0][i], bit 3 is not sampled
+  #
+  assert test_arrays.sample_pos([1, 2, 1, 0], 10).to_dict() == \
+         {'ab':set([10,12]), 'cd':set([10,12,13])}
+
+  merge_arrays = merge_q_gram_pos_arrays([test_arrays,
+                   QGramPosArrays(['xy', 'cd'], [0, 1, 1], [2, 2, 9])])
+  assert merge_arrays.q_gram_list == ['ab', 'bc', 'cd', 'xy']
+  assert merge_arrays.to_dict() == {'ab':set([1,3]), 'bc':set([3]),
+                                    'cd':set([0,1,2,9]), 'xy':set([2])}
+  assert merge_q_gram_pos_arrays([]).to_dict() == {}
+
+  print 'OK'
+  print
+
 # =============================================================================
 # End.
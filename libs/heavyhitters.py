@@ -0,0 +1,212 @@
+# heavyhitters.py - Module that implements bounded-memory counting of the most
+#                   frequent items in a stream
+#
+# October 2026
+# -----------------------------------------------------------------------------
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# =============================================================================
+
+# =============================================================================
+
+class HeavyHitterCounter():
+  """Count the most frequent items of a stream in bounded memory using the
+     Misra-Gries algorithm, as described in:
+       - J. Misra and D. Gries, Finding repeated elements, Science of
+         Computer Programming, 1982.
+
+     Counters are kept for at most 2*capacity items. Once there are more, the
+     count of the (capacity+1)-th most frequent item is subtracted from all
+     counters and items whose counter drops to 0 are removed (a batched form
+     of the original decrement step, so each added item takes amortised
+     constant time).
+
+     Each counter underestimates the frequency of its item by at most
+     n/(capacity+1) (with n the number of items added), so every item that
+     occurs more than n/(capacity+1) times is a candidate. The counts of the
+     candidates are not exact, use 'count_candidates' for a second pass that
+     counts them exactly.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, capacity):
+    """Initialise the counter.
+
+       Input arguments:
+         - capacity  The number of candidate heavy hitters to keep.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert capacity > 0, capacity
+
+    self.capacity = capacity
+
+    self.count_dict = {}  # Items and their (underestimated) counts
+
+    self.num_item =  0  # Number of items added
+    self.max_error = 0  # Sum of all amounts subtracted from counters
+
+  # ---------------------------------------------------------------------------
+
+  def add(self, item):
+    """Add the given (hashable) item to the counter.
+    """
+
+    count_dict = self.count_dict  # Short-cut
+
+    count_dict[item] = count_dict.get(item, 0) + 1
+    self.num_item += 1
+
+    if (len(count_dict) > 2*self.capacity):
+      self.reduce()
+
+  # ---------------------------------------------------------------------------
+
+  def reduce(self):
+    """Reduce the number of counters to at most 'capacity'.
+    """
+
+    count_dict = self.count_dict  # Short-cut
+
+    if (len(count_dict) <= self.capacity):
+      return
+
+    sorted_count_list = sorted(count_dict.itervalues(), reverse=True)
+    sub_count = sorted_count_list[self.capacity]
+
+    for (item, count) in count_dict.items():
+      if (count <= sub_count):
+        del count_dict[item]
+      else:
+        count_dict[item] = count - sub_count
+
+    self.max_error += sub_count
+
+  # ---------------------------------------------------------------------------
+
+  def get_candidates(self):
+    """Return the list of candidate heavy hitters (at most 'capacity' items),
+       sorted by their (underestimated) counts with the largest first.
+    """
+
+    self.reduce()
+
+    return [item for (item, count) in sorted(self.count_dict.iteritems(),
+                                             key=lambda t: t[1],
+                                             reverse=True)]
+
+# =============================================================================
+
+def count_candidates(item_iter, cand_set):
+  """Count exactly how often each of the items in the given candidate set
+     occurs in the given iterable, and return a dictionary with candidate
+     items as keys and their counts as values (candidates that do not occur
+     are not included). Items are inserted in the order they first occur.
+  """
+
+  count_dict = {}
+
+  for item in item_iter:
+    if (item in cand_set):
+      count_dict[item] = count_dict.get(item, 0) + 1
+
+  return count_dict
+
+# -----------------------------------------------------------------------------
+
+def count_heavy_hitters(item_iter_funct, capacity):
+  """Count exactly how often each of (at most 'capacity') heavy hitters
+     occurs in a stream of items, using two passes over the stream: the first
+     finds candidates with a 'HeavyHitterCounter', the second counts them
+     exactly.
+
+     The 'item_iter_funct' is a function without arguments that returns an
+     iterable over all items each time it is called.
+
+     Returns a dictionary with the heavy hitters as keys and their exact
+     counts as values, and the maximum count error of the first pass (at
+     most n/(capacity+1) for n items). Every item that occurs more often
+     than this maximum error is guaranteed to be in the dictionary, while
+     less frequent items can be missing.
+  """
+
+  hh_counter = HeavyHitterCounter(capacity)
+
+  for item in item_iter_funct():
+    hh_counter.add(item)
+
+  cand_set = set(hh_counter.get_candidates())
+
+  return count_candidates(item_iter_funct(), cand_set), hh_counter.max_error
+
+# =============================================================================
+# Do some tests if called from command line
+
+if (__name__ == '__main__'):
+
+  import random
+
+  print 'Running some tests:'
+  print
+
+  random.seed(42)
+
+  # A stream with 10 frequent items and many rare items
+  #
+  test_item_list = []
+  for i in range(10):
+    test_item_list += ['freq-%d' % (i)] * (1000 - 50*i)
+  for i in range(20000):
+    test_item_list.append('rare-%d' % (random.randint(0, 10000)))
+  random.shuffle(test_item_list)
+
+  exact_count_dict = {}
+  for item in test_item_list:
+    exact_count_dict[item] = exact_count_dict.get(item, 0) + 1
+
+  test_counter = HeavyHitterCounter(20)
+  for item in test_item_list:
+    test_counter.add(item)
+
+  cand_list = test_counter.get_candidates()
+  assert len(cand_list) <= 20
+  assert test_counter.max_error <= len(test_item_list) / 21
+  for i in range(10):
+    assert 'freq-%d' % (i) in cand_list, i
+  for (item, count) in test_counter.count_dict.iteritems():
+    assert count <= exact_count_dict[item]
+    assert count >= exact_count_dict[item] - test_counter.max_error
+  print '  Heavy hitter candidates correct'
+
+  hh_count_dict, hh_max_error = count_heavy_hitters(lambda:
+                                                    iter(test_item_list), 20)
+  assert hh_max_error == test_counter.max_error
+  for (item, count) in hh_count_dict.iteritems():
+    assert count == exact_count_dict[item]
+  for (item, count) in exact_count_dict.iteritems():
+    if (count > hh_max_error):
+      assert item in hh_count_dict, item
+  for i in range(10):
+    assert hh_count_dict['freq-%d' % (i)] == 1000 - 50*i
+  print '  Exact heavy hitter counts correct'
+
+  print
+  print 'All tests passed'
+
+# =============================================================================
+# End.
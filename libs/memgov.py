@@ -0,0 +1,532 @@
+# memgov.py - Module that implements a memory governor which releases memory
+#             before the program runs out of it
+#
+# October 2026
+# -----------------------------------------------------------------------------
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# =============================================================================
+
+import glob
+import os
+import shelve
+import time
+
+import auxiliary
+
+# =============================================================================
+
+class SpillDict():
+  """A dictionary that is kept in memory until it is spilled, at which point
+     all its items are moved into a disk-backed 'shelve' database. Items
+     added later are again kept in memory until the next spill.
+
+     Keys must be strings and values must be picklable. Values read from the
+     disk are copies, so a modified value has to be assigned again (as is
+     already done by code of the form 'd[k] = d.get(k, set()) | ...').
+
+     Iteration returns the spilled items first, so after a spill the order
+     of items differs from the order of a normal dictionary.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, spill_file_name):
+    """Initialise the dictionary.
+
+       Input arguments:
+         - spill_file_name  The name of the file (without extension) of the
+                            database items are spilled into.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    self.spill_file_name = spill_file_name
+
+    self.mem_dict =  {}    # Items not spilled yet
+    self.disk_dict = None  # Spilled items (opened on the first spill)
+
+  # ---------------------------------------------------------------------------
+
+  def __len__(self):
+    if (self.disk_dict == None):
+      return len(self.mem_dict)
+    return len(self.mem_dict) + len(self.disk_dict)
+
+  def __contains__(self, key):
+    if (key in self.mem_dict):
+      return True
+    return (self.disk_dict != None) and (key in self.disk_dict)
+
+  def __getitem__(self, key):
+    if (key in self.mem_dict):
+      return self.mem_dict[key]
+    if (self.disk_dict != None):
+      return self.disk_dict[key]
+    raise KeyError(key)
+
+  def get(self, key, default=None):
+    if (key in self.mem_dict):
+      return self.mem_dict[key]
+    if ((self.disk_dict != None) and (key in self.disk_dict)):
+      return self.disk_dict[key]
+    return default
+
+  def __setitem__(self, key, val):
+    self.mem_dict[key] = val
+    if ((self.disk_dict != None) and (key in self.disk_dict)):
+      del self.disk_dict[key]  # Keep keys in memory and on disk disjoint
+
+  def __delitem__(self, key):
+    if (key in self.mem_dict):
+      del self.mem_dict[key]
+    elif (self.disk_dict != None):
+      del self.disk_dict[key]
+    else:
+      raise KeyError(key)
+
+  def iterkeys(self):
+    if (self.disk_dict != None):
+      for key in self.disk_dict.keys():
+        yield key
+    for key in self.mem_dict.iterkeys():
+      yield key
+
+  __iter__ = iterkeys
+
+  def iteritems(self):
+    if (self.disk_dict != None):
+      for key in self.disk_dict.keys():
+        yield (key, self.disk_dict[key])
+    for item in self.mem_dict.iteritems():
+      yield item
+
+  def itervalues(self):
+    for (key, val) in self.iteritems():
+      yield val
+
+  def keys(self):
+    return list(self.iterkeys())
+
+  def items(self):
+    return list(self.iteritems())
+
+  def values(self):
+    return list(self.itervalues())
+
+  # ---------------------------------------------------------------------------
+
+  def spill(self):
+    """Move all items kept in memory into the disk-backed database and return
+       the number of items moved.
+    """
+
+    if (len(self.mem_dict) == 0):
+      return 0
+
+    if (self.disk_dict == None):
+      self.disk_dict = shelve.open(self.spill_file_name, flag='n',
+                                   protocol=2)
+
+    num_item = len(self.mem_dict)
+
+    disk_dict = self.disk_dict  # Short-cut
+
+    for (key, val) in self.mem_dict.iteritems():
+      disk_dict[key] = val
+
+    disk_dict.sync()
+
+    self.mem_dict = {}  # Release the memory dictionary and its items
+
+    return num_item
+
+  # ---------------------------------------------------------------------------
+
+  def checkpoint(self):
+    """Spill all items and return the name of the file the items are stored
+       in, so they can be recovered (with 'shelve.open') after an abort.
+    """
+
+    self.spill()
+
+    if (self.disk_dict == None):  # Empty dictionary, nothing to checkpoint
+      return None
+
+    self.disk_dict.sync()
+
+    return self.spill_file_name
+
+  # ---------------------------------------------------------------------------
+
+  def close(self):
+    """Close and remove the disk-backed database (if any) and empty the
+       dictionary.
+    """
+
+    if (self.disk_dict != None):
+      self.disk_dict.close()
+      self.disk_dict = None
+
+      for file_name in glob.glob(self.spill_file_name+'*'):
+        os.remove(file_name)
+
+    self.mem_dict = {}
+
+# =============================================================================
+
+class MemoryGovernor():
+  """A memory governor that components of the program register with, and
+     which is regularly asked to check the memory use of the program.
+
+     If the resident set size (RSS) of the program is larger than the given
+     maximum, it first evicts caches, then (if a spill directory is given)
+     spills registered data structures to disk. If neither released anything,
+     or the memory use is still too large after releasing memory in a given
+     number of consecutive checks, it saves checkpoints of all registered
+     components and aborts by raising a MemoryError exception.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, max_mbyte, check_interval=10.0, spill_dir=None,
+               max_num_over=2):
+    """Initialise the memory governor.
+
+       Input arguments:
+         - max_mbyte       The maximum amount of memory (RSS) in megabytes the
+                           program is allowed to use.
+         - check_interval  The minimum number of seconds between two samples
+                           of the memory use.
+         - spill_dir       The directory where data structures are spilled
+                           into and checkpoints are saved. If set to None then
+                           'new_spill_dict' returns normal dictionaries.
+         - max_num_over    The number of consecutive checks after which the
+                           program is aborted if its memory use is still
+                           larger than the maximum after releasing memory
+                           (caches can refill between checks, so releasing
+                           some items does not prevent an abort).
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert max_mbyte > 0, max_mbyte
+    assert check_interval >= 0.0, check_interval
+    assert max_num_over >= 1, max_num_over
+
+    self.max_mbyte =      max_mbyte
+    self.check_interval = check_interval
+    self.spill_dir =      spill_dir
+    self.max_num_over =   max_num_over
+
+    if ((spill_dir != None) and (not os.path.isdir(spill_dir))):
+      os.makedirs(spill_dir)
+
+    # Registered components, each a tuple (name, evict_funct, spill_funct,
+    # checkpoint_funct)
+    #
+    self.comp_list = []
+
+    # Dictionaries created by 'new_spill_dict', each a tuple (name,
+    # spill_dict)
+    #
+    self.spill_dict_list = []
+    self.num_spill_dict =  0  # Number of spill dictionaries ever created
+
+    self.next_check_time = time.time() + check_interval
+
+    self.num_check = 0  # Number of times the memory use was sampled
+    self.num_evict = 0  # Number of times caches were evicted
+    self.num_spill = 0  # Number of times data structures were spilled
+
+    # Number of consecutive checks where the memory use was still too large
+    # after releasing memory
+    #
+    self.num_over = 0
+
+  # ---------------------------------------------------------------------------
+
+  def register(self, name, evict_funct=None, spill_funct=None,
+               checkpoint_funct=None):
+    """Register a component with the memory governor.
+
+       Input arguments:
+         - name              The unique name of the component.
+         - evict_funct       A function without arguments that removes cached
+                             data that can be re-calculated, and returns the
+                             number of items removed.
+         - spill_funct       A function without arguments that moves data to
+                             disk, and returns the number of items moved.
+         - checkpoint_funct  A function without arguments that saves the data
+                             of the component to disk and returns the name of
+                             the file it was saved in (or None).
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert name not in [comp_tuple[0] for comp_tuple in self.comp_list], name
+
+    self.comp_list.append((name, evict_funct, spill_funct, checkpoint_funct))
+
+  # ---------------------------------------------------------------------------
+
+  def unregister(self, name):
+    """Remove the component with the given name from the memory governor.
+    """
+
+    self.comp_list = [comp_tuple for comp_tuple in self.comp_list if
+                      comp_tuple[0] != name]
+
+  # ---------------------------------------------------------------------------
+
+  def new_spill_dict(self, name):
+    """Return a new dictionary that is registered with the memory governor
+       under the given name. If a component with this name is already
+       registered then a running number is appended to the name, so the same
+       name can be used for several dictionaries. If no spill directory was
+       given then a normal (not registered) dictionary is returned.
+    """
+
+    if (self.spill_dir == None):
+      return {}
+
+    self.num_spill_dict += 1
+
+    comp_name_set = set([comp_tuple[0] for comp_tuple in self.comp_list])
+
+    unique_name = name
+    name_num =    1
+    while (unique_name in comp_name_set):
+      name_num += 1
+      unique_name = '%s-%d' % (name, name_num)
+
+    file_base_name = ''.join([c if (c.isalnum() or c in '-_.') else '_'
+                              for c in unique_name])
+
+    # Different names can give the same file name, so the number of the
+    # dictionary is added as well
+    #
+    file_name = os.path.join(self.spill_dir,
+                             '%s-%d-%d' % (file_base_name, os.getpid(),
+                                           self.num_spill_dict))
+
+    spill_dict = SpillDict(file_name)
+
+    self.register(unique_name, spill_funct=spill_dict.spill,
+                  checkpoint_funct=spill_dict.checkpoint)
+
+    self.spill_dict_list.append((unique_name, spill_dict))
+
+    return spill_dict
+
+  # ---------------------------------------------------------------------------
+
+  def close(self):
+    """Close all dictionaries created by 'new_spill_dict', remove their
+       files and unregister them. Should be called once these dictionaries
+       are not needed anymore.
+    """
+
+    for (name, spill_dict) in self.spill_dict_list:
+      spill_dict.close()
+      self.unregister(name)
+
+    self.spill_dict_list = []
+
+  # ---------------------------------------------------------------------------
+
+  def check(self):
+    """Check the memory use of the program if at least 'check_interval'
+       seconds passed since the last check, and release memory if it is too
+       large. This method is cheap enough to be called once per record.
+    """
+
+    if (time.time() < self.next_check_time):
+      return
+
+    self.check_now()
+
+  # ---------------------------------------------------------------------------
+
+  def check_now(self):
+    """Check the memory use of the program and release memory if it is too
+       large (see the class description).
+    """
+
+    self.num_check += 1
+
+    mem_use = auxiliary.get_memory_rss_val()
+
+    if ((mem_use == None) or (mem_use <= self.max_mbyte)):
+      self.num_over = 0
+      self.next_check_time = time.time() + self.check_interval
+      return
+
+    print
+    print '*** Warning: Program uses more than %d MBytes: %d MBytes ***' % \
+          (self.max_mbyte, mem_use)
+
+    # Stage 1: Evict caches
+    #
+    num_evicted = 0
+    for (name, evict_funct, spill_funct, checkpoint_funct) in self.comp_list:
+      if (evict_funct != None):
+        num_item = evict_funct()
+        print '  Evicted %d items from %s' % (num_item, name)
+        num_evicted += num_item
+    self.num_evict += 1
+
+    mem_use = auxiliary.get_memory_rss_val()
+
+    # Stage 2: Spill data structures to disk
+    #
+    num_spilled = 0
+    if (mem_use > self.max_mbyte):
+      for (name, evict_funct, spill_funct, checkpoint_funct) in \
+          self.comp_list:
+        if (spill_funct != None):
+          num_item = spill_funct()
+          print '  Spilled %d items of %s to disk' % (num_item, name)
+          num_spilled += num_item
+      self.num_spill += 1
+
+      mem_use = auxiliary.get_memory_rss_val()
+
+    print '  Memory use after releasing memory: %d MBytes' % (mem_use)
+    print
+
+    # Stage 3: Abort if no memory could be released, or if the memory use
+    # stayed too large after releasing memory in 'max_num_over' consecutive
+    # checks (released memory is not always returned to the operating
+    # system, so a single check is not enough)
+    #
+    if (mem_use > self.max_mbyte):
+      self.num_over += 1
+
+      if (((num_evicted == 0) and (num_spilled == 0)) or
+          (self.num_over >= self.max_num_over)):
+        self.abort(mem_use)
+
+    else:
+      self.num_over = 0
+
+    self.next_check_time = time.time() + self.check_interval
+
+  # ---------------------------------------------------------------------------
+
+  def abort(self, mem_use):
+    """Save checkpoints of all registered components and raise a MemoryError
+       exception.
+    """
+
+    print '*** Error: Memory use could not be reduced enough, aborting ***'
+
+    for (name, evict_funct, spill_funct, checkpoint_funct) in self.comp_list:
+      if (checkpoint_funct != None):
+        checkpoint_file_name = checkpoint_funct()
+        if (checkpoint_file_name != None):
+          print '  Saved checkpoint of %s into: %s' % \
+                (name, checkpoint_file_name)
+    print
+
+    raise MemoryError, 'Program uses more than %d MBytes: %d MBytes' % \
+                       (self.max_mbyte, mem_use)
+
+# =============================================================================
+# Do some tests if called from command line
+
+if (__name__ == '__main__'):
+
+  import shutil
+  import tempfile
+
+  print 'Running some tests:'
+  print
+
+  test_dir = tempfile.mkdtemp()
+
+  test_dict = SpillDict(os.path.join(test_dir, 'test'))
+  test_dict['a'] = set(['1'])
+  test_dict['b'] = set(['2'])
+
+  assert test_dict.spill() == 2
+  assert len(test_dict) == 2 and len(test_dict.mem_dict) == 0
+  assert test_dict['a'] == set(['1'])
+
+  test_dict['a'] = test_dict.get('a', set()) | set(['3'])
+  test_dict['c'] = set()
+  assert len(test_dict) == 3
+  assert test_dict['a'] == set(['1', '3'])
+  assert sorted(test_dict.keys()) == ['a', 'b', 'c']
+  assert test_dict.get('d') == None and 'd' not in test_dict
+
+  assert test_dict.checkpoint() == os.path.join(test_dir, 'test')
+  assert dict(test_dict.items()) == {'a':set(['1', '3']), 'b':set(['2']),
+                                     'c':set()}
+  test_dict.close()
+  assert glob.glob(os.path.join(test_dir, 'test*')) == []
+  print '  Spill dictionary correct'
+
+  # A maximum of 1 MByte is always exceeded
+  #
+  evict_list = []
+
+  test_gov = MemoryGovernor(1, 0.0, test_dir)
+  test_gov.register('test cache', evict_funct=lambda: len(evict_list))
+  test_spill_dict = test_gov.new_spill_dict('test dict')
+  test_spill_dict2 = test_gov.new_spill_dict('test dict')  # Same name
+  assert [comp_tuple[0] for comp_tuple in test_gov.comp_list] == \
+         ['test cache', 'test dict', 'test dict-2']
+  assert test_spill_dict.spill_file_name != test_spill_dict2.spill_file_name
+
+  test_spill_dict['a'] = 1
+  test_gov.check()  # Evicts nothing but spills one item
+  assert len(test_spill_dict.mem_dict) == 0 and len(test_spill_dict) == 1
+  assert test_gov.num_spill == 1
+
+  try:
+    test_gov.check()  # Nothing to evict or spill
+    assert False, 'MemoryError not raised'
+  except MemoryError:
+    pass
+  test_gov.close()
+  assert os.listdir(test_dir) == []
+  assert [comp_tuple[0] for comp_tuple in test_gov.comp_list] == \
+         ['test cache']
+
+  # A cache that always refills between checks must not prevent an abort
+  #
+  test_gov = MemoryGovernor(1, 0.0, None, 3)
+  test_gov.register('test cache', evict_funct=lambda: 10)
+  test_gov.check()
+  test_gov.check()
+  assert test_gov.num_over == 2
+  try:
+    test_gov.check()  # Third consecutive check above the maximum
+    assert False, 'MemoryError not raised'
+  except MemoryError:
+    pass
+  print '  Memory governor correct'
+
+  shutil.rmtree(test_dir)
+
+  print
+  print 'All tests passed'
+
+# =============================================================================
+# End.
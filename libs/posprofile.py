@@ -0,0 +1,362 @@
+# posprofile.py - Module that implements a profile of the bit positions a
+#                 vocabulary of q-grams is hashed to, and of the positions
+#                 q-grams share
+#
+# October 2026
+# -----------------------------------------------------------------------------
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# =============================================================================
+
+import numpy
+
+import hashing
+
+# =============================================================================
+
+class PosOverlapProfile():
+  """Hash a vocabulary of q-grams once with a hashing class (all positions
+     are calculated together with a vocabulary position table, see the class
+     'VocabPosTable' in the hashing.py module) and profile how the q-grams
+     share bit positions:
+       - the load of each position (the number of q-grams hashed to it),
+       - the number of positions shared by each pair of q-grams that share
+         at least one position,
+       - the q-grams that are uniquely identified by a position (they are
+         the only q-gram hashed to it, so any Bloom filter with this bit set
+         contains the q-gram).
+
+     This shows how much a parameter setting helps an attack without
+     encoding any records.
+
+     The pairs of q-grams that share positions are found by sorting all
+     (position, q-gram) pairs by position, so the memory needed for them is
+     proportional to the sum over all positions of the squared position
+     loads (and not to the squared vocabulary size).
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, hash_class, q_gram_iter, salt_str=None):
+    """Hash the q-gram vocabulary and calculate the position loads.
+
+       Input arguments:
+         - hash_class   The hashing class to profile.
+         - q_gram_iter  An iterable of the q-grams of the vocabulary
+                        (repeated q-grams are only used once).
+         - salt_str     An optional string concatenated with each q-gram.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    q_gram_list = []  # Distinct q-grams in the order they are given
+    q_gram_set =  set()
+
+    for q_gram in q_gram_iter:
+      if (q_gram not in q_gram_set):
+        q_gram_set.add(q_gram)
+        q_gram_list.append(q_gram)
+
+    self.q_gram_list =    q_gram_list
+    self.bf_len =         hash_class.bf_len
+    self.num_hash_funct = hash_class.num_hash_funct
+
+    num_q_gram = len(q_gram_list)
+    bf_len =     self.bf_len
+
+    # The table gives q-gram i the identifier i
+    #
+    vocab_pos_table = hashing.VocabPosTable(hash_class, q_gram_list, salt_str)
+    assert vocab_pos_table.get_vocab_size() == num_q_gram
+
+    self.pos_matrix = vocab_pos_table.pos_table[:num_q_gram]
+
+    # Distinct (position, q-gram) pairs (a q-gram can be hashed to the same
+    # position by several hash functions), sorted by position and q-gram
+    #
+    pair_key_array = numpy.unique(
+                       self.pos_matrix.astype(numpy.int64)*num_q_gram +
+                       numpy.arange(num_q_gram, dtype=numpy.int64)[:,None])
+
+    self.pair_pos_array =    pair_key_array // num_q_gram
+    self.pair_q_gram_array = pair_key_array % num_q_gram
+
+    self.pos_load_array = numpy.bincount(self.pair_pos_array,
+                                         minlength=bf_len)
+    self.num_pos_array =  numpy.bincount(self.pair_q_gram_array,
+                                         minlength=num_q_gram)
+
+    self.overlap_tuple = None  # Calculated when first needed
+
+  # ---------------------------------------------------------------------------
+
+  def get_unique_pos_dict(self):
+    """Return a dictionary with the q-grams that are uniquely identified by
+       at least one position as keys, and the lists of these positions as
+       values.
+    """
+
+    unique_mask = (self.pos_load_array[self.pair_pos_array] == 1)
+
+    unique_pos_dict = {}
+
+    for (q_gram_id, pos) in zip(self.pair_q_gram_array[unique_mask].tolist(),
+                                self.pair_pos_array[unique_mask].tolist()):
+      unique_pos_dict.setdefault(self.q_gram_list[q_gram_id], []).append(pos)
+
+    return unique_pos_dict
+
+  # ---------------------------------------------------------------------------
+
+  def get_pair_overlaps(self):
+    """Return the pairs of q-grams that share at least one position, and the
+       numbers of positions they share.
+
+       Output:
+         - q_gram_id1_array  A NumPy array with the identifiers (indices into
+                             'q_gram_list') of the first q-grams of the pairs.
+         - q_gram_id2_array  A NumPy array with the identifiers of the second
+                             q-grams of the pairs (always larger than the
+                             first).
+         - overlap_array     A NumPy array with the numbers of positions the
+                             pairs share.
+    """
+
+    if (self.overlap_tuple != None):
+      return self.overlap_tuple
+
+    num_q_gram =   len(self.q_gram_list)  # Short-cuts
+    pos_array =    self.pair_pos_array
+    q_gram_array = self.pair_q_gram_array
+
+    # Two q-grams at distance d in the sorted pairs share a position if the
+    # pairs have the same position. If no pairs at distance d share a
+    # position then no pairs at larger distances do.
+    #
+    pair_key_array_list = []
+
+    for d in xrange(1, max(self.pos_load_array.max(), 1)):
+      same_mask = (pos_array[d:] == pos_array[:-d])
+      if (not same_mask.any()):
+        break
+
+      pair_key_array_list.append(q_gram_array[:-d][same_mask]*num_q_gram +
+                                 q_gram_array[d:][same_mask])
+
+    if (len(pair_key_array_list) > 0):
+      pair_key_array, overlap_array = numpy.unique(
+                                  numpy.concatenate(pair_key_array_list),
+                                  return_counts=True)
+    else:
+      pair_key_array = numpy.zeros(0, dtype=numpy.int64)
+      overlap_array =  numpy.zeros(0, dtype=numpy.int64)
+
+    self.overlap_tuple = (pair_key_array // num_q_gram,
+                          pair_key_array % num_q_gram, overlap_array)
+
+    return self.overlap_tuple
+
+  # ---------------------------------------------------------------------------
+
+  def get_overlap_hist(self):
+    """Return a NumPy array where entry i is the number of pairs of q-grams
+       that share i positions (including the pairs that share none).
+    """
+
+    overlap_array = self.get_pair_overlaps()[2]
+
+    num_q_gram = len(self.q_gram_list)
+
+    overlap_hist = numpy.bincount(overlap_array,
+                                  minlength=self.num_hash_funct+1)
+    overlap_hist[0] = num_q_gram*(num_q_gram-1)/2 - len(overlap_array)
+
+    return overlap_hist
+
+  # ---------------------------------------------------------------------------
+
+  def get_max_overlap_array(self):
+    """Return a NumPy array with, for each q-gram, the largest number of
+       positions it shares with any other q-gram.
+    """
+
+    (q_gram_id1_array, q_gram_id2_array, overlap_array) = \
+                                                   self.get_pair_overlaps()
+
+    max_overlap_array = numpy.zeros(len(self.q_gram_list), dtype=numpy.int64)
+
+    numpy.maximum.at(max_overlap_array, q_gram_id1_array, overlap_array)
+    numpy.maximum.at(max_overlap_array, q_gram_id2_array, overlap_array)
+
+    return max_overlap_array
+
+  # ---------------------------------------------------------------------------
+
+  def get_summary(self):
+    """Return a dictionary with summary numbers of the profile.
+    """
+
+    (q_gram_id1_array, q_gram_id2_array, overlap_array) = \
+                                                   self.get_pair_overlaps()
+
+    # Pairs of q-grams hashed to exactly the same positions
+    #
+    num_pos_array = self.num_pos_array
+    same_mask = (overlap_array == num_pos_array[q_gram_id1_array]) & \
+                (overlap_array == num_pos_array[q_gram_id2_array])
+
+    pos_load_array = self.pos_load_array
+
+    return {'num_q_gram':         len(self.q_gram_list),
+            'bf_len':             self.bf_len,
+            'num_hash_funct':     self.num_hash_funct,
+            'num_used_pos':       int((pos_load_array > 0).sum()),
+            'min_pos_load':       int(pos_load_array.min()),
+            'avr_pos_load':       float(pos_load_array.mean()),
+            'max_pos_load':       int(pos_load_array.max()),
+            'num_unique_pos':     int((pos_load_array == 1).sum()),
+            'num_unique_q_gram':  len(self.get_unique_pos_dict()),
+            'num_overlap_pair':   len(overlap_array),
+            'max_overlap':        int(overlap_array.max()) if
+                                  (len(overlap_array) > 0) else 0,
+            'num_identical_pair': int(same_mask.sum())}
+
+  # ---------------------------------------------------------------------------
+
+  def print_summary(self):
+    """Print the summary numbers of the profile.
+    """
+
+    summary_dict = self.get_summary()
+
+    print 'Bit position profile of %d q-grams (Bloom filter length %d, ' % \
+          (summary_dict['num_q_gram'], summary_dict['bf_len']) + \
+          '%d hash functions):' % (summary_dict['num_hash_funct'])
+    print '  Positions used: %d, q-grams per position: min %d, ' % \
+          (summary_dict['num_used_pos'], summary_dict['min_pos_load']) + \
+          'average %.2f, max %d' % (summary_dict['avr_pos_load'],
+                                    summary_dict['max_pos_load'])
+    print '  Positions with a single q-gram: %d, identifying %d q-grams' % \
+          (summary_dict['num_unique_pos'], summary_dict['num_unique_q_gram'])
+    print '  Pairs of q-grams sharing positions: %d (at most %d shared, ' % \
+          (summary_dict['num_overlap_pair'], summary_dict['max_overlap']) + \
+          '%d pairs with identical positions)' % \
+          (summary_dict['num_identical_pair'])
+
+# =============================================================================
+# Do some tests if called from command line
+
+if (__name__ == '__main__'):
+
+  import hashlib
+  import itertools
+  import time
+
+  print 'Running some tests:'
+  print
+
+  # Small vocabulary, checked against the positions of each q-gram
+  #
+  test_q_gram_list = ['he', 'el', 'll', 'lo', 'o ', ' w', 'wo', 'or', 'rl',
+                      'ld', 'he']
+  DH = hashing.DoubleHashing(hashlib.sha1, hashlib.md5, 30, 4)
+
+  for salt_str in [None, 'salt']:
+    test_profile = PosOverlapProfile(DH, test_q_gram_list, salt_str)
+
+    assert test_profile.q_gram_list == test_q_gram_list[:-1]
+
+    pos_set_list = []
+    for q_gram in test_profile.q_gram_list:
+      if (salt_str != None):
+        q_gram = q_gram + salt_str
+      pos_set_list.append(set(DH.get_q_gram_pos_list(q_gram)))
+
+    for pos in range(30):
+      assert test_profile.pos_load_array[pos] == \
+             sum([pos in pos_set for pos_set in pos_set_list])
+
+    (id1_array, id2_array, overlap_array) = test_profile.get_pair_overlaps()
+    overlap_dict = dict(zip(zip(id1_array.tolist(), id2_array.tolist()),
+                            overlap_array.tolist()))
+
+    for (i, j) in itertools.combinations(range(len(pos_set_list)), 2):
+      num_shared = len(pos_set_list[i] & pos_set_list[j])
+      assert overlap_dict.get((i, j), 0) == num_shared, (i, j)
+
+    overlap_hist = test_profile.get_overlap_hist()
+    assert overlap_hist.sum() == 10*9/2
+    assert (overlap_hist[1:] > 0).any()
+
+    max_overlap_array = test_profile.get_max_overlap_array()
+    for i in range(len(pos_set_list)):
+      assert max_overlap_array[i] == max([len(pos_set_list[i] & pos_set) for
+                                          (j, pos_set) in
+                                          enumerate(pos_set_list) if j != i])
+
+    for (q_gram, pos_list) in test_profile.get_unique_pos_dict().iteritems():
+      i = test_profile.q_gram_list.index(q_gram)
+      for pos in pos_list:
+        assert pos in pos_set_list[i]
+        assert [pos in pos_set for pos_set in pos_set_list].count(True) == 1
+
+    summary_dict = test_profile.get_summary()
+    assert summary_dict['num_q_gram'] == 10
+    assert summary_dict['num_unique_pos'] == \
+           sum([len(pos_list) for pos_list in
+                test_profile.get_unique_pos_dict().values()])
+
+  # Q-grams with identical positions (only two positions to hash to)
+  #
+  DH2 = hashing.DoubleHashing(hashlib.sha1, hashlib.md5, 2, 4)
+  test_profile = PosOverlapProfile(DH2, test_q_gram_list)
+
+  pos_set_list = [set(DH2.get_q_gram_pos_list(q_gram)) for q_gram in
+                  test_profile.q_gram_list]
+  assert test_profile.get_summary()['num_identical_pair'] == \
+         sum([pos_set_list[i] == pos_set_list[j] for (i, j) in
+              itertools.combinations(range(len(pos_set_list)), 2)])
+  assert test_profile.get_summary()['num_identical_pair'] > 0
+  assert test_profile.get_overlap_hist().sum() == 10*9/2
+
+  print '  Position profile correct'
+
+  # A vocabulary of 10,000 q-grams with a long Bloom filter
+  #
+  test_vocab_list = [''.join(t) for t in
+                     itertools.product('abcdefghijklmnopqrstuv', repeat=3)]
+  test_vocab_list = test_vocab_list[:10000]
+
+  start_time = time.time()
+
+  TH = hashing.TripleHashing(hashlib.sha1, hashlib.md5, hashlib.sha224, 4000,
+                             30)
+  test_profile = PosOverlapProfile(TH, test_vocab_list)
+  summary_dict = test_profile.get_summary()
+
+  assert summary_dict['num_q_gram'] == 10000
+  assert test_profile.get_overlap_hist().sum() == 10000*9999/2
+
+  print '  Profile of 10,000 q-grams calculated in %.2f sec' % \
+        (time.time() - start_time)
+  print
+  test_profile.print_summary()
+
+  print
+  print 'All tests passed'
+
+# =============================================================================
+# End.
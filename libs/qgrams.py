@@ -0,0 +1,286 @@
+# qgrams.py - Module that implements a shared cache of q-gram extractions
+#
+# October 2026
+# -----------------------------------------------------------------------------
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# =============================================================================
+
+PAD_CHAR = chr(1)   # Used for q-gram padding
+
+DEFAULT_CACHE_SIZE = 100000  # Maximum number of values kept in the cache
+
+# Positions of the elements in the entries of the cache linked list
+#
+PREV, NEXT, KEY, Q_GRAM_LIST, Q_GRAM_SET = 0, 1, 2, 3, 4
+
+# =============================================================================
+
+class QGramCache():
+  """A bounded cache of the q-grams extracted from string values, keyed by
+     value, q and padding. When the cache is full the least recently used
+     value is removed.
+
+     For each value both the list of q-grams (in the order they occur in the
+     value, as needed for transition probabilities) and the set of q-grams
+     are kept. The returned lists and sets are shared between all callers
+     (the sets are frozen), so they must not be modified.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+    """Initialise the q-gram cache.
+
+       Input arguments:
+         - max_size  The maximum number of values to keep in the cache. If set
+                     to 0 then no values are cached.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert max_size >= 0, max_size
+
+    self.max_size = max_size
+
+    self.cache_dict = {}
+
+    # Circular doubly linked list of cache entries ordered from the least to
+    # the most recently used, with a root entry that is not in the cache
+    #
+    self.root = [None, None, None, None, None]
+    self.root[PREV] = self.root
+    self.root[NEXT] = self.root
+
+    self.num_hit =  0
+    self.num_miss = 0
+
+  # ---------------------------------------------------------------------------
+
+  def set_max_size(self, max_size):
+    """Set the maximum number of values to keep in the cache (the cache is
+       cleared).
+    """
+
+    assert max_size >= 0, max_size
+
+    self.max_size = max_size
+    self.clear()
+
+  # ---------------------------------------------------------------------------
+
+  def clear(self):
+    """Remove all values from the cache and reset the hit and miss counters.
+    """
+
+    self.evict()
+
+    self.num_hit =  0
+    self.num_miss = 0
+
+  # ---------------------------------------------------------------------------
+
+  def evict(self):
+    """Remove all values from the cache (but keep the hit and miss counters)
+       and return the number of values removed. Used to release memory.
+    """
+
+    num_val = len(self.cache_dict)
+
+    self.cache_dict.clear()
+
+    self.root[PREV] = self.root
+    self.root[NEXT] = self.root
+
+    return num_val
+
+  # ---------------------------------------------------------------------------
+
+  def get_stats(self):
+    """Return the number of cache hits, cache misses and the number of values
+       currently in the cache.
+    """
+
+    return self.num_hit, self.num_miss, len(self.cache_dict)
+
+  # ---------------------------------------------------------------------------
+
+  def get_entry(self, val, q, padded):
+    """Return the cache entry for the given value, q and padding, extracting
+       the q-grams of the value if it is not in the cache.
+
+       Input arguments:
+         - val     The string value to extract q-grams from.
+         - q       The length of q-grams.
+         - padded  A flag, if set to True then the value is padded with
+                   q-1 padding characters at its start and end.
+
+       Output:
+         - entry  A list with the list and the (frozen) set of the q-grams of
+                  the value at positions Q_GRAM_LIST and Q_GRAM_SET.
+    """
+
+    key = (val, q, padded)
+
+    entry = self.cache_dict.get(key)
+
+    if (entry != None):  # Move the entry to the most recently used position
+      self.num_hit += 1
+
+      prev_entry = entry[PREV]
+      next_entry = entry[NEXT]
+      prev_entry[NEXT] = next_entry
+      next_entry[PREV] = prev_entry
+
+      root = self.root
+      last_entry = root[PREV]
+      last_entry[NEXT] = entry
+      root[PREV] = entry
+      entry[PREV] = last_entry
+      entry[NEXT] = root
+
+      return entry
+
+    self.num_miss += 1
+
+    qm1 = q - 1
+
+    if (padded == True):  # Add padding start and end characters
+      val = PAD_CHAR*qm1+val+PAD_CHAR*qm1
+
+    q_gram_list = [val[i:i+q] for i in xrange(len(val) - qm1)]
+
+    if (self.max_size == 0):
+      return [None, None, key, q_gram_list, frozenset(q_gram_list)]
+
+    if (len(self.cache_dict) >= self.max_size):  # Remove the least recently
+      root = self.root                            # used entry
+      oldest_entry = root[NEXT]
+      root[NEXT] = oldest_entry[NEXT]
+      oldest_entry[NEXT][PREV] = root
+      del self.cache_dict[oldest_entry[KEY]]
+
+    root = self.root
+    last_entry = root[PREV]
+    entry = [last_entry, root, key, q_gram_list, frozenset(q_gram_list)]
+    last_entry[NEXT] = entry
+    root[PREV] = entry
+
+    self.cache_dict[key] = entry
+
+    return entry
+
+  # ---------------------------------------------------------------------------
+
+  def get_q_gram_list(self, val, q, padded):
+    """Return the list of q-grams of the given value (in the order they occur
+       in the value, including repeated q-grams).
+    """
+
+    return self.get_entry(val, q, padded)[Q_GRAM_LIST]
+
+  # ---------------------------------------------------------------------------
+
+  def get_q_gram_set(self, val, q, padded):
+    """Return the (frozen) set of q-grams of the given value.
+    """
+
+    return self.get_entry(val, q, padded)[Q_GRAM_SET]
+
+# =============================================================================
+
+def add_q_gram_trans_counts(q_gram_list, trans_count_dict):
+  """Count the pairs of consecutive q-grams in the given list of q-grams in
+     the given transition dictionary, where keys are q-grams and values are
+     dictionaries with the q-grams that follow them and their counts.
+  """
+
+  for (i, q_gram1) in enumerate(q_gram_list[:-1]):
+    q_gram2 = q_gram_list[i+1]
+
+    # Insert the q-gram pair into the transition dictionary
+    #
+    q_gram2_dict = trans_count_dict.get(q_gram1, {})
+    q_gram2_dict[q_gram2] = q_gram2_dict.get(q_gram2, 0) + 1
+    trans_count_dict[q_gram1] = q_gram2_dict
+
+# =============================================================================
+
+# The cache shared by all modules that extract q-grams from values
+#
+q_gram_cache = QGramCache()
+
+get_q_gram_list = q_gram_cache.get_q_gram_list
+get_q_gram_set =  q_gram_cache.get_q_gram_set
+
+# =============================================================================
+# Do some tests if called from command line
+
+if (__name__ == '__main__'):
+
+  print 'Running some tests:'
+  print
+
+  test_cache = QGramCache(2)
+
+  assert test_cache.get_q_gram_list('peter', 2, False) == \
+         ['pe', 'et', 'te', 'er']
+  assert test_cache.get_q_gram_set('peter', 2, False) == \
+         set(['pe', 'et', 'te', 'er'])
+  assert test_cache.get_q_gram_list('anna', 2, True) == \
+         [PAD_CHAR+'a', 'an', 'nn', 'na', 'a'+PAD_CHAR]
+  assert test_cache.get_q_gram_set('anna', 3, False) == set(['ann', 'nna'])
+  assert test_cache.get_q_gram_set('a', 2, False) == set()
+  print '  Q-gram extraction correct'
+
+  # Cache size 2: 'peter' was removed, 'a' and ('anna', 3) are kept
+  #
+  assert test_cache.get_stats() == (1, 4, 2), test_cache.get_stats()
+
+  test_cache.get_q_gram_set('anna', 3, False)  # Hit, now most recently used
+  test_cache.get_q_gram_set('peter', 2, False) # Miss, removes 'a'
+  assert ('anna', 3, False) in test_cache.cache_dict
+  assert ('a', 2, False) not in test_cache.cache_dict
+  assert test_cache.get_stats() == (2, 5, 2), test_cache.get_stats()
+  print '  Least recently used values removed correctly'
+
+  test_cache = QGramCache(0)
+  test_cache.get_q_gram_set('peter', 2, False)
+  test_cache.get_q_gram_set('peter', 2, False)
+  assert test_cache.get_stats() == (0, 2, 0), test_cache.get_stats()
+  print '  Disabled cache correct'
+
+  test_cache = QGramCache(10)
+  test_cache.get_q_gram_set('peter', 2, False)
+  test_cache.get_q_gram_set('anna', 2, False)
+  assert test_cache.evict() == 2
+  assert test_cache.get_q_gram_list('peter', 2, False) == \
+         ['pe', 'et', 'te', 'er']
+  assert test_cache.get_stats() == (0, 3, 1), test_cache.get_stats()
+  print '  Eviction correct'
+
+  test_trans_count_dict = {}
+  add_q_gram_trans_counts(['pe', 'et', 'te', 'er'], test_trans_count_dict)
+  add_q_gram_trans_counts(['pe', 'et', 'ta'], test_trans_count_dict)
+  assert test_trans_count_dict == {'pe':{'et':2}, 'et':{'te':1, 'ta':1},
+                                   'te':{'er':1}}
+  print '  Q-gram transition counts correct'
+
+  print
+  print 'All tests passed'
+
+# =============================================================================
+# End.
@@ -0,0 +1,380 @@
+# valstore.py - Module that implements a compact store of record values
+#
+# October 2026
+# -----------------------------------------------------------------------------
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# =============================================================================
+
+import array
+
+import numpy
+
+# =============================================================================
+
+class RecValStore():
+  """A dictionary-encoded store of the record values of a data set, to be
+     used instead of the three dictionaries of record values (keys are record
+     identifiers), record identifier sets (keys are record values) and record
+     value frequencies generated when a data set is loaded.
+
+     Each distinct record value is given an integer code, and records only
+     hold the code of their value in an array. The record identifiers of each
+     value are kept in a compressed sparse row (CSR) layout, i.e. an array of
+     record numbers ordered by value code plus an array of offsets into it.
+
+     Records are added with 'add_rec', and once all records are added
+     'freeze' has to be called before the dictionary-like views returned by
+     'get_rec_val_dict', 'get_rec_val_id_dict' and 'get_rec_val_freq_dict'
+     can be used.
+  """
+
+  # ---------------------------------------------------------------------------
+
+  def __init__(self):
+    """Initialise the record value store.
+
+       Input arguments:
+         - This method does not require any input arguments.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    # Distinct record values and their codes. Values are inserted in the same
+    # order as into a dictionary of record value frequencies, so iterating
+    # over this dictionary gives the same order of values.
+    #
+    self.val_code_dict = {}
+
+    self.rec_code_array = array.array('i')  # Value code of each record
+    self.rec_id_list =    []                # Identifier of each record
+
+    self.frozen = False
+
+  # ---------------------------------------------------------------------------
+
+  def add_rec(self, rec_id, rec_val):
+    """Add a record with the given identifier and value to the store.
+
+       Input arguments:
+         - rec_id   The identifier of the record.
+         - rec_val  The joined values of the attributes used of the record.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert self.frozen == False
+
+    val_code = self.val_code_dict.get(rec_val)
+    if (val_code == None):
+      val_code = len(self.val_code_dict)
+      self.val_code_dict[rec_val] = val_code
+
+    self.rec_code_array.append(val_code)
+    self.rec_id_list.append(rec_id)
+
+  # ---------------------------------------------------------------------------
+
+  def freeze(self):
+    """Convert the added records into NumPy arrays, calculate the value
+       frequencies and build the CSR layout of record identifiers per value
+       as well as a sorted index of record identifiers.
+
+       Input arguments:
+         - This method does not require any input arguments.
+
+       Output:
+         - This method does not return anything.
+    """
+
+    assert self.frozen == False
+
+    num_val = len(self.val_code_dict)
+
+    val_list = [None]*num_val
+    for (rec_val, val_code) in self.val_code_dict.iteritems():
+      val_list[val_code] = rec_val
+    self.val_list = val_list
+
+    rec_code_array = numpy.frombuffer(self.rec_code_array,
+                                      dtype=numpy.int32).copy()
+    self.rec_code_array = rec_code_array
+
+    if (len(self.rec_id_list) > 0):
+      self.rec_id_array = numpy.array(self.rec_id_list)
+    else:
+      self.rec_id_array = numpy.array([], dtype='S1')
+    self.rec_id_list = None
+
+    # Value frequencies, and offsets of the records of each value in the
+    # array of record numbers ordered by value code. A stable sort keeps the
+    # records of a value in the order they were added.
+    #
+    self.val_freq_array = numpy.bincount(rec_code_array, minlength=num_val)
+
+    self.val_off_array = numpy.zeros(num_val+1, dtype=numpy.int64)
+    self.val_off_array[1:] = numpy.cumsum(self.val_freq_array)
+
+    self.val_rec_num_array = numpy.argsort(rec_code_array,
+                                           kind='mergesort').astype(numpy.int32)
+
+    # Record identifiers in sorted order, where for identifiers that occur
+    # several times the last added record comes last (so it is found first
+    # when looking an identifier up)
+    #
+    self.id_order_array = numpy.argsort(self.rec_id_array,
+                                        kind='mergesort').astype(numpy.int32)
+    self.sorted_rec_id_array = self.rec_id_array[self.id_order_array]
+
+    if (len(self.sorted_rec_id_array) > 0):
+      self.num_unique_rec_id = 1 + int(numpy.count_nonzero(
+                                        self.sorted_rec_id_array[1:] !=
+                                        self.sorted_rec_id_array[:-1]))
+    else:
+      self.num_unique_rec_id = 0
+
+    self.frozen = True
+
+  # ---------------------------------------------------------------------------
+
+  def get_val_code(self, rec_val):
+    """Return the code of the given record value, or None if the value does
+       not occur in the store.
+    """
+
+    return self.val_code_dict.get(rec_val)
+
+  # ---------------------------------------------------------------------------
+
+  def get_rec_num(self, rec_id):
+    """Return the number of the last record added with the given identifier,
+       or None if there is no such record.
+    """
+
+    sorted_rec_id_array = self.sorted_rec_id_array  # Short-cut
+
+    pos = int(numpy.searchsorted(sorted_rec_id_array, rec_id,
+                                 side='right')) - 1
+
+    if ((pos < 0) or (sorted_rec_id_array[pos] != rec_id)):
+      return None
+
+    return int(self.id_order_array[pos])
+
+  # ---------------------------------------------------------------------------
+
+  def get_val_rec_id_set(self, val_code):
+    """Return the set of record identifiers of the records with the value of
+       the given code.
+    """
+
+    start_off = self.val_off_array[val_code]
+    end_off =   self.val_off_array[val_code+1]
+
+    rec_num_array = self.val_rec_num_array[start_off:end_off]
+
+    return set(self.rec_id_array[rec_num_array].tolist())
+
+  # ---------------------------------------------------------------------------
+
+  def get_rec_val_dict(self):
+    """Return a dictionary-like view with record identifiers as keys and
+       record values as values.
+    """
+
+    assert self.frozen == True
+
+    return RecValView(self)
+
+  # ---------------------------------------------------------------------------
+
+  def get_rec_val_id_dict(self):
+    """Return a dictionary-like view with record values as keys and sets of
+       record identifiers as values.
+    """
+
+    assert self.frozen == True
+
+    return RecValIdView(self)
+
+  # ---------------------------------------------------------------------------
+
+  def get_rec_val_freq_dict(self):
+    """Return a dictionary-like view with record values as keys and their
+       frequencies as values.
+    """
+
+    assert self.frozen == True
+
+    return RecValFreqView(self)
+
+# =============================================================================
+
+class RecValView():
+  """Read-only dictionary-like view of a record value store with record
+     identifiers as keys and record values as values.
+  """
+
+  def __init__(self, rec_val_store):
+    self.store = rec_val_store
+
+  def __len__(self):
+    return self.store.num_unique_rec_id
+
+  def __getitem__(self, rec_id):
+    rec_num = self.store.get_rec_num(rec_id)
+    if (rec_num == None):
+      raise KeyError(rec_id)
+    return self.store.val_list[self.store.rec_code_array[rec_num]]
+
+  def __contains__(self, rec_id):
+    return self.store.get_rec_num(rec_id) != None
+
+  def get(self, rec_id, default=None):
+    rec_num = self.store.get_rec_num(rec_id)
+    if (rec_num == None):
+      return default
+    return self.store.val_list[self.store.rec_code_array[rec_num]]
+
+  def iterkeys(self):
+    store = self.store  # Short-cut
+    for rec_id in sorted(set(store.rec_id_array.tolist())):
+      yield rec_id
+
+  __iter__ = iterkeys
+
+  def iteritems(self):
+    for rec_id in self.iterkeys():
+      yield (rec_id, self[rec_id])
+
+  def itervalues(self):
+    for (rec_id, rec_val) in self.iteritems():
+      yield rec_val
+
+  def keys(self):
+    return list(self.iterkeys())
+
+  def items(self):
+    return list(self.iteritems())
+
+  def values(self):
+    return list(self.itervalues())
+
+# =============================================================================
+
+class RecValIdView():
+  """Read-only dictionary-like view of a record value store with record
+     values as keys and sets of record identifiers as values.
+  """
+
+  def __init__(self, rec_val_store):
+    self.store = rec_val_store
+
+  def __len__(self):
+    return len(self.store.val_list)
+
+  def __getitem__(self, rec_val):
+    val_code = self.store.get_val_code(rec_val)
+    if (val_code == None):
+      raise KeyError(rec_val)
+    return self.store.get_val_rec_id_set(val_code)
+
+  def __contains__(self, rec_val):
+    return rec_val in self.store.val_code_dict
+
+  def get(self, rec_val, default=None):
+    val_code = self.store.get_val_code(rec_val)
+    if (val_code == None):
+      return default
+    return self.store.get_val_rec_id_set(val_code)
+
+  def iterkeys(self):
+    return self.store.val_code_dict.iterkeys()
+
+  __iter__ = iterkeys
+
+  def iteritems(self):
+    store = self.store  # Short-cut
+    for (rec_val, val_code) in store.val_code_dict.iteritems():
+      yield (rec_val, store.get_val_rec_id_set(val_code))
+
+  def itervalues(self):
+    for (rec_val, rec_id_set) in self.iteritems():
+      yield rec_id_set
+
+  def keys(self):
+    return self.store.val_code_dict.keys()
+
+  def items(self):
+    return list(self.iteritems())
+
+  def values(self):
+    return list(self.itervalues())
+
+# =============================================================================
+
+class RecValFreqView():
+  """Read-only dictionary-like view of a record value store with record
+     values as keys and their frequencies as values.
+  """
+
+  def __init__(self, rec_val_store):
+    self.store = rec_val_store
+
+  def __len__(self):
+    return len(self.store.val_list)
+
+  def __getitem__(self, rec_val):
+    val_code = self.store.get_val_code(rec_val)
+    if (val_code == None):
+      raise KeyError(rec_val)
+    return int(self.store.val_freq_array[val_code])
+
+  def __contains__(self, rec_val):
+    return rec_val in self.store.val_code_dict
+
+  def get(self, rec_val, default=None):
+    val_code = self.store.get_val_code(rec_val)
+    if (val_code == None):
+      return default
+    return int(self.store.val_freq_array[val_code])
+
+  def iterkeys(self):
+    return self.store.val_code_dict.iterkeys()
+
+  __iter__ = iterkeys
+
+  def iteritems(self):
+    val_freq_list = self.store.val_freq_array.tolist()
+    for (rec_val, val_code) in self.store.val_code_dict.iteritems():
+      yield (rec_val, val_freq_list[val_code])
+
+  def itervalues(self):
+    for (rec_val, val_freq) in self.iteritems():
+      yield val_freq
+
+  def keys(self):
+    return self.store.val_code_dict.keys()
+
+  def items(self):
+    return list(self.iteritems())
+
+  def values(self):
+    return list(self.itervalues())
+
+# =============================================================================
+# End.